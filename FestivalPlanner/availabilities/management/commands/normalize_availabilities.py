@@ -0,0 +1,55 @@
+import csv
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import FilmFan
+from festival_planner.availability_intervals import AvailabilitySet
+from festival_planner.tools import CSV_DIALECT
+
+
+class Command(BaseCommand):
+    help = ('Store the availabilities of the given fans, or of all fans, as sorted periods that neither overlap'
+            ' nor touch, optionally adding the periods of a semicolon separated file with fan name, start and end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', nargs='?', help='File with availability periods to import.')
+        parser.add_argument('--fan', action='append', default=[], help='Name of a fan to normalize.')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without storing them.')
+
+    def handle(self, *args, **options):
+        fans = FilmFan.film_fans.order_by('seq_nr')
+        if options['fan']:
+            fans = fans.filter(name__in=options['fan'])
+        fans = list(fans)
+        intervals_by_fan_name = self.read_intervals(options['csv_file']) if options['csv_file'] else {}
+        unknown_fan_names = set(intervals_by_fan_name) - {fan.name for fan in FilmFan.film_fans.all()}
+        if unknown_fan_names:
+            raise CommandError(f'Unknown fans: {", ".join(sorted(unknown_fan_names))}')
+
+        for availability_set in AvailabilitySet.for_fans(fans):
+            fan = availability_set.fan
+            extra_intervals = intervals_by_fan_name.get(fan.name, [])
+            if options['dry_run']:
+                obsolete, inserted = availability_set.plan_canonical(extra_intervals)
+            else:
+                obsolete, inserted = availability_set.save_canonical(extra_intervals)
+            verb = 'would be' if options['dry_run'] else 'are'
+            self.stdout.write(f'{fan}: {len(obsolete)} periods {verb} deleted, {len(inserted)} inserted.')
+
+    @staticmethod
+    def read_intervals(path):
+        intervals_by_fan_name = {}
+        try:
+            with open(path, newline='') as csvfile:
+                for line_nr, row in enumerate(csv.reader(csvfile, dialect=CSV_DIALECT), start=1):
+                    try:
+                        fan_name, start_str, end_str = row
+                        interval = (datetime.datetime.fromisoformat(start_str),
+                                    datetime.datetime.fromisoformat(end_str))
+                    except ValueError as e:
+                        raise CommandError(f'Line {line_nr} of {path}: {e}')
+                    intervals_by_fan_name.setdefault(fan_name, []).append(interval)
+        except OSError as e:
+            raise CommandError(str(e))
+        return intervals_by_fan_name
@@ -1,12 +1,21 @@
 import datetime
+import os
+import random
+import tempfile
 from http import HTTPStatus
+from io import StringIO
 
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from authentication.models import FilmFan
 from availabilities import views as availability_views
 from availabilities.models import Availabilities
+from festival_planner.availability_intervals import AvailabilitySet, add_interval, normalize, subtract_interval
+from festival_planner.availability_timeline import AvailabilityTimeline
 from festivals.models import current_festival
 from screenings.models import Screening
 from screenings.tests import ScreeningViewsTests
@@ -19,6 +28,205 @@ class AvailabilitiesModelTests(TestCase):
     pass
 
 
+def get_minutes(intervals):
+    """Return the minutes covered by the given intervals, the brute-force model of an interval set."""
+    return {minute for start, end in intervals for minute in range(start, end)}
+
+
+def get_intervals(minutes):
+    """Return the canonical intervals that cover the given minutes."""
+    intervals = []
+    for minute in sorted(minutes):
+        if intervals and intervals[-1][1] == minute:
+            intervals[-1] = (intervals[-1][0], minute + 1)
+        else:
+            intervals.append((minute, minute + 1))
+    return intervals
+
+
+class AvailabilityIntervalTests(TestCase):
+    """
+    Compares the interval operations with a minute-grid model, for
+    many interval sets from a seeded random generator.
+    """
+    run_count = 500
+    grid_size = 60
+
+    def setUp(self):
+        self.random = random.Random(392)
+
+    def arrange_interval(self):
+        start = self.random.randrange(self.grid_size)
+        return start, start + self.random.randrange(-5, 20)
+
+    def arrange_intervals(self):
+        return [self.arrange_interval() for _ in range(self.random.randrange(8))]
+
+    def assert_canonical(self, intervals):
+        for start, end in intervals:
+            self.assertLess(start, end)
+        for (_, end), (next_start, _) in zip(intervals, intervals[1:]):
+            self.assertLess(end, next_start)
+
+    def test_normalize(self):
+        """
+        Normalized intervals are canonical and cover the same minutes as the original intervals.
+        """
+        for _ in range(self.run_count):
+            # Arrange.
+            intervals = self.arrange_intervals()
+
+            # Act.
+            normalized = normalize(intervals)
+
+            # Assert.
+            self.assert_canonical(normalized)
+            self.assertEqual(normalized, get_intervals(get_minutes(intervals)))
+            self.assertEqual(normalize(normalized), normalized)
+
+    def test_add_interval(self):
+        """
+        Adding an interval covers the union of the minutes.
+        """
+        for _ in range(self.run_count):
+            # Arrange.
+            intervals = normalize(self.arrange_intervals())
+            interval = self.arrange_interval()
+
+            # Act.
+            result = add_interval(intervals, interval)
+
+            # Assert.
+            self.assert_canonical(result)
+            self.assertEqual(get_minutes(result), get_minutes(intervals) | get_minutes([interval]))
+
+    def test_subtract_interval(self):
+        """
+        Subtracting an interval covers the difference of the minutes.
+        """
+        for _ in range(self.run_count):
+            # Arrange.
+            intervals = normalize(self.arrange_intervals())
+            interval = self.arrange_interval()
+
+            # Act.
+            result = subtract_interval(intervals, interval)
+
+            # Assert.
+            self.assert_canonical(result)
+            self.assertEqual(get_minutes(result), get_minutes(intervals) - get_minutes([interval]))
+
+
+class AvailabilitySetTests(ScreeningViewsTests):
+    def setUp(self):
+        super().setUp()
+        self.arrange_regular_user_props()
+        self.jimmie = FilmFan.film_fans.create(name='Jimmie', is_admin=False, seq_nr=3)
+
+    @staticmethod
+    def get_dt(dt_str):
+        return datetime.datetime.fromisoformat(f'2024-08-{dt_str}')
+
+    def arrange_availability(self, fan, start_str, end_str):
+        kwargs = {'fan': fan, 'start_dt': self.get_dt(start_str), 'end_dt': self.get_dt(end_str)}
+        return Availabilities.availabilities.create(**kwargs)
+
+    def get_periods(self, fan):
+        availabilities = Availabilities.availabilities.filter(fan=fan).order_by('start_dt')
+        return [(a.start_dt, a.end_dt) for a in availabilities]
+
+    def test_merge_overlapping_periods(self):
+        """
+        Merging a period that overlaps and touches existing periods leaves one period.
+        """
+        # Arrange.
+        _ = self.arrange_availability(self.fan, '29 10:00', '29 14:00')
+        _ = self.arrange_availability(self.fan, '29 16:00', '29 18:00')
+        _ = self.arrange_availability(self.fan, '30 10:00', '30 14:00')
+        _ = self.arrange_availability(self.jimmie, '29 12:00', '29 20:00')
+
+        # Act.
+        obsolete, inserted = AvailabilitySet.apply(self.fan, 'merge', self.get_dt('29 12:00'), self.get_dt('29 16:00'))
+
+        # Assert.
+        self.assertEqual(len(obsolete), 2)
+        self.assertEqual(len(inserted), 1)
+        expected_periods = [
+            (self.get_dt('29 10:00'), self.get_dt('29 18:00')),
+            (self.get_dt('30 10:00'), self.get_dt('30 14:00')),
+        ]
+        self.assertEqual(self.get_periods(self.fan), expected_periods)
+        self.assertEqual(self.get_periods(self.jimmie), [(self.get_dt('29 12:00'), self.get_dt('29 20:00'))])
+
+    def test_delete_splits_period(self):
+        """
+        Deleting a period within an existing period leaves the parts before and after it.
+        """
+        # Arrange.
+        _ = self.arrange_availability(self.fan, '29 10:00', '30 10:00')
+        availability_set = AvailabilitySet.for_fan(self.fan)
+
+        # Act.
+        action = availability_set.get_action(self.get_dt('29 14:00'), self.get_dt('29 23:00'))
+        _ = AvailabilitySet.apply(self.fan, action, self.get_dt('29 14:00'), self.get_dt('29 23:00'))
+
+        # Assert.
+        self.assertEqual(action, 'delete')
+        expected_periods = [
+            (self.get_dt('29 10:00'), self.get_dt('29 14:00')),
+            (self.get_dt('29 23:00'), self.get_dt('30 10:00')),
+        ]
+        self.assertEqual(self.get_periods(self.fan), expected_periods)
+
+    def test_apply_query_count_is_constant(self):
+        """
+        Merging a period takes the same number of queries, however many periods it merges.
+        """
+        # Arrange.
+        _ = self.arrange_availability(self.jimmie, '29 10:00', '29 11:00')
+        for hour in range(10, 22, 2):
+            _ = self.arrange_availability(self.fan, f'29 {hour}:00', f'29 {hour + 1}:00')
+
+        # Act.
+        with CaptureQueriesContext(connection) as few_context:
+            _ = AvailabilitySet.apply(self.jimmie, 'merge', self.get_dt('29 09:00'), self.get_dt('29 12:00'))
+        with CaptureQueriesContext(connection) as many_context:
+            _ = AvailabilitySet.apply(self.fan, 'merge', self.get_dt('29 09:00'), self.get_dt('29 23:00'))
+
+        # Assert.
+        self.assertEqual(len(many_context.captured_queries), len(few_context.captured_queries))
+        self.assertEqual(self.get_periods(self.fan), [(self.get_dt('29 09:00'), self.get_dt('29 23:00'))])
+
+    def test_normalize_command(self):
+        """
+        The normalize command imports periods from a file and stores the periods of each fan as a canonical set.
+        """
+        # Arrange.
+        _ = self.arrange_availability(self.fan, '29 10:00', '29 12:00')
+        _ = self.arrange_availability(self.fan, '29 12:00', '29 14:00')
+        _ = self.arrange_availability(self.jimmie, '30 10:00', '30 12:00')
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        csv_path = os.path.join(temp_dir.name, 'availabilities.csv')
+        with open(csv_path, 'w') as stream:
+            stream.write('Jimmie;2024-08-30 11:00;2024-08-30 13:00\n')
+            stream.write('Jimmie;2024-08-31 10:00;2024-08-31 12:00\n')
+
+        # Act.
+        call_command('normalize_availabilities', csv_path, '--dry-run', stdout=StringIO())
+        dry_run_count = Availabilities.availabilities.count()
+        call_command('normalize_availabilities', csv_path, stdout=StringIO())
+
+        # Assert.
+        self.assertEqual(dry_run_count, 3)
+        self.assertEqual(self.get_periods(self.fan), [(self.get_dt('29 10:00'), self.get_dt('29 14:00'))])
+        expected_periods = [
+            (self.get_dt('30 10:00'), self.get_dt('30 13:00')),
+            (self.get_dt('31 10:00'), self.get_dt('31 12:00')),
+        ]
+        self.assertEqual(self.get_periods(self.jimmie), expected_periods)
+
+
 class AvailabilityViewTests(ScreeningViewsTests):
     def setUp(self):
         super().setUp()
@@ -117,3 +325,58 @@ class DaySchemaViewTests(ScreeningViewsTests):
         self.assertEqual(Screening.screenings.count(), 1)
         self.assert_screening_status(response, Screening.ScreeningStatus.FREE)
         self.assertContains(response, f'{self.fan.name} {start_dt:%H:%M} - 06:00')
+
+
+class AvailabilityTimelineTests(ScreeningViewsTests):
+    def setUp(self):
+        super().setUp()
+        self.arrange_regular_user_props()
+        self.jimmie = FilmFan.film_fans.create(name='Jimmie', is_admin=False, seq_nr=3)
+
+    @staticmethod
+    def arrange_availability(fan, start_dt_str, end_dt_str):
+        start_dt = datetime.datetime.fromisoformat(start_dt_str)
+        end_dt = datetime.datetime.fromisoformat(end_dt_str)
+        return Availabilities.availabilities.create(fan=fan, start_dt=start_dt, end_dt=end_dt)
+
+    def test_touching_periods_are_merged(self):
+        """
+        A fan is available for a screening that spans two touching availability periods.
+        """
+        # Arrange.
+        _ = self.arrange_availability(self.fan, '2024-08-30 10:00', '2024-08-30 12:00')
+        _ = self.arrange_availability(self.fan, '2024-08-30 12:00', '2024-08-30 18:00')
+        _ = self.arrange_availability(self.jimmie, '2024-08-30 09:00', '2024-08-30 11:30')
+        screening = self.arrange_create_screening(self.screen_sg, datetime.datetime.fromisoformat('2024-08-30 11:00'))
+
+        # Act.
+        timeline = AvailabilityTimeline.for_festival(self.festival)
+
+        # Assert.
+        self.assertIs(timeline.fan_fits_screening(self.fan, screening), True)
+        self.assertIs(timeline.fan_fits_screening(self.jimmie, screening), False)
+        self.assertEqual(timeline.get_available_fans(screening), [self.fan])
+
+    def test_timeline_equals_availability_queries(self):
+        """
+        The timeline finds the same available fans as querying the availabilities of each screening.
+        """
+        # Arrange.
+        _ = self.arrange_availability(self.fan, '2024-08-29 10:00', '2024-08-29 23:00')
+        _ = self.arrange_availability(self.fan, '2024-08-31 09:00', '2024-09-01 02:00')
+        _ = self.arrange_availability(self.jimmie, '2024-08-30 08:00', '2024-08-31 14:00')
+        start_dt = datetime.datetime.fromisoformat('2024-08-29 08:00')
+        screenings = [
+            self.arrange_create_screening(self.screen_sg, start_dt + datetime.timedelta(hours=3 * i)) for i in range(24)
+        ]
+
+        # Act.
+        with CaptureQueriesContext(connection) as context:
+            timeline = AvailabilityTimeline.for_screenings(screenings)
+            available_fans_by_screening = {s: timeline.get_available_fans(s) for s in screenings}
+
+        # Assert.
+        self.assertEqual(len(context.captured_queries), 1)
+        for screening in screenings:
+            expected_fans = sorted(screening.get_available_fans(), key=lambda f: f.name)
+            self.assertEqual(available_fans_by_screening[screening], expected_fans)
@@ -1,6 +1,7 @@
 import datetime
 
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import DatabaseError
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.views.generic import FormView
@@ -8,11 +9,13 @@ from django.views.generic import FormView
 from authentication.models import FilmFan, get_sorted_fan_list, get_fan_by_name
 from availabilities.forms.availabilities_forms import AvailabilityForm
 from availabilities.models import Availabilities
+from festival_planner.availability_intervals import AvailabilitySet
 from festival_planner.cookie import Cookie, Filter, FestivalDay, get_fan_filter_props
 from festival_planner.debug_tools import ProfiledListView
-from festival_planner.screening_status_getter import ScreeningWarning, get_warnings
+from festival_planner.screening_status_getter import ScreeningWarning, get_warning_details
 from festival_planner.shared_template_referrer_view import SharedTemplateReferrerView
 from festival_planner.tools import add_base_context, wrap_up_form_errors, get_log, unset_log, add_log, initialize_log
+from festival_planner.warning_store import WarningStore
 from festivals.models import current_festival
 from films.models import current_fan
 
@@ -29,6 +32,7 @@ END_TIME_CHOICES = TIME_CHOICES[1:]
 ERRORS_COOKIE = Cookie('form_errors', initial_value=[])
 WARNING_COOKIE = Cookie('warnings', initial_value=[])
 ACTION_COOKIE = Cookie('form_action')
+CONFIRM_COOKIE = Cookie('confirm_period', initial_value=False)
 
 
 def get_festival_dt(date, time):
@@ -72,9 +76,6 @@ class AvailabilityView(SharedTemplateReferrerView):
     start_time = Cookie('start_time', initial_value=initial_start_time)
     end_day = AvailabilityDay('end_day')
     end_time = Cookie('end_time', initial_value=initial_end_time)
-    confirm = None
-    delete_queryset = None
-    merge_queryset = None
 
     def __init__(self):
         super().__init__()
@@ -144,7 +145,7 @@ class AvailabilityListView(LoginRequiredMixin, ProfiledListView):
         self.festival = current_festival(session)
 
         # Get warnings.
-        self.warning_rows = get_warnings(self.festival, self._get_warning_details)
+        self.warning_rows = get_warning_details(WarningStore.get_warnings(self.festival), self._get_warning_details)
 
         # Set up the fan filters. TODO: Generalize fan, section and subsection filtering, #393.
         self.fan = current_fan(session)
@@ -196,7 +197,7 @@ class AvailabilityListView(LoginRequiredMixin, ProfiledListView):
         session = self.request.session
         self.festival = current_festival(session)
         fan = self._get_availability_fan(session)
-        can_submit = self._can_submit(session, fan.name)
+        can_submit = self._can_submit(session, fan)
         reminders = self._get_reminders(session)
         action = ACTION_COOKIE.get(session, 'get') or 'def'
         warnings = [row['warning'] for row in self.warning_rows]
@@ -224,7 +225,7 @@ class AvailabilityListView(LoginRequiredMixin, ProfiledListView):
             'can_submit': can_submit,
             'action': action,
             'value': self.button_text_by_action[action],
-            'confirm': AvailabilityView.confirm,
+            'confirm': CONFIRM_COOKIE.get(session),
             'festival_start_dt': get_festival_dt(self.festival.start_date, DAY_START_TIME),
             'festival_end_dt': get_festival_dt(self.festival.end_date, DAY_BREAK_TIME),
             'fan_filter_props': self._get_filter_props(),
@@ -234,7 +235,7 @@ class AvailabilityListView(LoginRequiredMixin, ProfiledListView):
             'form_errors': ERRORS_COOKIE.get(session),
             'stats': ScreeningWarning.get_warning_stats(self.festival, warnings=warnings),
         }
-        AvailabilityView.confirm = False
+        CONFIRM_COOKIE.remove(session)
         unset_log(session)
         initialize_log(session, 'Manage availability')
         ERRORS_COOKIE.remove(session)
@@ -278,54 +279,31 @@ class AvailabilityListView(LoginRequiredMixin, ProfiledListView):
         fan = get_fan_by_name(fan_name)
         return fan
 
-    def _can_submit(self, session, fan_name):
+    @staticmethod
+    def _can_submit(session, fan):
         add_log(session, 'Check submit.')
         start_dt = AvailabilityView.get_dt(session, 'start_day', 'start_time')
         end_dt = AvailabilityView.get_dt(session, 'end_day', 'end_time')
         strf_spec = "%Y-%m-%d %H:%M"
-        add_log(session, f'Selected {fan_name} {start_dt.strftime(strf_spec)} - {end_dt.strftime(strf_spec)}.')
+        add_log(session, f'Selected {fan.name} {start_dt.strftime(strf_spec)} - {end_dt.strftime(strf_spec)}.')
         if end_dt <= start_dt:
             set_error(session, 'End of period earlier than begin', action='earlier')
             return False
-        elif self._period_in_existing_period(session, fan_name, start_dt, end_dt):
-            set_warning(session, 'Period fits in existing period, overlap will be deleted', 'delete')
-            handle_period_in_existing_period(session)
-            return True
-        elif self._period_overlaps_existing_period(session, fan_name, start_dt, end_dt):
-            set_warning(session, 'Period overlaps existing period, they will be merged', 'merge')
-            handle_period_overlaps_existing_period(session)
-            return True
-        set_info(session, 'add')
-        handle_new_period(session)
-        return True
-
-    @staticmethod
-    def _period_in_existing_period(session, fan_name, start_dt, end_dt):
-        add_log(session, f'Checking existence of {fan_name}, start<={start_dt}, end>={end_dt}.')
-        manager = Availabilities.availabilities
-        existing_set = manager.filter(fan__name=fan_name, start_dt__lte=start_dt, end_dt__gte=end_dt)
-        if existing_set:
-            add_log(session, f'Found {existing_set.count()} object(s):')
-            for queryset in existing_set:
-                add_log(session, f'"{str(queryset)}" contains the new period.')
-            AvailabilityView.delete_queryset = existing_set
-            return True
-        add_log(session, 'No availabilities that contain the new period.')
-        return False
 
-    @staticmethod
-    def _period_overlaps_existing_period(session, fan_name, start_dt, end_dt):
-        add_log(session, f'Checking overlap of {fan_name}, start_dt<={end_dt}, end_dt>={start_dt}.')
-        manager = Availabilities.availabilities
-        overlapping_set = manager.filter(fan__name=fan_name, start_dt__lte=end_dt, end_dt__gte=start_dt)
-        if overlapping_set:
-            add_log(session, f'Found {overlapping_set.count()} object(s):')
-            for queryset in overlapping_set:
-                add_log(session, f'"{str(queryset)}" can be merged.')
-            AvailabilityView.merge_queryset = overlapping_set
-            return True
-        add_log(session, 'No overlapping availabilities.')
-        return False
+        # Find out what the new period does to the existing periods.
+        availability_set = AvailabilitySet.for_fan(fan)
+        action = availability_set.get_action(start_dt, end_dt)
+        match action:
+            case 'delete':
+                set_warning(session, 'Period fits in existing period, overlap will be deleted', action)
+            case 'merge':
+                set_warning(session, 'Period overlaps existing period, they will be merged', action)
+            case _:
+                set_info(session, action)
+        obsolete, intervals = availability_set.plan(action, start_dt, end_dt)
+        inserted = [Availabilities(fan=fan, start_dt=start, end_dt=end) for start, end in intervals]
+        log_changes(session, obsolete, inserted, planned=True)
+        return True
 
 
 class AvailabilityFormView(LoginRequiredMixin, FormView):
@@ -348,13 +326,13 @@ class AvailabilityFormView(LoginRequiredMixin, FormView):
             case {'end_time': end_time}:
                 AvailabilityView.end_time.set(session, end_time)
             case {'add': _} | {'merge': _} | {'delete': _}:
-                AvailabilityView.confirm = True
+                CONFIRM_COOKIE.set(session, True)
             case {'add_confirmed': _}:
-                handle_new_period(session, update_db=True, action='add')
+                apply_new_period(session, 'add')
             case {'merge_confirmed': _}:
-                handle_period_overlaps_existing_period(session, update_db=True, action='merge')
+                apply_new_period(session, 'merge')
             case {'delete_confirmed': _}:
-                handle_period_in_existing_period(session, update_db=True, action='delete')
+                apply_new_period(session, 'delete')
             case {'add_canceled': _}:
                 add_log(session, 'Add new availability period canceled.')
             case {'merge_canceled': _}:
@@ -377,61 +355,22 @@ def get_new_availability_data(session):
     return fan_name, start_dt, end_dt
 
 
-def handle_new_period(session, update_db=False, action=None):
-    fan_name, start_dt, end_dt = get_new_availability_data(session)
-    fan = FilmFan.film_fans.get(name=fan_name)
-    new_obj = Availabilities(fan=fan, start_dt=start_dt, end_dt=end_dt)
-    if update_db:
-        try:
-            AvailabilityForm.add_availability(session, new_obj)
-        except Exception as e:
-            set_error(session, str(e), action)
-
-
-def get_overlapping_objects(session):
-    add_log(session, 'Add availability.')
-    fan_name, start_dt, end_dt = get_new_availability_data(session)
-    fan = FilmFan.film_fans.get(name=fan_name)
-    input_obj = Availabilities(fan=fan, start_dt=start_dt, end_dt=end_dt)
-    merge_objects_set = set(AvailabilityView.merge_queryset) | {input_obj}
-    new_start_dt = min([availability.start_dt for availability in merge_objects_set])
-    new_end_dt = max([availability.end_dt for availability in merge_objects_set])
-    new_obj = Availabilities(fan=fan, start_dt=new_start_dt, end_dt=new_end_dt)
-    return AvailabilityView.merge_queryset, new_obj
-
-
-def handle_period_overlaps_existing_period(session, update_db=False, action=None):
-    add_log(session, 'Merge overlapping periods.')
-    merge_objects, new_obj = get_overlapping_objects(session)
-    for merge_obj in merge_objects:
-        add_log(session, f'"{merge_obj}" will be deleted.')
-    add_log(session, f'"{new_obj}" will be inserted.')
-    if update_db:
-        try:
-            AvailabilityForm.merge_availabilities(session, merge_objects, new_obj)
-        except Exception as e:
-            set_error(session, str(e), action)
+def log_changes(session, obsolete, inserted, planned=False):
+    deleted_str, inserted_str = ('will be deleted', 'will be inserted') if planned else ('deleted', 'inserted')
+    for availability in obsolete:
+        add_log(session, f'"{availability}" {deleted_str}.')
+    for availability in inserted:
+        add_log(session, f'"{availability}" {inserted_str}.')
 
 
-def get_containing_objects(session):
+def apply_new_period(session, action):
     fan_name, start_dt, end_dt = get_new_availability_data(session)
     fan = FilmFan.film_fans.get(name=fan_name)
-    for org_obj in AvailabilityView.delete_queryset:
-        first_remaining_period = Availabilities(fan=fan, start_dt=org_obj.start_dt, end_dt=start_dt)
-        last_remaining_period = Availabilities(fan=fan, start_dt=end_dt, end_dt=org_obj.end_dt)
-        yield org_obj, first_remaining_period, last_remaining_period
-
-
-def handle_period_in_existing_period(session, update_db=False, action=None):
-    add_log(session, 'Delete part of existing availability.')
-    for org_obj, first_remaining_obj, last_remaining_obj in get_containing_objects(session):
-        add_log(session, f'"{org_obj}" will be deleted.')
-        add_log(session, f'"{first_remaining_obj}" will be inserted.')
-        add_log(session, f'"{last_remaining_obj}" will be inserted.')
-        if update_db:
-            try:
-                AvailabilityForm.delete_part_of_availability(session, org_obj,
-                                                             first_remaining_obj,
-                                                             last_remaining_obj)
-            except Exception as e:
-                set_error(session, str(e), action)
+    try:
+        obsolete, inserted = AvailabilitySet.apply(fan, action, start_dt, end_dt)
+    except DatabaseError as e:
+        add_log(session, f'Exception: {e}')
+        add_log(session, 'Database rolled back.')
+        set_error(session, str(e), action)
+    else:
+        log_changes(session, obsolete, inserted)
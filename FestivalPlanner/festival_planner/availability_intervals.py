@@ -0,0 +1,155 @@
+from django.db import transaction
+from django.db.models.deletion import Collector
+
+from availabilities.models import Availabilities
+from festival_planner.festival_data import mark_period_data
+
+
+def normalize(intervals):
+    """
+    Return the given (start, end) intervals as a sorted list of
+    non-empty intervals that neither overlap nor touch.
+    """
+    merged = []
+    for start, end in sorted(interval for interval in intervals if interval[0] < interval[1]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def add_interval(intervals, interval):
+    """Return the canonical union of the given intervals and the given interval."""
+    return normalize([*intervals, interval])
+
+
+def subtract_interval(intervals, interval):
+    """Return the canonical intervals that remain when the given interval is cut out."""
+    cut_start, cut_end = interval
+    if cut_start >= cut_end:
+        return normalize(intervals)
+    remaining = []
+    for start, end in normalize(intervals):
+        if end <= cut_start or start >= cut_end:
+            remaining.append((start, end))
+            continue
+        if start < cut_start:
+            remaining.append((start, cut_start))
+        if end > cut_end:
+            remaining.append((cut_end, end))
+    return remaining
+
+
+class AvailabilitySet:
+    """
+    The availability periods of one fan as a canonical set, sorted and
+    without overlapping or touching periods.
+
+    Adding, merging and deleting a period are set operations on the
+    intervals of the fan. The stored availabilities are brought in line
+    with the result in one transaction, by deleting the availabilities
+    that changed and inserting the new ones in bulk.
+    """
+    operation_by_action = {
+        'add': add_interval,
+        'merge': add_interval,
+        'delete': subtract_interval,
+    }
+
+    def __init__(self, fan, availabilities):
+        self.fan = fan
+        self.availability_by_interval = {}
+        for availability in availabilities:
+            availability.fan = fan
+            self.availability_by_interval[(availability.start_dt, availability.end_dt)] = availability
+        self.intervals = normalize(self.availability_by_interval)
+
+    @classmethod
+    def for_fan(cls, fan, lock=False):
+        availabilities = Availabilities.availabilities.filter(fan=fan)
+        return cls(fan, availabilities.select_for_update() if lock else availabilities)
+
+    @classmethod
+    def for_fans(cls, fans):
+        """Return the availability sets of the given fans, reading the availabilities in one query."""
+        availabilities_by_fan_id = {fan.id: [] for fan in fans}
+        for availability in Availabilities.availabilities.filter(fan__in=fans).order_by('start_dt'):
+            availabilities_by_fan_id[availability.fan_id].append(availability)
+        return [cls(fan, availabilities_by_fan_id[fan.id]) for fan in fans]
+
+    def get_action(self, start_dt, end_dt):
+        """
+        Return 'delete' if the given period lies within an existing
+        period, 'merge' if it overlaps or touches existing periods and
+        'add' otherwise.
+        """
+        for start, end in self.intervals:
+            if start <= start_dt and end_dt <= end:
+                return 'delete'
+            if start <= end_dt and start_dt <= end:
+                return 'merge'
+        return 'add'
+
+    def get_changes(self, intervals):
+        """
+        Return the stored availabilities to delete and the intervals to
+        insert to arrive at the given canonical intervals.
+        """
+        new_intervals = set(intervals)
+        obsolete = [a for interval, a in self.availability_by_interval.items() if interval not in new_intervals]
+        inserted = [interval for interval in intervals if interval not in self.availability_by_interval]
+        return obsolete, inserted
+
+    def plan(self, action, start_dt, end_dt):
+        intervals = self.operation_by_action[action](self.intervals, (start_dt, end_dt))
+        return self.get_changes(intervals)
+
+    def save_changes(self, obsolete, intervals):
+        """Delete the obsolete availabilities and insert the given intervals, return the inserted availabilities."""
+        if obsolete:
+            # Delete the availabilities at hand, a queryset delete would read them again, fan by fan.
+            obsolete_availabilities = Availabilities.availabilities.filter(id__in=[a.id for a in obsolete])
+            collector = Collector(using=obsolete_availabilities.db, origin=obsolete_availabilities)
+            collector.collect(obsolete)
+            collector.delete()
+        new_availabilities = [Availabilities(fan=self.fan, start_dt=start, end_dt=end) for start, end in intervals]
+        inserted = Availabilities.availabilities.bulk_create(new_availabilities)
+
+        changed = [(a.start_dt, a.end_dt) for a in obsolete] + intervals
+        if changed:
+            start_dt = min(start for start, _ in changed)
+            end_dt = max(end for _, end in changed)
+            mark_period_data(start_dt, end_dt, [self.fan.id])
+        return inserted
+
+    @classmethod
+    def apply(cls, fan, action, start_dt, end_dt):
+        """
+        Apply the given action with the given period to the availabilities
+        of the given fan. Return the deleted and inserted availabilities.
+        """
+        with transaction.atomic():
+            availability_set = cls.for_fan(fan, lock=True)
+            obsolete, intervals = availability_set.plan(action, start_dt, end_dt)
+            inserted = availability_set.save_changes(obsolete, intervals)
+        return obsolete, inserted
+
+    def plan_canonical(self, extra_intervals=()):
+        """
+        Return the availabilities to delete and the intervals to insert
+        to store the canonical form of the availabilities of the fan,
+        together with the given extra intervals.
+        """
+        return self.get_changes(normalize([*self.intervals, *extra_intervals]))
+
+    def save_canonical(self, extra_intervals=()):
+        """
+        Store the canonical form of the availabilities of the fan,
+        together with the given extra intervals.
+        Return the deleted and inserted availabilities.
+        """
+        obsolete, intervals = self.plan_canonical(extra_intervals)
+        with transaction.atomic():
+            inserted = self.save_changes(obsolete, intervals)
+        return obsolete, inserted
@@ -0,0 +1,82 @@
+import datetime
+from bisect import bisect_right
+
+from availabilities.models import Availabilities
+
+
+class AvailabilityTimeline:
+    """
+    Keeps the availability periods of fans as sorted, merged intervals,
+    so that whether a fan is available for a screening can be decided
+    by bisection instead of by a query per screening.
+
+    Periods of a fan that overlap or touch are merged, a fan being
+    available for a screening when one merged interval covers it.
+    """
+    def __init__(self, availabilities=()):
+        self.fan_by_id = {}
+        self.starts_by_fan_id = {}
+        self.ends_by_fan_id = {}
+        periods_by_fan_id = {}
+        for availability in availabilities:
+            self.fan_by_id[availability.fan_id] = availability.fan
+            periods_by_fan_id.setdefault(availability.fan_id, []).append((availability.start_dt, availability.end_dt))
+        for fan_id, periods in periods_by_fan_id.items():
+            self._set_intervals(fan_id, periods)
+
+    @classmethod
+    def for_period(cls, start_dt, end_dt, fans=None):
+        """
+        Return a timeline of the availabilities that overlap the given
+        period, of the given fans or of all fans.
+        """
+        availabilities = Availabilities.availabilities.filter(start_dt__lte=end_dt, end_dt__gte=start_dt)
+        if fans is not None:
+            availabilities = availabilities.filter(fan__in=fans)
+        return cls(availabilities.select_related('fan'))
+
+    @classmethod
+    def for_festival(cls, festival, fans=None):
+        start_dt = datetime.datetime.combine(festival.start_date, datetime.time.min)
+        end_dt = datetime.datetime.combine(festival.end_date + datetime.timedelta(days=1), datetime.time.max)
+        return cls.for_period(start_dt, end_dt, fans)
+
+    @classmethod
+    def for_screenings(cls, screenings, fans=None):
+        """Return a timeline of the period spanned by the given screenings."""
+        if not screenings:
+            return cls()
+        start_dt = min(screening.start_dt for screening in screenings)
+        end_dt = max(screening.end_dt for screening in screenings)
+        return cls.for_period(start_dt, end_dt, fans)
+
+    def is_available(self, fan, start_dt, end_dt):
+        starts = self.starts_by_fan_id.get(fan.id)
+        if not starts:
+            return False
+        pos = bisect_right(starts, start_dt) - 1
+        return pos >= 0 and self.ends_by_fan_id[fan.id][pos] >= end_dt
+
+    def fan_fits_screening(self, fan, screening):
+        return self.is_available(fan, screening.start_dt, screening.end_dt)
+
+    def get_available_fans(self, screening, fans=None):
+        """
+        Return the fans available for the given screening, in the order
+        of the given fans or else sorted by name.
+        """
+        if fans is None:
+            fans = sorted(self.fan_by_id.values(), key=lambda f: f.name)
+        return [fan for fan in fans if self.fan_fits_screening(fan, screening)]
+
+    def _set_intervals(self, fan_id, periods):
+        starts = []
+        ends = []
+        for start_dt, end_dt in sorted(periods):
+            if ends and start_dt <= ends[-1]:
+                ends[-1] = max(ends[-1], end_dt)
+            else:
+                starts.append(start_dt)
+                ends.append(end_dt)
+        self.starts_by_fan_id[fan_id] = starts
+        self.ends_by_fan_id[fan_id] = ends
@@ -1,6 +1,12 @@
-import copy
 import datetime
+import pickle
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
 
+from django.conf import settings
+
+from festival_planner import debug_tools
 from festival_planner.debug_tools import pr_debug, timed_method
 from festival_planner.tools import get_submit_name
 from festivals.models import current_festival
@@ -11,14 +17,27 @@ MAX_CACHES = 10
 
 FILM_SUBMIT_PREFIX = 'list_'
 
+LOCAL_BACKEND = 'local'
+SQLITE_BACKEND = 'sqlite'
+
 
 def get_film_list_submit_name(film, rating_value):
     return get_submit_name(FILM_SUBMIT_PREFIX, film.id, rating_value)
 
 
+def get_cache_backend():
+    """
+    Return the film rating cache backend as configured in the settings.
+    """
+    backend_name = getattr(settings, 'FILM_RATING_CACHE_BACKEND', LOCAL_BACKEND)
+    if backend_name == SQLITE_BACKEND:
+        return SqliteCacheBackend(settings.FILM_RATING_CACHE_PATH)
+    return LocalCacheBackend()
+
+
 class FilmRatingCache:
     caches_count = 0
-    cache_by_key = {}
+    backend = None
     FILTER_SEPARATOR = ':'
     KEY_VALUE_SEPARATOR = '_'
     FESTIVAL_FILTER_INDEX = 0
@@ -27,21 +46,22 @@ class FilmRatingCache:
     def __init__(self, session, errors):
         self.initialize_filters(session)
         self.errors = errors
+        if FilmRatingCache.backend is None:
+            FilmRatingCache.backend = get_cache_backend()
 
     def invalidate(self, cache_key):
         pr_debug(f'delete cache key with {cache_key.split(":")[0]}')
-        del self.cache_by_key[cache_key]
+        self.backend.delete(cache_key)
 
     def is_valid(self, session):
         cache_key = self.get_cache_key(session)
-        if cache_key in self.cache_by_key and self.cache_by_key[cache_key]:
-            return True
-        return False
+        return self.backend.contains(cache_key, self.get_generation(current_festival(session)))
 
     def festival_cache_keys(self, festival):
-        index = self.FESTIVAL_FILTER_INDEX
-        sep = self.FILTER_SEPARATOR
-        return [key for key in self.cache_by_key if key.split(sep)[index] == str(festival)]
+        return self.backend.festival_keys(self.get_festival_id(festival), self.get_generation(festival))
+
+    def get_generation(self, festival):
+        return self.backend.get_generation(self.get_festival_id(festival))
 
     @classmethod
     def get_active_filter_keys(cls, session):
@@ -64,7 +84,7 @@ class FilmRatingCache:
     def get_film_rows(self, session):
         cache_key = self.get_cache_key(session)
         try:
-            cache_data = self.cache_by_key[cache_key]
+            cache_data = self.backend.get(cache_key, self.get_generation(current_festival(session)))
         except KeyError as e:
             self.errors.append(f'{e} getting film rows')
             return []
@@ -72,11 +92,13 @@ class FilmRatingCache:
 
     @timed_method
     def set_film_rows(self, session, film_rows):
+        festival = current_festival(session)
         cache_key = self.get_cache_key(session)
-        cache_data = FilmRatingCacheData(film_rows)
-        self.cache_by_key[cache_key] = cache_data
+        festival_id = self.get_festival_id(festival)
+        cache_data = FilmRatingCacheData(film_rows, festival_id, self.get_generation(festival))
+        self.backend.set(cache_key, cache_data)
         self.check_invalidate_caches()
-        pr_debug(f'{len(self.get_film_rows(session))} records', with_time=True)
+        pr_debug(f'{len(film_rows)} records', with_time=True)
 
     def update_festival_caches(self, session, film, fan, rating_value):
         festival = current_festival(session)
@@ -92,51 +114,45 @@ class FilmRatingCache:
                 choice = choice_list[0]
                 choice['disabled'] = new_value
 
-        # Get the film rows from cache.
-        film_rows = self.cache_by_key[cache_key].get_film_rows()
+        def _patch_film_row(film_row):
+            nonlocal fan_data
+            fan_data = [r for r in film_row['fan_ratings'] if r['fan'] == fan][0]
 
-        # Filter out film data.
+            # Update changed data.
+            fan_data['rating_str'] = rating_str(rating_value)
+            _update_dropdown_choice(lambda c: c['disabled'], new_value=False)
+            submit_name = get_film_list_submit_name(film, rating_value)
+            _update_dropdown_choice(lambda c: c['submit_name'] == submit_name)
+
+        # Patch the film row in the cache.
+        fan_data = None
         try:
-            film_row = [row for row in film_rows if row['film'].id == film.id][0]
-        except (TypeError, IndexError) as e:
+            self.backend.patch_film_row(cache_key, film.id, _patch_film_row)
+        except KeyError as e:
             pr_debug(f'{e} getting film row for {film=}')
             self.errors.append(f'{e} getting film row for {film=}')
-        else:
-            # Filter out fan data.
-            try:
-                fan_data = [r for r in film_row['fan_ratings'] if r['fan'] == fan][0]
-            except IndexError as e:
-                pr_debug(f'{IndexError.__name__} getting rating for {fan=}')
-                self.errors.append(f'{e} getting rating for {fan=}')
-            else:
-                # Update changed data.
-                fan_data['rating_str'] = rating_str(rating_value)
-                _update_dropdown_choice(lambda c: c['disabled'], new_value=False)
-                submit_name = get_film_list_submit_name(film, rating_value)
-                _update_dropdown_choice(lambda c: c['submit_name'] == submit_name)
+        except IndexError as e:
+            pr_debug(f'{IndexError.__name__} getting rating for {fan=}')
+            self.errors.append(f'{e} getting rating for {fan=}')
 
     @timed_method
     def check_invalidate_caches(self):
-        pr_debug(f'{len(self.cache_by_key)} caches', with_time=True)
-
-        # Delete expired caches
-        invalid_cache_keys = [k for k, c in self.cache_by_key.items() if c.expire_date < datetime.datetime.now()]
-        for cache_key in invalid_cache_keys:
-            self.invalidate(cache_key)
+        # Delete expired caches.
+        self.backend.delete_expired(datetime.datetime.now())
 
-        # Delete the oldest caches until cache count is not above max.
-        if len(self.cache_by_key) > MAX_CACHES:
-            items = sorted(self.cache_by_key.items(), key=lambda i: i[1].expire_date, reverse=True)
-            old_cache_items = items[MAX_CACHES:]
-            for cache_key, cache_data in old_cache_items:
-                self.invalidate(cache_key)
+        # Delete the least recently used caches until cache count is not above max.
+        self.backend.evict(MAX_CACHES)
 
-        pr_debug(f'{len(self.cache_by_key)} caches', with_time=True)
+        # Counting the caches takes a query in the SQLite backend.
+        if not debug_tools.SUPPRESS_DEBUG_PRINT:
+            pr_debug(f'{self.backend.count()} caches', with_time=True)
 
     def invalidate_festival_caches(self, festival):
-        invalid_cache_keys = self.festival_cache_keys(festival)
-        for invalid_cache_key in invalid_cache_keys:
-            self.invalidate(invalid_cache_key)
+        self.backend.increment_generation(self.get_festival_id(festival))
+
+    @staticmethod
+    def get_festival_id(festival):
+        return festival.id if festival else 0
 
     @classmethod
     def get_cache_key(cls, session):
@@ -160,8 +176,11 @@ class FilmRatingCache:
 class FilmRatingCacheData:
     expiry_timedelta = datetime.timedelta(hours=EXPIRY_HOURS)
 
-    def __init__(self, film_rows):
-        self.film_rows = copy.deepcopy(film_rows)
+    def __init__(self, film_rows, festival_id=None, generation=0):
+        self.film_rows = film_rows
+        self.festival_id = festival_id
+        self.generation = generation
+        self.row_by_film_id = {row['film'].id: row for row in film_rows}
         self.expire_date = self.new_expire_date()
 
     def __str__(self):
@@ -177,3 +196,195 @@ class FilmRatingCacheData:
         self.reset_expire_date()
         return self.film_rows
 
+    def get_film_row(self, film_id):
+        return self.row_by_film_id[film_id]
+
+
+class LocalCacheBackend:
+    """
+    Keeps film rating caches in the memory of the current process.
+    The least recently used cache comes first.
+    """
+    def __init__(self):
+        self.data_by_key = OrderedDict()
+        self.generation_by_festival_id = {}
+
+    def keys(self):
+        return list(self.data_by_key.keys())
+
+    def count(self):
+        return len(self.data_by_key)
+
+    def contains(self, cache_key, generation):
+        try:
+            cache_data = self.data_by_key[cache_key]
+        except KeyError:
+            return False
+        return cache_data.generation == generation
+
+    def festival_keys(self, festival_id, generation):
+        return [k for k, d in self.data_by_key.items() if (d.festival_id, d.generation) == (festival_id, generation)]
+
+    def get(self, cache_key, generation):
+        cache_data = self.data_by_key[cache_key]
+        if cache_data.generation != generation:
+            raise KeyError(cache_key)
+        self.data_by_key.move_to_end(cache_key)
+        return cache_data
+
+    def set(self, cache_key, cache_data):
+        self.data_by_key[cache_key] = cache_data
+        self.data_by_key.move_to_end(cache_key)
+
+    def delete(self, cache_key):
+        del self.data_by_key[cache_key]
+
+    def patch_film_row(self, cache_key, film_id, patch_func):
+        patch_func(self.data_by_key[cache_key].get_film_row(film_id))
+
+    def delete_expired(self, now):
+        expired_keys = [k for k, d in self.data_by_key.items() if d.expire_date < now]
+        for cache_key in expired_keys:
+            self.delete(cache_key)
+
+    def evict(self, max_caches):
+        while len(self.data_by_key) > max_caches:
+            self.data_by_key.popitem(last=False)
+
+    def get_generation(self, festival_id):
+        return self.generation_by_festival_id.get(festival_id, 0)
+
+    def increment_generation(self, festival_id):
+        self.generation_by_festival_id[festival_id] = self.get_generation(festival_id) + 1
+
+
+class SqliteCacheBackend:
+    """
+    Keeps film rating caches in a SQLite file, so that they are shared
+    by all processes serving the application.
+    Film rows are stored one by one, so that a rating change patches a
+    single row.
+    """
+    schema = [
+        'CREATE TABLE IF NOT EXISTS cache_entry ('
+        'cache_key TEXT PRIMARY KEY, festival_id INTEGER, generation INTEGER, '
+        'expire_date TIMESTAMP, last_used REAL)',
+        'CREATE INDEX IF NOT EXISTS cache_entry_last_used ON cache_entry (last_used)',
+        'CREATE TABLE IF NOT EXISTS film_row ('
+        'cache_key TEXT, film_id INTEGER, row_nr INTEGER, row BLOB, PRIMARY KEY (cache_key, film_id))',
+        'CREATE TABLE IF NOT EXISTS festival_generation (festival_id INTEGER PRIMARY KEY, generation INTEGER)',
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self.use_count = 0
+        with self._transaction() as connection:
+            for statement in self.schema:
+                connection.execute(statement)
+
+    @contextmanager
+    def _transaction(self):
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    def _next_use(self):
+        self.use_count += 1
+        return datetime.datetime.now().timestamp() + self.use_count * 1e-9
+
+    def keys(self):
+        with self._transaction() as connection:
+            return [key for (key,) in connection.execute('SELECT cache_key FROM cache_entry')]
+
+    def count(self):
+        with self._transaction() as connection:
+            return connection.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+
+    def contains(self, cache_key, generation):
+        with self._transaction() as connection:
+            query = 'SELECT 1 FROM cache_entry WHERE cache_key = ? AND generation = ?'
+            return connection.execute(query, (cache_key, generation)).fetchone() is not None
+
+    def festival_keys(self, festival_id, generation):
+        with self._transaction() as connection:
+            query = 'SELECT cache_key FROM cache_entry WHERE festival_id = ? AND generation = ?'
+            return [key for (key,) in connection.execute(query, (festival_id, generation))]
+
+    def get(self, cache_key, generation):
+        with self._transaction() as connection:
+            query = 'SELECT festival_id FROM cache_entry WHERE cache_key = ? AND generation = ?'
+            entry = connection.execute(query, (cache_key, generation)).fetchone()
+            if entry is None:
+                raise KeyError(cache_key)
+            query = 'SELECT row FROM film_row WHERE cache_key = ? ORDER BY row_nr'
+            film_rows = [pickle.loads(row) for (row,) in connection.execute(query, (cache_key,))]
+            cache_data = FilmRatingCacheData(film_rows, entry[0], generation)
+            query = 'UPDATE cache_entry SET expire_date = ?, last_used = ? WHERE cache_key = ?'
+            connection.execute(query, (cache_data.expire_date.isoformat(), self._next_use(), cache_key))
+        return cache_data
+
+    def set(self, cache_key, cache_data):
+        with self._transaction() as connection:
+            self._delete(connection, cache_key)
+            connection.execute('INSERT INTO cache_entry VALUES (?, ?, ?, ?, ?)', (
+                cache_key,
+                cache_data.festival_id,
+                cache_data.generation,
+                cache_data.expire_date.isoformat(),
+                self._next_use(),
+            ))
+            connection.executemany('INSERT INTO film_row VALUES (?, ?, ?, ?)', [
+                (cache_key, row['film'].id, row_nr, pickle.dumps(row))
+                for row_nr, row in enumerate(cache_data.film_rows)
+            ])
+
+    def delete(self, cache_key):
+        with self._transaction() as connection:
+            self._delete(connection, cache_key)
+
+    @staticmethod
+    def _delete(connection, cache_key):
+        connection.execute('DELETE FROM cache_entry WHERE cache_key = ?', (cache_key,))
+        connection.execute('DELETE FROM film_row WHERE cache_key = ?', (cache_key,))
+
+    def patch_film_row(self, cache_key, film_id, patch_func):
+        with self._transaction() as connection:
+            query = 'SELECT row FROM film_row WHERE cache_key = ? AND film_id = ?'
+            record = connection.execute(query, (cache_key, film_id)).fetchone()
+            if record is None:
+                raise KeyError(film_id)
+            film_row = pickle.loads(record[0])
+            patch_func(film_row)
+            query = 'UPDATE film_row SET row = ? WHERE cache_key = ? AND film_id = ?'
+            connection.execute(query, (pickle.dumps(film_row), cache_key, film_id))
+
+    def delete_expired(self, now):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache_entry WHERE expire_date < ?', (now.isoformat(),))
+            connection.execute('DELETE FROM film_row WHERE cache_key NOT IN (SELECT cache_key FROM cache_entry)')
+
+    def evict(self, max_caches):
+        with self._transaction() as connection:
+            query = ('DELETE FROM cache_entry WHERE cache_key IN ('
+                     'SELECT cache_key FROM cache_entry ORDER BY last_used DESC LIMIT -1 OFFSET ?)')
+            if connection.execute(query, (max_caches,)).rowcount:
+                connection.execute('DELETE FROM film_row WHERE cache_key NOT IN (SELECT cache_key FROM cache_entry)')
+
+    def get_generation(self, festival_id):
+        with self._transaction() as connection:
+            query = 'SELECT generation FROM festival_generation WHERE festival_id = ?'
+            record = connection.execute(query, (festival_id,)).fetchone()
+        return record[0] if record else 0
+
+    def increment_generation(self, festival_id):
+        with self._transaction() as connection:
+            connection.execute('INSERT OR IGNORE INTO festival_generation VALUES (?, 0)', (festival_id,))
+            query = 'UPDATE festival_generation SET generation = generation + 1 WHERE festival_id = ?'
+            connection.execute(query, (festival_id,))
@@ -0,0 +1,114 @@
+import datetime
+import hashlib
+import json
+
+from django.db.models import F, Max, Sum
+from django.views.decorators.http import condition
+
+from festival_planner.fan_action import ACTION_KEY_PREFIX
+from festival_planner.log_store import LogStore
+from festival_planner.request_context import resolve_in_request
+from festivals.models import DataStamp, current_festival
+
+
+class DataStampStore:
+    """
+    Keeps a version and modification time per festival and fan in the
+    data stamps table, so that the heavy list views can tell whether
+    the page a browser holds is still current without computing it.
+
+    Creating, changing and deleting the objects of a festival increases
+    the versions of that festival for all fans, changes of objects that
+    are shown in all festivals, like fans and theaters, increase the
+    versions of all festivals.
+    """
+
+    @classmethod
+    def mark(cls, festival_ids=None):
+        """Increase the versions of the given festivals, of all festivals if none are given."""
+        stamps = DataStamp.stamps.all() if festival_ids is None else DataStamp.stamps.filter(festival_id__in=festival_ids)
+        stamps.update(version=F('version') + 1, modified=datetime.datetime.now())
+
+    @classmethod
+    def get_festival_version(cls, festival):
+        """Return the latest version of the data of the given festival, None if it has no stamps."""
+        return DataStamp.stamps.filter(festival=festival).aggregate(version=Max('version'))['version']
+
+    @classmethod
+    def get_stamp(cls, session, all_festivals=False):
+        """
+        Return the version of the data of the current festival, or of all
+        festivals, as seen by the current fan.
+        Return None if the session has no fan.
+        """
+        fan_name = session.get('fan_name')
+        if not fan_name:
+            return None
+        stamps = DataStamp.stamps.filter(fan__name=fan_name)
+        if all_festivals:
+            version = stamps.aggregate(version=Sum('version'))['version']
+            return None if version is None else f'all.{version}'
+
+        # Without a festival in the session the views show the default festival.
+        festival_id = session.get('festival') or getattr(current_festival(session), 'id', None)
+        version = stamps.filter(festival_id=festival_id).values_list('version', flat=True).first()
+        return None if version is None else f'{festival_id}.{version}'
+
+    @classmethod
+    def create_stamps(cls, festivals, fans):
+        stamps = [DataStamp(festival=festival, fan=fan) for festival in festivals for fan in fans]
+        DataStamp.stamps.bulk_create(stamps, ignore_conflicts=True)
+
+
+def get_now():
+    return datetime.datetime.now()
+
+
+def get_session_digest(request):
+    """
+    Return a digest of the session and the full path of the given
+    request, with the date, as the pages mark the current day. The pages
+    show how long ago the last fan action was, so with fan actions in the
+    session the minute is included instead.
+    """
+    session_items = sorted(request.session.items())
+    now = get_now()
+    has_actions = any(key.startswith(ACTION_KEY_PREFIX) for key, _ in session_items)
+    clock = now.replace(second=0, microsecond=0) if has_actions else now.date()
+    state = json.dumps([clock, request.get_full_path(), session_items], default=str)
+    return hashlib.blake2b(state.encode(), digest_size=16).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    Lets a list view answer conditional GET requests with 304 Not
+    Modified before the view is set up, when neither the data stamp of
+    the current festival and fan nor the session have changed since the
+    browser received the page. Only the ETag is sent, as a modification
+    time can't tell sessions apart.
+
+    Pages that display a log are always rendered, as the log lines are
+    kept outside the session.
+    """
+    all_festivals = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        return condition(etag_func=cls.get_etag)(view)
+
+    @classmethod
+    def get_etag(cls, request, *args, **kwargs):
+        stamp = cls.get_data_stamp(request)
+        return None if stamp is None else f'{cls.__name__}-{stamp}-{get_session_digest(request)}'
+
+    @classmethod
+    def get_data_stamp(cls, request):
+        if not request.user.is_authenticated:
+            return None
+        session = request.session
+        if LogStore.get_log_id(session) is not None:
+            return None
+        key = ('data_stamp', session.get('festival'), session.get('fan_name'), cls.all_festivals)
+        return resolve_in_request(key, lambda: DataStampStore.get_stamp(session, cls.all_festivals), session)
+
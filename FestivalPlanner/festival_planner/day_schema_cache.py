@@ -0,0 +1,109 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+from django.db.models import F
+
+from screenings.models import Screening, DaySchemaVersion
+
+MAX_CACHED_ROWS = 2000
+ONE_DAY = datetime.timedelta(days=1)
+
+
+class DaySchemaCache:
+    """
+    Keeps the rendered screen rows of the day schema in memory, so that
+    the screening properties of a festival day are only computed again
+    when the data of that day has changed.
+
+    The rows are found by a key that contains the version of the day.
+    The versions are kept in the database, so that all processes see
+    the same versions. Saving or deleting screenings, attendances,
+    tickets, availabilities and ratings increases the versions of the
+    days they concern, rows of older versions are never found again and
+    are dropped when the cache is full. The rows show the colors and
+    abbreviations of the theaters and screens, so changing those
+    increases the versions of all days.
+    """
+    row_by_key = OrderedDict()
+    hit_count = 0
+    miss_count = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def get_version(cls, festival, date):
+        day_version, _ = DaySchemaVersion.day_versions.get_or_create(festival=festival, date=date)
+        return day_version.version
+
+    @classmethod
+    def get_row(cls, key):
+        """Return the cached row of the given key, None if it isn't cached."""
+        with cls.lock:
+            row = cls.row_by_key.get(key)
+            if row is None:
+                cls.miss_count += 1
+            else:
+                cls.hit_count += 1
+                cls.row_by_key.move_to_end(key)
+        return row
+
+    @classmethod
+    def set_row(cls, key, row):
+        with cls.lock:
+            cls.row_by_key[key] = row
+            cls.row_by_key.move_to_end(key)
+            while len(cls.row_by_key) > MAX_CACHED_ROWS:
+                cls.row_by_key.popitem(last=False)
+
+    @classmethod
+    def hit_rate(cls):
+        lookup_count = cls.hit_count + cls.miss_count
+        return cls.hit_count / lookup_count if lookup_count else 0.0
+
+    @classmethod
+    def reset_counters(cls):
+        with cls.lock:
+            cls.hit_count = 0
+            cls.miss_count = 0
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.row_by_key = OrderedDict()
+        cls.reset_counters()
+
+    @classmethod
+    def mark(cls, festival_ids=None, dates=None):
+        """
+        Increase the versions of the given days of the given festivals,
+        of all days or all festivals if none are given.
+        """
+        day_versions = DaySchemaVersion.day_versions.all()
+        if festival_ids is not None:
+            day_versions = day_versions.filter(festival_id__in=festival_ids)
+        if dates is not None:
+            day_versions = day_versions.filter(date__in=dates)
+        day_versions.update(version=F('version') + 1)
+
+    @classmethod
+    def get_film_dates(cls, film_ids):
+        """Return the days with screenings of the given films."""
+        return set(Screening.screenings.filter(film_id__in=film_ids).dates('start_dt', 'day'))
+
+    @classmethod
+    def get_screening_dates(cls, screenings):
+        """
+        Return the days of the given screenings, the days around them and
+        the days with screenings of the same films.
+        Screenings around midnight can overlap screenings of the next day,
+        attending a film changes the status of its screenings on other days.
+        """
+        dates = {s.start_dt.date() + days * ONE_DAY for s in screenings for days in (-1, 0, 1)}
+        return dates | cls.get_film_dates({s.film_id for s in screenings})
+
+    @classmethod
+    def get_period_dates(cls, start_dt, end_dt):
+        """Return the days that the given period concerns."""
+        # The day schema of a day shows the periods until the day break of the next morning.
+        first_date = start_dt.date() - ONE_DAY
+        return [first_date + days * ONE_DAY for days in range((end_dt.date() - first_date).days + 1)]
@@ -1,10 +1,19 @@
 import functools
 import inspect
-from datetime import datetime, timedelta
-
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
 from django.views.generic import ListView
 
 SUPPRESS_DEBUG_PRINT = False
+CURRENT_TRACE = ContextVar('current_trace', default=None)
+PERCENTILES = [50, 90, 99]
 
 
 def calling_func(frame_depth=0):
@@ -48,25 +57,39 @@ def pr_time(message):
 def timed_method(func):
     """
     Enclose func between 'start' and 'done' debug messages.
+    When a request is being profiled, the call is recorded as a span.
     """
     @functools.wraps(func)
     def time_wrapper(*args, **kwargs):
-        start_dt = datetime.now(tz=None)
-        try:
-            frame = inspect.currentframe().f_back
-            lineno = frame.f_lineno
-            code = frame.f_code.co_name
-        finally:
-            del frame
-        pr_time(f'START {func.__name__} {func.__module__}, called from {code}: {lineno}')
-        result = func(*args, **kwargs)
-        duration = datetime.now(tz=None) - start_dt
-        seconds = duration.total_seconds()
-        pr_time(f'DONE  {func.__name__} {func.__module__}{seconds:7.3f}s')
-        return result
+        trace = CURRENT_TRACE.get()
+        if trace is not None:
+            span = trace.start_span(func.__qualname__)
+            try:
+                return _print_timed_call(func, *args, **kwargs)
+            finally:
+                trace.finish_span(span)
+        return _print_timed_call(func, *args, **kwargs)
     return time_wrapper
 
 
+def _print_timed_call(func, *args, **kwargs):
+    if SUPPRESS_DEBUG_PRINT:
+        return func(*args, **kwargs)
+    start_dt = datetime.now(tz=None)
+    try:
+        frame = inspect.currentframe().f_back.f_back
+        lineno = frame.f_lineno
+        code = frame.f_code.co_name
+    finally:
+        del frame
+    pr_time(f'START {func.__name__} {func.__module__}, called from {code}: {lineno}')
+    result = func(*args, **kwargs)
+    duration = datetime.now(tz=None) - start_dt
+    seconds = duration.total_seconds()
+    pr_time(f'DONE  {func.__name__} {func.__module__}{seconds:7.3f}s')
+    return result
+
+
 class ExceptionTracer:
     def __init__(self):
         self.errors = []
@@ -93,68 +116,211 @@ class ExceptionTracer:
         return self.errors
 
 
-class DurationProfiler:
-    props_by_label = {}
-    objects = []
-
-    def __init__(self, label, active=True, newline=False, caller_depth=0):
+class Span:
+    """
+    Duration and database queries of one profiled call, with the spans
+    of the profiled calls it made.
+    """
+    def __init__(self, label, parent=None, caller=None, newline=False):
         self.label = label
-        self.caller_depth = caller_depth
-        self.props_by_label[label] = {
-            'duration': timedelta(),
-            'call_count': 0,
-            'active': active,
-            'props_by_caller': {},
-            'newline': newline,
+        self.parent = parent
+        self.caller = caller
+        self.newline = newline
+        self.children = []
+        self.start_time = time.perf_counter()
+        self.duration = 0.0
+        self.query_count = 0
+        self.query_duration = 0.0
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start_time
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'caller': self.caller,
+            'duration_ms': round(self.duration * 1000, 3),
+            'query_count': self.query_count,
+            'query_ms': round(self.query_duration * 1000, 3),
+            'children': [child.as_dict() for child in self.children],
         }
-        self.last_start_time = None
-        DurationProfiler.objects.append(self)
-
-    def start(self):
-        self.last_start_time = datetime.now()
-        self.props_by_label[self.label]['call_count'] += 1
-
-    def done(self):
-        last_duration = datetime.now() - self.last_start_time
-        self.props_by_label[self.label]['duration'] += last_duration
-        if self.caller_depth:
-            caller = calling_func(frame_depth=self.caller_depth)
-            try:
-                self._caller_props(self.label)[caller]['duration'] += last_duration
-                self._caller_props(self.label)[caller]['count'] += 1
-            except KeyError:
-                self._caller_props(self.label)[caller] = {
-                    'duration': last_duration,
-                    'count': 1,
-                }
 
-    @classmethod
-    def report(cls):
-        durations = [cls._label_report(label) for label in cls.props_by_label if cls.props_by_label[label]['active']]
-        cls._reset()
-        return durations
+    def report_lines(self, depth=0):
+        newline = '\n' if self.newline else ''
+        caller = f' from {self.caller}' if self.caller else ''
+        label = f'{"  " * depth}{self.label}{caller}'
+        yield f'{newline}{label:40}: {self.duration:9.4f}s {self.query_count:5} queries {self.query_duration:9.4f}s'
+        for child in self.children:
+            yield from child.report_lines(depth + 1)
 
-    @classmethod
-    def _label_report(cls, label):
-        duration = cls.props_by_label[label]['duration']
-        count = cls.props_by_label[label]['call_count']
-        newline = '\n' if cls.props_by_label[label]['newline'] else ''
-        report = newline + f'{label:16}: {duration} {count:5}'
-        for caller, props in cls._caller_props(label).items():
-            caller_line = f"{label:16}from {caller:40}: {props['duration']} {props['count']}"
-            report += '\n' + caller_line
-        return report
 
-    @classmethod
-    def _caller_props(cls, label):
-        return cls.props_by_label[label]['props_by_caller']
+class ProfileTrace:
+    """
+    Span tree of one request.
+
+    Each request being profiled has its own trace, which is found
+    through a context variable, so concurrent requests don't share
+    their spans. Queries are attributed to the spans that are open
+    while they are executed.
+    """
+    root_label = 'request'
+
+    def __init__(self, path=None):
+        self.path = path
+        self.root = Span(self.root_label)
+        self.current_span = self.root
+
+    def start_span(self, label, caller=None, newline=False):
+        span = Span(label, self.current_span, caller, newline)
+        self.current_span.children.append(span)
+        self.current_span = span
+        return span
+
+    def finish_span(self, span):
+        span.finish()
+        self.current_span = span.parent or self.root
+
+    def finish(self):
+        self.root.finish()
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        start_time = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start_time
+            span = self.current_span
+            while span is not None:
+                span.query_count += 1
+                span.query_duration += duration
+                span = span.parent
+
+    def as_dict(self):
+        return {'path': self.path} | self.root.as_dict()
+
+    def report(self):
+        return list(self.root.report_lines())
+
+
+class ProfileAggregator:
+    """
+    Collects the spans of profiled requests by label, keeping the most
+    recent samples to compute latency percentiles from.
+    """
+    max_samples = 1000
+    max_traces = 20
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples_by_label = {}
+        self.count_by_label = {}
+        self.recent_traces = deque(maxlen=self.max_traces)
+
+    def add_trace(self, trace):
+        with self.lock:
+            for span in trace.root.walk():
+                try:
+                    samples = self.samples_by_label[span.label]
+                except KeyError:
+                    samples = deque(maxlen=self.max_samples)
+                    self.samples_by_label[span.label] = samples
+                    self.count_by_label[span.label] = 0
+                samples.append((span.duration, span.query_count, span.query_duration))
+                self.count_by_label[span.label] += 1
+            self.recent_traces.append(trace)
+
+    def reset(self):
+        with self.lock:
+            self.samples_by_label = {}
+            self.count_by_label = {}
+            self.recent_traces.clear()
+
+    def report(self):
+        with self.lock:
+            sample_items = [(label, list(samples)) for label, samples in self.samples_by_label.items()]
+            count_by_label = dict(self.count_by_label)
+        return {label: self._label_report(samples, count_by_label[label]) for label, samples in sample_items}
+
+    def traces(self):
+        with self.lock:
+            return [trace.as_dict() for trace in self.recent_traces]
+
+    @staticmethod
+    def percentile(sorted_values, percent):
+        """Nearest-rank percentile of the given sorted values."""
+        rank = math.ceil(percent / 100 * len(sorted_values))
+        return sorted_values[max(rank, 1) - 1]
 
     @classmethod
-    def _reset(cls):
-        for obj in cls.objects:
-            cls.props_by_label[obj.label]['duration'] = timedelta()
-            cls.props_by_label[obj.label]['call_count'] = 0
-            cls.props_by_label[obj.label]['props_by_caller'] = {}
+    def _label_report(cls, samples, count):
+        durations = sorted(sample[0] for sample in samples)
+        query_counts = [sample[1] for sample in samples]
+        query_durations = [sample[2] for sample in samples]
+        label_report = {
+            'count': count,
+            'sample_count': len(samples),
+            'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+            'max_ms': round(durations[-1] * 1000, 3),
+            'mean_queries': round(sum(query_counts) / len(query_counts), 2),
+            'mean_query_ms': round(sum(query_durations) / len(query_durations) * 1000, 3),
+        }
+        for percent in PERCENTILES:
+            label_report[f'p{percent}_ms'] = round(cls.percentile(durations, percent) * 1000, 3)
+        return label_report
+
+
+PROFILE_AGGREGATOR = ProfileAggregator()
+
+
+def profiling_enabled():
+    return getattr(settings, 'PROFILING_ENABLED', False)
+
+
+def current_trace():
+    return CURRENT_TRACE.get()
+
+
+class ProfilingMiddleware:
+    """
+    Records the span tree of each request when settings.PROFILING_ENABLED
+    is set and adds it to the aggregated statistics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling_enabled():
+            return self.get_response(request)
+        trace = ProfileTrace(request.path)
+        token = CURRENT_TRACE.set(trace)
+        try:
+            with connection.execute_wrapper(trace.query_wrapper):
+                response = self.get_response(request)
+        finally:
+            CURRENT_TRACE.reset(token)
+            trace.finish()
+            PROFILE_AGGREGATOR.add_trace(trace)
+        return response
+
+
+class DurationProfiler:
+    """
+    Label of the spans that profiled_method() records.
+
+    When caller_depth is given, the span also records the function that
+    called the profiled method, caller_depth frames up.
+    """
+    def __init__(self, label, active=True, newline=False, caller_depth=0):
+        self.label = label
+        self.active = active
+        self.newline = newline
+        self.caller_depth = caller_depth
 
 
 SETUP_PROFILER = DurationProfiler('setup')
@@ -164,7 +330,6 @@ GET_CONTEXT_PROFILER = DurationProfiler('context', active=True)
 OVERLAP_PROFILER = DurationProfiler('overlap', active=True, caller_depth=3)
 
 GET_WARNINGS_PROFILER = DurationProfiler('get_warnings', newline=True, caller_depth=0)
-WARNING_KEYS_PROFILER = DurationProfiler('warning_keys')
 GET_AV_KEEPER_PROFILER = DurationProfiler('get_av_keeper')
 FAN_WARNINGS_PROFILER = DurationProfiler('fan_warnings', caller_depth=2)
 
@@ -172,14 +337,20 @@ LISTVIEW_DISPATCH_PROFILER = DurationProfiler('list_dispatch', newline=True, cal
 
 
 def profiled_method(duration_profiler: DurationProfiler):
-    """Bookkeep duration of given duration profiler"""
+    """Record a span with the label of the given duration profiler"""
     def decorator_profiled_method(func):
         @functools.wraps(func)
         def duration_wrapper(*args, **kwargs):
-            duration_profiler.start()
-            result = func(*args, **kwargs)
-            duration_profiler.done()
-            return result
+            trace = CURRENT_TRACE.get()
+            if trace is None or not duration_profiler.active:
+                return func(*args, **kwargs)
+            caller_depth = duration_profiler.caller_depth
+            caller = calling_func(frame_depth=caller_depth - 1) if caller_depth else None
+            span = trace.start_span(duration_profiler.label, caller, duration_profiler.newline)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                trace.finish_span(span)
         return duration_wrapper
 
     return decorator_profiled_method
@@ -190,6 +361,7 @@ class ProfiledListView(ListView):
     def render_to_response(self, context, **response_kwargs):
         """Defined here for debugging only"""
         response = super().render_to_response(context, **response_kwargs)
-        if not SUPPRESS_DEBUG_PRINT:
-            print(f'{"\n".join(DurationProfiler.report())}')
+        trace = CURRENT_TRACE.get()
+        if trace is not None and not SUPPRESS_DEBUG_PRINT:
+            print(f'{"\n".join(trace.report())}')
         return response
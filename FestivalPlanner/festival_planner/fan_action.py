@@ -1,12 +1,18 @@
-import copy
 import datetime
 
 from festival_planner.cookie import Cookie
+from festival_planner.log_store import LogStore
 from festivals.models import current_festival
 from films.models import current_fan, get_rating_name
 
+ACTION_KEY_PREFIX = 'action_'
+
 
 class BaseAction:
+    """
+    Keeps the last action of a kind in the log store, the session only
+    holds the key of the stored action.
+    """
     def __init__(self, action_key, known_keys, initial_value=None):
         self.action_key = action_key
         self.action_cookie = None
@@ -36,18 +42,18 @@ class BaseAction:
         # Merge the keyword arguments with the existing action dictionary.
         action |= kwargs
 
-        # Store the action dictionary as cookie.
-        self.action_cookie.set(session, copy.deepcopy(action))
+        # Store the action dictionary.
+        LogStore.set_action(session, self.action_cookie.get_cookie_key(), action)
 
-    def update(self, **kwargs):
-        action = self.action_cookie.get()
+    def update(self, session, **kwargs):
+        action = LogStore.get_action(session, self.action_cookie.get_cookie_key())
         action |= kwargs
-        self.action_cookie.set(action)
+        LogStore.set_action(session, self.action_cookie.get_cookie_key(), action)
 
     def add_detail(self, session, line):
-        action = self.action_cookie.get(session)
+        action = LogStore.get_action(session, self.action_cookie.get_cookie_key())
         action['updates'].append(line)
-        self.action_cookie.set(session, action)
+        LogStore.set_action(session, self.action_cookie.get_cookie_key(), action)
 
     def get_refreshed_action(self, session):
         # Make sure the cookie is based on the current festival.
@@ -58,16 +64,14 @@ class BaseAction:
                 BaseAction.init_action(self, session)
 
         # Recover the time variable from the stored string representation if necessary.
-        if self.action_cookie.get(session):
-            action = copy.deepcopy(self.action_cookie.get(session))
+        action = LogStore.get_action(session, self.action_cookie.get_cookie_key())
+        if action:
             action['action_time'] = datetime.datetime.fromisoformat(action['action_time'])
-        else:
-            action = None
         return action
 
     def _get_cookie_key_from_session(self, session):
         festival = current_festival(session)
-        return f'action_{self.action_key}_{festival.id}'
+        return f'{ACTION_KEY_PREFIX}{self.action_key}_{festival.id}'
 
 
 class FanAction(BaseAction):
@@ -0,0 +1,213 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from authentication.models import FilmFan
+from availabilities.models import Availabilities
+from festival_planner.data_stamp_store import DataStampStore
+from festival_planner.day_schema_cache import DaySchemaCache
+from festival_planner.rating_matrix import RatingMatrix
+from festival_planner.statistics_store import StatisticsStore
+from festival_planner.title_index import TitleIndex
+from festival_planner.warning_store import WarningStore
+from festivals.models import Festival, FestivalBase
+from films.models import Film, FilmFanFilmRating, FilmFanFilmVote
+from screenings.models import Screening, Attendance, Ticket
+from sections.models import Section, Subsection
+from theaters.models import City, Theater, Screen
+
+# Models of which the receivers mark all data that their deletion cascades to.
+PARENT_MODELS = (City, FestivalBase, Festival, FilmFan, Film, Section, Subsection)
+
+# Attendances and tickets that are saved or deleted while collecting, per thread.
+collected_fan_ids = threading.local()
+
+
+def mark_festival_data(festival_ids=None, dates=None, fan_ids=None):
+    """
+    Mark the stored data of the given festivals, of all festivals if
+    none are given, as out of date: the warnings of the given fans, the
+    statistics, the day schema versions of the given days and the data
+    stamps.
+    No fans or days marks those of all fans or days, an empty collection
+    marks none of them.
+
+    Signals keep the stored data current when single objects are saved
+    or deleted, code that changes objects in bulk calls this function.
+    """
+    festival_ids = None if festival_ids is None else set(festival_ids)
+    if fan_ids is None or fan_ids:
+        all_festival_ids = Festival.festivals.values_list('id', flat=True) if festival_ids is None else festival_ids
+        for festival_id in all_festival_ids:
+            WarningStore.mark(festival_id, fan_ids)
+    StatisticsStore.mark(festival_ids)
+    if dates is None or dates:
+        DaySchemaCache.mark(festival_ids, dates)
+    DataStampStore.mark(festival_ids)
+
+
+def mark_period_data(start_dt, end_dt, fan_ids):
+    """Mark the data of the festivals that the given period of the given fans concerns as out of date."""
+    dates = DaySchemaCache.get_period_dates(start_dt, end_dt)
+    festivals = Festival.festivals.filter(start_date__lte=max(dates), end_date__gte=min(dates))
+    mark_festival_data(festivals.values_list('id', flat=True), dates, fan_ids)
+
+
+def mark_screening_fans(fan_ids_by_screening_id):
+    """
+    Mark the data of the festivals of the given screenings as out of
+    date, for the days around the screenings and the given fans.
+    """
+    screenings = Screening.screenings.filter(pk__in=fan_ids_by_screening_id).select_related('film')
+    screenings_by_festival_id = {}
+    for screening in screenings:
+        screenings_by_festival_id.setdefault(screening.film.festival_id, []).append(screening)
+    for festival_id, festival_screenings in screenings_by_festival_id.items():
+        dates = DaySchemaCache.get_screening_dates(festival_screenings)
+        fan_ids = set().union(*[fan_ids_by_screening_id[s.id] for s in festival_screenings])
+        mark_festival_data([festival_id], dates, fan_ids)
+
+
+@contextmanager
+def collect_screening_fan_marks():
+    """
+    Collect the marks of the attendances and tickets that are saved or
+    deleted in the block and mark them at once when the block ends, so
+    that changing the attendances of several fans doesn't mark the same
+    data for each of them.
+    """
+    if getattr(collected_fan_ids, 'by_screening_id', None) is not None:
+        yield
+        return
+    collected_fan_ids.by_screening_id = {}
+    try:
+        yield
+    finally:
+        fan_ids_by_screening_id = collected_fan_ids.by_screening_id
+        collected_fan_ids.by_screening_id = None
+        if fan_ids_by_screening_id:
+            mark_screening_fans(fan_ids_by_screening_id)
+
+
+def get_origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def deleted_with_parent(sender, kwargs):
+    """Return whether a deletion cascades from a parent object, of which the deletion marks the data itself."""
+    origin_model = get_origin_model(kwargs.get('origin'))
+    return origin_model in PARENT_MODELS and origin_model != sender
+
+
+def get_festival_ids(instance):
+    match instance:
+        case Film() | Section():
+            return [instance.festival_id]
+        case FilmFanFilmRating() | FilmFanFilmVote() | Screening():
+            return Film.films.filter(pk=instance.film_id).values_list('festival_id', flat=True)
+        case Subsection():
+            return Section.sections.filter(pk=instance.section_id).values_list('festival_id', flat=True)
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_save, sender=Section)
+@receiver(post_save, sender=Subsection)
+def mark_saved_festival_object(sender, instance, **kwargs):
+    mark_festival_data(get_festival_ids(instance), fan_ids=())
+
+
+@receiver(post_delete, sender=Film)
+@receiver(post_delete, sender=Section)
+@receiver(post_delete, sender=Subsection)
+def mark_deleted_festival_object(sender, instance, **kwargs):
+    if not deleted_with_parent(sender, kwargs):
+        # Deleting a film deletes the attendances of its screenings too.
+        mark_festival_data(get_festival_ids(instance), fan_ids=None if sender == Film else ())
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+def mark_film_titles(sender, instance, **kwargs):
+    TitleIndex.mark([instance.festival_id])
+
+
+@receiver(post_save, sender=FilmFanFilmRating)
+@receiver(post_save, sender=FilmFanFilmVote)
+@receiver(post_delete, sender=FilmFanFilmRating)
+@receiver(post_delete, sender=FilmFanFilmVote)
+def mark_film_judgement(sender, instance, **kwargs):
+    if not deleted_with_parent(sender, kwargs):
+        # The day schema and the rating matrix show the ratings, not the votes.
+        dates = DaySchemaCache.get_film_dates([instance.film_id]) if sender == FilmFanFilmRating else ()
+        mark_festival_data(get_festival_ids(instance), dates, fan_ids=())
+        if sender == FilmFanFilmRating:
+            RatingMatrix.mark(get_festival_ids(instance))
+
+
+def get_screening_fan_ids(screening):
+    fan_ids = set(Attendance.attendances.filter(screening=screening).values_list('fan_id', flat=True))
+    return fan_ids | set(Ticket.tickets.filter(screening=screening).values_list('fan_id', flat=True))
+
+
+@receiver(post_save, sender=Screening)
+def mark_saved_screening(sender, instance, created, **kwargs):
+    fan_ids = () if created else get_screening_fan_ids(instance)
+    mark_festival_data(get_festival_ids(instance), DaySchemaCache.get_screening_dates([instance]), fan_ids)
+
+
+@receiver(post_delete, sender=Screening)
+def mark_deleted_screening(sender, instance, **kwargs):
+    # The attendances and tickets of the screening are deleted first and mark their fans themselves.
+    if not deleted_with_parent(sender, kwargs):
+        mark_festival_data(get_festival_ids(instance), DaySchemaCache.get_screening_dates([instance]), fan_ids=())
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_delete, sender=Ticket)
+def mark_screening_fan(sender, instance, **kwargs):
+    if deleted_with_parent(sender, kwargs):
+        return
+    fan_ids_by_screening_id = getattr(collected_fan_ids, 'by_screening_id', None)
+    if fan_ids_by_screening_id is None:
+        mark_screening_fans({instance.screening_id: {instance.fan_id}})
+    else:
+        fan_ids_by_screening_id.setdefault(instance.screening_id, set()).add(instance.fan_id)
+
+
+@receiver(post_save, sender=Availabilities)
+@receiver(post_delete, sender=Availabilities)
+def mark_availability(sender, instance, **kwargs):
+    # Availability sets delete in bulk and mark the period themselves.
+    if not isinstance(kwargs.get('origin'), QuerySet) and not deleted_with_parent(sender, kwargs):
+        mark_period_data(instance.start_dt, instance.end_dt, [instance.fan_id])
+
+
+@receiver(post_save, sender=FilmFan)
+@receiver(post_save, sender=Festival)
+@receiver(post_save, sender=FestivalBase)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=Theater)
+@receiver(post_save, sender=Screen)
+@receiver(post_delete, sender=FilmFan)
+@receiver(post_delete, sender=Festival)
+@receiver(post_delete, sender=FestivalBase)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Theater)
+@receiver(post_delete, sender=Screen)
+def mark_all_festivals(sender, instance, created=False, **kwargs):
+    # All festivals show the fans and the places, loaders fill new festivals in bulk.
+    if created and sender == Festival:
+        DataStampStore.create_stamps([instance], FilmFan.film_fans.all())
+        mark_festival_data([instance.id])
+    elif created and sender == FilmFan:
+        DataStampStore.create_stamps(Festival.festivals.all(), [instance])
+    elif sender == FilmFan and kwargs['signal'] == post_delete:
+        # Deleting a fan deletes the ratings of the fan too.
+        RatingMatrix.mark()
+    if not deleted_with_parent(sender, kwargs):
+        mark_festival_data(fan_ids=())
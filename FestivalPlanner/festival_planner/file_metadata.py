@@ -0,0 +1,90 @@
+import csv
+import hashlib
+import os
+import threading
+
+from festival_planner.tools import CSV_DIALECT
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class FileMetadata:
+    """
+    Facts about an interface file, as needed by the overview pages
+    that compare the files with the database.
+    """
+
+    def __init__(self, line_count, header, fingerprint):
+        self.line_count = line_count
+        self.header = header
+        self.fingerprint = fingerprint
+
+    def record_count(self, has_header=False):
+        return self.line_count - 1 if has_header else self.line_count
+
+
+class FileMetadataStore:
+    """
+    Keeps the metadata of interface files in memory, so that displaying
+    the record counts and headers of many festival files doesn't require
+    reading all of them on every request.
+
+    The metadata of a file is read again when the modification time or
+    size of the file has changed.
+    """
+    entry_by_path = {}
+    read_count = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def get_metadata(cls, path):
+        """Return the metadata of the given file, None if the file doesn't exist."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with cls.lock:
+                cls.entry_by_path.pop(path, None)
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls.lock:
+            entry = cls.entry_by_path.get(path)
+        if entry is None or entry[0] != signature:
+            try:
+                entry = (signature, cls._read_metadata(path))
+            except FileNotFoundError:
+                return None
+            with cls.lock:
+                cls.entry_by_path[path] = entry
+                cls.read_count += 1
+        return entry[1]
+
+    @classmethod
+    def get_record_count(cls, path, has_header=False):
+        metadata = cls.get_metadata(path)
+        return 0 if metadata is None else metadata.record_count(has_header)
+
+    @classmethod
+    def get_header(cls, path):
+        metadata = cls.get_metadata(path)
+        return None if metadata is None else metadata.header
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entry_by_path = {}
+
+    @staticmethod
+    def _read_metadata(path):
+        line_count = 0
+        last_block = b''
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as stream:
+            while block := stream.read(READ_BLOCK_SIZE):
+                line_count += block.count(b'\n')
+                digest.update(block)
+                last_block = block
+        if last_block and not last_block.endswith(b'\n'):
+            line_count += 1
+        with open(path, newline='') as csvfile:
+            header = next(csv.reader(csvfile, dialect=CSV_DIALECT), None)
+        return FileMetadata(line_count, header, digest.hexdigest())
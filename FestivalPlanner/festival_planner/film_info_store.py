@@ -0,0 +1,95 @@
+import csv
+import os
+import threading
+
+import yaml
+
+from festival_planner.tools import CSV_DIALECT
+
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class FilmInfoStore:
+    """
+    Keeps the film descriptions and film info of festivals in memory, so
+    that looking up the information of one film doesn't require reading
+    the festival files.
+
+    The information of a festival is read from file when it is first
+    needed and read again when the modification time or size of the
+    file has changed.
+    """
+    description_entry_by_festival_id = {}
+    film_info_entry_by_festival_id = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def get_description_by_film_id(cls, festival):
+        """
+        Return the descriptions of the given festival by film id.
+        Raises FileNotFoundError if the festival has no descriptions file.
+        """
+        path = festival.filminfo_csv_file()
+        return cls._get_data(cls.description_entry_by_festival_id, festival.id, path, cls._read_descriptions)
+
+    @classmethod
+    def get_description(cls, film):
+        try:
+            description_by_film_id = cls.get_description_by_film_id(film.festival)
+        except FileNotFoundError:
+            return None
+        description = description_by_film_id.get(film.film_id)
+        return (description or '').strip() or None
+
+    @classmethod
+    def get_film_info(cls, festival):
+        """
+        Return the film info object of the given festival as read from
+        its YAML file, None if the festival has no film info file.
+        """
+        path = festival.filminfo_yaml_file()
+        try:
+            film_info = cls._get_data(cls.film_info_entry_by_festival_id, festival.id, path, cls._read_film_info)
+        except FileNotFoundError:
+            film_info = None
+        return film_info
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.description_entry_by_festival_id = {}
+            cls.film_info_entry_by_festival_id = {}
+
+    @classmethod
+    def _get_data(cls, entry_by_festival_id, festival_id, path, read_func):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with cls.lock:
+                entry_by_festival_id.pop(festival_id, None)
+            raise
+        signature = (path, stat.st_mtime_ns, stat.st_size)
+        with cls.lock:
+            try:
+                entry_signature, data = entry_by_festival_id[festival_id]
+            except KeyError:
+                entry_signature, data = None, None
+            if entry_signature != signature:
+                data = read_func(path)
+                entry_by_festival_id[festival_id] = (signature, data)
+        return data
+
+    @staticmethod
+    def _read_descriptions(path):
+        description_by_film_id = {}
+        with open(path, 'r', newline='') as csvfile:
+            object_reader = csv.reader(csvfile, dialect=CSV_DIALECT)
+            for row in object_reader:
+                description_by_film_id.setdefault(int(row[0]), row[1])
+        return description_by_film_id
+
+    @staticmethod
+    def _read_film_info(path):
+        with open(path, 'r') as stream:
+            film_info = yaml.load(stream, Loader=YAML_LOADER)
+        return film_info
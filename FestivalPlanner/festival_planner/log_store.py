@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from loader.models import ActionLog, ActionLogLine, FanActionRecord
+
+LOG_SESSION_KEY = 'log'
+LOG_RING_SIZE = 10
+ACTION_RING_SIZE = 20
+MAX_LOG_LINES = 10000
+LOG_PAGE_SIZE = 50
+
+PENDING_LINES = ContextVar('pending_log_lines', default=None)
+
+
+def get_session_user_id(session):
+    user_id = session.get('_auth_user_id')
+    return int(user_id) if user_id else None
+
+
+def keep_newest(queryset, count):
+    """Delete all but the given number of newest objects of the queryset."""
+    kept_ids = list(queryset.order_by('-id').values_list('id', flat=True)[:count])
+    if len(kept_ids) == count:
+        queryset.filter(id__lt=kept_ids[-1]).delete()
+
+
+class LogStore:
+    """
+    Keeps action logs and fan action records in the database, so that
+    the session only holds their keys and doesn't grow with every line
+    that is logged.
+
+    Each user keeps a limited number of logs and action records, the
+    oldest ones are deleted when new ones are started. Within a request
+    or a collecting block the lines of a log are collected in memory and
+    written in one batch when they are read or when the block ends.
+    """
+
+    @classmethod
+    @contextmanager
+    def collecting(cls):
+        """Collect the lines logged within the block and write them when the block ends."""
+        if PENDING_LINES.get() is not None:
+            yield
+            return
+        token = PENDING_LINES.set({})
+        try:
+            yield
+        finally:
+            cls.flush()
+            PENDING_LINES.reset(token)
+
+    @classmethod
+    def start_log(cls, session, action):
+        user_id = get_session_user_id(session)
+        log = ActionLog.action_logs.create(user_id=user_id, action=action)
+        keep_newest(ActionLog.action_logs.filter(user_id=user_id), LOG_RING_SIZE)
+        session[LOG_SESSION_KEY] = log.id
+
+    @classmethod
+    def add_line(cls, session, text):
+        log_id = cls.get_log_id(session)
+        if log_id is None:
+            cls.start_log(session, 'Uninitialized log')
+            log_id = cls.get_log_id(session)
+        pending_lines_by_log_id = PENDING_LINES.get()
+        if pending_lines_by_log_id is None:
+            cls._write_lines(log_id, [text])
+        else:
+            pending_lines_by_log_id.setdefault(log_id, []).append(text)
+
+    @classmethod
+    def get_log_id(cls, session):
+        log_id = session.get(LOG_SESSION_KEY)
+        return log_id if isinstance(log_id, int) else None
+
+    @classmethod
+    def get_log(cls, session):
+        """
+        Return the action and the first page of lines of the current log
+        of the session, None if the session has no log.
+        """
+        log_id = cls.get_log_id(session)
+        if log_id is None:
+            return None
+        cls.flush(log_id)
+        log = ActionLog.action_logs.filter(id=log_id).first()
+        if log is None:
+            return None
+        lines = ActionLogLine.log_lines.filter(log=log).order_by('id')
+        return {
+            'key': log.id,
+            'action': log.action,
+            'results': list(lines.values_list('text', flat=True)[:LOG_PAGE_SIZE]),
+            'line_count': lines.count(),
+        }
+
+    @classmethod
+    def unset_log(cls, session):
+        session[LOG_SESSION_KEY] = None
+
+    @classmethod
+    def flush(cls, log_id=None):
+        """Write the collected lines of the given log, or of all logs."""
+        pending_lines_by_log_id = PENDING_LINES.get()
+        if not pending_lines_by_log_id:
+            return
+        log_ids = list(pending_lines_by_log_id) if log_id is None else [log_id]
+        for pending_log_id in log_ids:
+            lines = pending_lines_by_log_id.pop(pending_log_id, [])
+            if lines:
+                cls._write_lines(pending_log_id, lines)
+
+    @classmethod
+    def get_action(cls, session, action_key):
+        """Return the action record value of the given key, None if absent."""
+        record_id = session.get(action_key)
+        if not isinstance(record_id, int):
+            return None
+        record = FanActionRecord.fan_actions.filter(id=record_id).first()
+        return record.value if record else None
+
+    @classmethod
+    def set_action(cls, session, action_key, value):
+        """Store the action record value of the given key, replacing the existing one."""
+        record_id = session.get(action_key)
+        if isinstance(record_id, int) and FanActionRecord.fan_actions.filter(id=record_id).update(value=value):
+            return
+        user_id = get_session_user_id(session)
+        record = FanActionRecord.fan_actions.create(user_id=user_id, action_key=action_key, value=value)
+        keep_newest(FanActionRecord.fan_actions.filter(user_id=user_id), ACTION_RING_SIZE)
+        session[action_key] = record.id
+
+    @staticmethod
+    def _write_lines(log_id, lines):
+        if not ActionLog.action_logs.filter(id=log_id).exists():
+            return
+        room = MAX_LOG_LINES - ActionLogLine.log_lines.filter(log_id=log_id).count()
+        log_lines = [ActionLogLine(log_id=log_id, text=text) for text in lines[:max(room, 0)]]
+        ActionLogLine.log_lines.bulk_create(log_lines)
+
+
+class LogStoreMiddleware:
+    """
+    Collects the lines logged while handling a request and writes them
+    in one batch when the request has been handled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with LogStore.collecting():
+            return self.get_response(request)
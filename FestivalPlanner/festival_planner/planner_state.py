@@ -0,0 +1,147 @@
+from authentication.models import FilmFan
+from festival_planner.availability_timeline import AvailabilityTimeline
+from festival_planner.day_schema_cache import DaySchemaCache
+from festival_planner.festival_data import mark_festival_data
+from festival_planner.screening_interval_index import ScreeningIntervalIndex
+from films.models import FilmFanFilmRating
+from screenings.models import Screening, Attendance, Ticket
+
+
+class PlannerState:
+    """
+    Keeps the planning state of the current fan in memory while the
+    screenings of a festival are planned automatically.
+
+    Attendances, tickets, availabilities and film ratings are read
+    once. After each planned screening the attended films and the
+    attended intervals are updated in place, so that checking whether
+    the next candidate can be planned doesn't require any queries.
+
+    The planned attendances are written in one batch by save(), which
+    marks the stored warnings of the current fan out of date.
+    """
+    related_fields = ['film', 'screen__theater']
+
+    def __init__(self, fan, festival):
+        self.fan = fan
+        self.festival = festival
+        festival_screenings = Screening.screenings.filter(film__festival=festival)
+        self.festival_screenings = list(festival_screenings.select_related(*self.related_fields))
+        self.fan_by_id = {fan.id: fan for fan in FilmFan.film_fans.all()}
+        self.attendant_ids_by_screening_id = {}
+        self.attended_film_ids = set()
+        self.ticket_screening_ids = set()
+        self.timeline = AvailabilityTimeline()
+        self.ratings_by_film_id = {}
+        self.available_screening_count_by_film_id = {}
+        self.interval_index = ScreeningIntervalIndex(self.festival_screenings)
+        self.planned_screenings = []
+        self._load_attendances()
+        self._load_tickets()
+        self._load_availabilities()
+        self._load_ratings()
+
+    def get_highest_ratings(self, film):
+        """Equivalent of PlannerSortKeyKeeper.get_highest_ratings()."""
+        ratings = self.ratings_by_film_id.get(film.id, [])
+        highest_rating = ratings[0] if ratings else FilmFanFilmRating.Rating.UNRATED
+        second_rating = ratings[1] if len(ratings) > 1 else highest_rating
+        return highest_rating, second_rating
+
+    def get_highest_rating(self, film):
+        highest_rating, _ = self.get_highest_ratings(film)
+        return highest_rating
+
+    def get_attendants(self, screening):
+        """Return the attendants of the given screening, current fan first, the others sorted by name."""
+        attendant_ids = self.attendant_ids_by_screening_id.get(screening.id, set())
+        others = sorted((self.fan_by_id[i] for i in attendant_ids if i != self.fan.id), key=lambda f: f.name)
+        return ([self.fan] if self.fan.id in attendant_ids else []) + others
+
+    def get_attending_friends(self, screening):
+        return [fan for fan in self.get_attendants(screening) if fan != self.fan]
+
+    def get_sort_key(self, screening, sort_key_class):
+        kwargs = {
+            'highest_ratings': self.get_highest_ratings(screening.film),
+            'filmscreening_count': self.available_screening_count_by_film_id.get(screening.film_id, 0),
+        }
+        return sort_key_class(screening, self.fan, self.get_attending_friends(screening), **kwargs)
+
+    def fits_availability(self, screening):
+        return self.timeline.fan_fits_screening(self.fan, screening)
+
+    def get_screening_status(self, screening):
+        """Equivalent of ScreeningStatusGetter.get_screening_status() for the current fan."""
+        attendant_ids = self.attendant_ids_by_screening_id.get(screening.id, set())
+        has_ticket = screening.id in self.ticket_screening_ids
+        if self.fan.id in attendant_ids:
+            status = Screening.ScreeningStatus.ATTENDS if has_ticket else Screening.ScreeningStatus.NEEDS_TICKETS
+        elif has_ticket:
+            status = Screening.ScreeningStatus.SHOULD_SELL_TICKETS
+        elif attendant_ids:
+            status = Screening.ScreeningStatus.FRIEND_ATTENDS
+        elif not self.fits_availability(screening):
+            status = Screening.ScreeningStatus.UNAVAILABLE
+        elif screening.film_id in self.attended_film_ids:
+            status = Screening.ScreeningStatus.ATTENDS_FILM
+        else:
+            status = self._get_other_status(screening)
+        return status
+
+    def has_overlap(self, screening):
+        kwargs = {'use_travel_time': True, 'first_only': True}
+        return bool(self.interval_index.attended_overlapping_screenings(screening, self.fan, **kwargs))
+
+    def plan(self, screening):
+        screening.auto_planned = True
+        self.attendant_ids_by_screening_id.setdefault(screening.id, set()).add(self.fan.id)
+        self.attended_film_ids.add(screening.film_id)
+        self.interval_index.add_attendance(self.fan, screening)
+        self.planned_screenings.append(screening)
+
+    def save(self):
+        attendances = [Attendance(fan=self.fan, screening=s) for s in self.planned_screenings]
+        Attendance.attendances.bulk_create(attendances)
+        Screening.screenings.bulk_update(self.planned_screenings, ['auto_planned'])
+        if self.planned_screenings:
+            dates = DaySchemaCache.get_screening_dates(self.planned_screenings)
+            mark_festival_data([self.festival.id], dates, [self.fan.id])
+
+    def _get_other_status(self, screening):
+        status = Screening.ScreeningStatus.FREE
+        index = self.interval_index
+        for s in index.attended_overlapping_screenings(screening, self.fan, use_travel_time=True):
+            if s.start_dt.date() == screening.start_dt.date():
+                if index.overlaps(screening, s):
+                    return Screening.ScreeningStatus.TIME_OVERLAP
+                status = Screening.ScreeningStatus.NO_TRAVEL_TIME
+        return status
+
+    def _load_attendances(self):
+        screening_by_id = {screening.id: screening for screening in self.festival_screenings}
+        attendances = Attendance.attendances.filter(screening__film__festival=self.festival)
+        for screening_id, fan_id in attendances.values_list('screening_id', 'fan_id'):
+            self.attendant_ids_by_screening_id.setdefault(screening_id, set()).add(fan_id)
+            if fan_id == self.fan.id:
+                screening = screening_by_id[screening_id]
+                self.attended_film_ids.add(screening.film_id)
+                self.interval_index.add_attendance(self.fan, screening)
+
+    def _load_tickets(self):
+        tickets = Ticket.tickets.filter(fan=self.fan, screening__film__festival=self.festival)
+        self.ticket_screening_ids = set(tickets.values_list('screening_id', flat=True))
+
+    def _load_availabilities(self):
+        self.timeline = AvailabilityTimeline.for_screenings(self.festival_screenings, [self.fan])
+        for screening in self.festival_screenings:
+            if self.fits_availability(screening):
+                count_by_film_id = self.available_screening_count_by_film_id
+                count_by_film_id[screening.film_id] = count_by_film_id.get(screening.film_id, 0) + 1
+
+    def _load_ratings(self):
+        film_ratings = FilmFanFilmRating.film_ratings.filter(film__festival=self.festival)
+        for film_id, rating in film_ratings.values_list('film_id', 'rating'):
+            self.ratings_by_film_id.setdefault(film_id, []).append(rating)
+        for ratings in self.ratings_by_film_id.values():
+            ratings.sort(reverse=True)
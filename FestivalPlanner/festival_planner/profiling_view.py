@@ -0,0 +1,41 @@
+from http import HTTPStatus
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.views import View
+
+from festival_planner.debug_tools import PROFILE_AGGREGATOR, profiling_enabled
+from festival_planner.tools import user_is_admin
+
+
+class ProfilingReportView(LoginRequiredMixin, View):
+    """
+    Returns the aggregated profiling statistics as JSON, admin fans only.
+
+    Add ?traces=1 to the url to include the span trees of the most
+    recent requests. Post to the url, with a CSRF token, to receive the
+    statistics and start collecting anew.
+    """
+    http_method_names = ['get', 'post']
+
+    def get(self, request, *args, **kwargs):
+        if not user_is_admin(request):
+            return JsonResponse({'error': 'Not allowed'}, status=HTTPStatus.FORBIDDEN)
+        return JsonResponse(self.get_report(request))
+
+    def post(self, request, *args, **kwargs):
+        if not user_is_admin(request):
+            return JsonResponse({'error': 'Not allowed'}, status=HTTPStatus.FORBIDDEN)
+        report = self.get_report(request)
+        PROFILE_AGGREGATOR.reset()
+        return JsonResponse(report)
+
+    @staticmethod
+    def get_report(request):
+        report = {
+            'enabled': profiling_enabled(),
+            'labels': PROFILE_AGGREGATOR.report(),
+        }
+        if request.GET.get('traces'):
+            report['traces'] = PROFILE_AGGREGATOR.traces()
+        return report
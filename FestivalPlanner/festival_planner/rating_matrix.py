@@ -0,0 +1,102 @@
+from django.db.models import F
+
+from films.models import MANAGER_BY_POST_ATTENDANCE, FIELD_BY_POST_ATTENDANCE, UNRATED_STR, FilmDataVersion
+
+
+class RatingMatrix:
+    """
+    Keeps the ratings, or the votes, of a set of films as a film by fan
+    matrix, so that building film rows and rating statistics doesn't
+    require a query per film and fan.
+
+    Each film has a row with one value per fan column, None where the
+    fan didn't rate the film. The matrix is read with one query and can
+    be patched in place when a single rating changes.
+
+    Saving or deleting ratings increases the ratings version of the
+    festival, which is kept in the database, so that processes that keep
+    a matrix can tell whether ratings changed elsewhere.
+    """
+    version_kind = 'ratings'
+
+    def __init__(self, judgements=(), post_attendance=False, festival_id=None, generation=None):
+        self.post_attendance = post_attendance
+        self.festival_id = festival_id
+        self.generation = generation
+        self.column_by_fan_id = {}
+        self.row_by_film_id = {}
+        for film_id, fan_id, value in judgements:
+            self._set_value(film_id, fan_id, value)
+
+    @classmethod
+    def for_festival(cls, festival, post_attendance=False, generation=None):
+        """Return the matrix of all judgements of the films of the given festival."""
+        manager = MANAGER_BY_POST_ATTENDANCE[post_attendance]
+        judgements = manager.filter(film__festival=festival)
+        return cls._from_queryset(judgements, post_attendance, festival_id=festival.id, generation=generation)
+
+    @classmethod
+    def get_version(cls, festival):
+        film_data_version, _ = FilmDataVersion.film_data_versions.get_or_create(festival=festival, kind=cls.version_kind)
+        return film_data_version.version
+
+    @classmethod
+    def mark(cls, festival_ids=None):
+        """Increase the ratings versions of the given festivals, of all festivals if none are given."""
+        film_data_versions = FilmDataVersion.film_data_versions.filter(kind=cls.version_kind)
+        if festival_ids is not None:
+            film_data_versions = film_data_versions.filter(festival_id__in=festival_ids)
+        film_data_versions.update(version=F('version') + 1)
+
+    @classmethod
+    def for_films(cls, films, post_attendance=False):
+        """Return the matrix of all judgements of the given films."""
+        manager = MANAGER_BY_POST_ATTENDANCE[post_attendance]
+        judgements = manager.filter(film__in=films)
+        return cls._from_queryset(judgements, post_attendance)
+
+    @classmethod
+    def _from_queryset(cls, queryset, post_attendance, **kwargs):
+        field = FIELD_BY_POST_ATTENDANCE[post_attendance]
+        values = queryset.values_list('film_id', 'film_fan_id', field)
+        return cls(values, post_attendance, **kwargs)
+
+    def is_valid(self, festival, generation):
+        return self.festival_id == festival.id and self.generation == generation
+
+    def get_rating(self, film, fan):
+        """Return the rating of the given film by the given fan, None if not rated."""
+        row = self.row_by_film_id.get(film.id)
+        column = self.column_by_fan_id.get(fan.id)
+        if row is None or column is None:
+            return None
+        return row[column]
+
+    def get_rating_str(self, film, fan):
+        """Equivalent of fan_rating_str()."""
+        rating = self.get_rating(film, fan)
+        return f'{rating}' if rating is not None else UNRATED_STR
+
+    def get_ratings(self, film):
+        """Return the ratings that were given to the given film."""
+        return [value for value in self.row_by_film_id.get(film.id, []) if value is not None]
+
+    def update(self, film, fan, value):
+        """
+        Set the rating of the given film by the given fan in place,
+        None removes the rating.
+        """
+        self._set_value(film.id, fan.id, value)
+
+    def _set_value(self, film_id, fan_id, value):
+        column = self.column_by_fan_id.get(fan_id)
+        if column is None:
+            column = len(self.column_by_fan_id)
+            self.column_by_fan_id[fan_id] = column
+            for row in self.row_by_film_id.values():
+                row.append(None)
+        row = self.row_by_film_id.get(film_id)
+        if row is None:
+            row = [None] * len(self.column_by_fan_id)
+            self.row_by_film_id[film_id] = row
+        row[column] = value
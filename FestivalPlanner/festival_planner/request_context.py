@@ -0,0 +1,65 @@
+from contextvars import ContextVar
+
+REQUEST_CONTEXT = ContextVar('request_context', default=None)
+
+
+class RequestContext:
+    """
+    Keeps values that are needed several times while handling one
+    request, like the current festival and the current fan.
+
+    Values are stored by a key that includes the session values they
+    depend on, so a value resolved before the session changes is not
+    used after the change.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.value_by_key = {}
+        self.resolve_count = 0
+
+    def get(self, key, resolve_func):
+        try:
+            value = self.value_by_key[key]
+        except KeyError:
+            value = resolve_func()
+            self.value_by_key[key] = value
+            self.resolve_count += 1
+        return value
+
+
+class RequestContextMiddleware:
+    """
+    Provides a fresh request context for every request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = REQUEST_CONTEXT.set(RequestContext(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUEST_CONTEXT.reset(token)
+        return response
+
+
+def get_request_context():
+    return REQUEST_CONTEXT.get()
+
+
+def resolve_in_request(key, resolve_func, session=None):
+    """
+    Return the value of the given key in the context of the current
+    request, resolving it with the given function if it isn't known yet.
+
+    Outside a request, or when the given session is not the session of
+    the current request, the value is resolved without being kept.
+    """
+    context = get_request_context()
+    if context is None:
+        return resolve_func()
+    if session is not None and getattr(context.request, 'session', None) is not session:
+        return resolve_func()
+    return context.get(key, resolve_func)
@@ -0,0 +1,137 @@
+import datetime
+from bisect import bisect_left, bisect_right
+
+from screenings.models import WALK_TIME_SAME_THEATER, TRAVEL_TIME_OTHER_THEATER, Screening, Attendance
+from theaters.models import Screen
+
+MAX_TRAVEL_TIME = max(WALK_TIME_SAME_THEATER, TRAVEL_TIME_OTHER_THEATER)
+
+
+class ScreeningIntervalIndex:
+    """
+    Keeps screenings sorted by start time, so that the screenings that
+    overlap a given screening can be found by bisection instead of by
+    scanning all screenings of a festival.
+
+    The search window of a screening is padded by the maximum travel
+    time and the longest screening duration in the index. Candidates
+    within the window are checked with the same criterion as
+    Screening.overlaps(), the theater of each screen being looked up
+    only once.
+
+    Attended screenings are kept in a separate index per fan.
+    """
+    def __init__(self, screenings=None, theater_id_by_screen_id=None):
+        self.start_dts = []
+        self.screenings = []
+        self.max_duration = datetime.timedelta(0)
+        self.attended_index_by_fan = {}
+        self.theater_id_by_screen_id = {} if theater_id_by_screen_id is None else theater_id_by_screen_id
+        screenings = list(screenings or [])
+        self._set_theater_ids(screenings)
+        for screening in sorted(screenings, key=lambda s: s.start_dt):
+            self._append(screening)
+
+    def __len__(self):
+        return len(self.screenings)
+
+    def __contains__(self, screening):
+        lo = bisect_left(self.start_dts, screening.start_dt)
+        hi = bisect_right(self.start_dts, screening.start_dt)
+        return screening in self.screenings[lo:hi]
+
+    @classmethod
+    def for_festival(cls, festival):
+        """Return an index of all screenings and attendances of the given festival."""
+        screenings = Screening.screenings.filter(film__festival=festival)
+        interval_index = cls(screenings)
+        attendances = Attendance.attendances.filter(screening__film__festival=festival).select_related('fan')
+        screening_by_id = {screening.id: screening for screening in interval_index.screenings}
+        for attendance in attendances:
+            interval_index.add_attendance(attendance.fan, screening_by_id[attendance.screening_id])
+        return interval_index
+
+    def add_screening(self, screening):
+        if screening in self:
+            return
+        pos = bisect_right(self.start_dts, screening.start_dt)
+        self.start_dts.insert(pos, screening.start_dt)
+        self.screenings.insert(pos, screening)
+        self.max_duration = max(self.max_duration, screening.end_dt - screening.start_dt)
+
+    def remove_screening(self, screening):
+        lo = bisect_left(self.start_dts, screening.start_dt)
+        hi = bisect_right(self.start_dts, screening.start_dt)
+        for pos in range(lo, hi):
+            if self.screenings[pos] == screening:
+                del self.start_dts[pos]
+                del self.screenings[pos]
+                break
+
+    def add_attendance(self, fan, screening):
+        try:
+            attended_index = self.attended_index_by_fan[fan]
+        except KeyError:
+            attended_index = ScreeningIntervalIndex(theater_id_by_screen_id=self.theater_id_by_screen_id)
+            self.attended_index_by_fan[fan] = attended_index
+        attended_index.add_screening(screening)
+
+    def remove_attendance(self, fan, screening):
+        if fan in self.attended_index_by_fan:
+            self.attended_index_by_fan[fan].remove_screening(screening)
+
+    def overlapping_screenings(self, screening, use_travel_time=False, first_only=False):
+        """
+        Return the screenings in the index, other than the given one,
+        that overlap the given screening.
+        """
+        padding = MAX_TRAVEL_TIME if use_travel_time else datetime.timedelta(0)
+        lo = bisect_left(self.start_dts, screening.start_dt - padding - self.max_duration)
+        hi = bisect_right(self.start_dts, screening.end_dt + padding)
+        overlapping_screenings = []
+        for other_screening in self.screenings[lo:hi]:
+            if other_screening != screening and self.overlaps(screening, other_screening, use_travel_time):
+                overlapping_screenings.append(other_screening)
+                if first_only:
+                    break
+        return overlapping_screenings
+
+    def attended_overlapping_screenings(self, screening, fan, use_travel_time=False, first_only=False):
+        """
+        Return the screenings attended by the given fan, other than the
+        given one, that overlap the given screening.
+        """
+        try:
+            attended_index = self.attended_index_by_fan[fan]
+        except KeyError:
+            return []
+        return attended_index.overlapping_screenings(screening, use_travel_time, first_only)
+
+    def overlaps(self, screening, other_screening, use_travel_time=False):
+        """Equivalent of Screening.overlaps()."""
+        travel_time = self.get_travel_time(screening, other_screening) if use_travel_time else datetime.timedelta(0)
+        return (other_screening.start_dt <= screening.end_dt + travel_time
+                and other_screening.end_dt >= screening.start_dt - travel_time)
+
+    def get_travel_time(self, screening, other_screening):
+        same_theater = self._get_theater_id(screening) == self._get_theater_id(other_screening)
+        return WALK_TIME_SAME_THEATER if same_theater else TRAVEL_TIME_OTHER_THEATER
+
+    def _append(self, screening):
+        self.start_dts.append(screening.start_dt)
+        self.screenings.append(screening)
+        self.max_duration = max(self.max_duration, screening.end_dt - screening.start_dt)
+
+    def _set_theater_ids(self, screenings):
+        screen_ids = {s.screen_id for s in screenings} - set(self.theater_id_by_screen_id.keys())
+        if screen_ids:
+            theater_ids = Screen.screens.filter(pk__in=screen_ids).values_list('pk', 'theater_id')
+            self.theater_id_by_screen_id.update(dict(theater_ids))
+
+    def _get_theater_id(self, screening):
+        try:
+            theater_id = self.theater_id_by_screen_id[screening.screen_id]
+        except KeyError:
+            theater_id = screening.screen.theater_id
+            self.theater_id_by_screen_id[screening.screen_id] = theater_id
+        return theater_id
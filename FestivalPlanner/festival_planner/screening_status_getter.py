@@ -2,11 +2,12 @@ from copy import deepcopy
 from enum import Enum, auto
 
 from authentication.models import FilmFan, get_sorted_fan_list
-from availabilities.models import Availabilities
+from festival_planner.availability_timeline import AvailabilityTimeline
 from festival_planner.cookie import Filter, Cookie
 from festival_planner.debug_tools import profiled_method, OVERLAP_PROFILER, GET_WARNINGS_PROFILER, \
-    GET_AV_KEEPER_PROFILER, WARNING_KEYS_PROFILER, FAN_WARNINGS_PROFILER, timed_method
+    GET_AV_KEEPER_PROFILER, FAN_WARNINGS_PROFILER, timed_method
 from festival_planner.fragment_keeper import ScreenFragmentKeeper
+from festival_planner.screening_interval_index import ScreeningIntervalIndex
 from festivals.models import current_festival
 from films.models import current_fan
 from screenings.models import Screening, Attendance, COLOR_PAIR_SELECTED, Ticket, COLOR_WARNING_ORANGE, \
@@ -57,37 +58,13 @@ def get_ticket_holders(screening, current_filmfan, confirmed=None):
     return sorted_holders
 
 
-@timed_method
-@profiled_method(WARNING_KEYS_PROFILER)
-def get_warnings_keys(festival):
-    """
-    Return a set of screening-fan tuples that could have one or more
-    warnings.
-    """
-    attendances = Attendance.attendances.filter(screening__film__festival=festival)
-    a_keys_set = {(attendance.screening, attendance.fan) for attendance in attendances}
-    tickets = Ticket.tickets.filter(screening__film__festival=festival)
-    t_keys_set = {(ticket.screening, ticket.fan) for ticket in tickets}
-    keys_set = a_keys_set | t_keys_set
-    return keys_set
-
-
 @profiled_method(GET_AV_KEEPER_PROFILER)
-def get_availability_keeper(keys_set):
+def get_festival_warning_keeper(festival):
     """
-    Convert a set of screening-fan tuples into a list of screenings and
-    a list of fans as input for a new Availability Keeper.
-    Returns the availability keeper.
+    Return a warning keeper that holds all data needed to compute the
+    warnings of the given festival.
     """
-    keeper = AvailabilityKeeper()
-    screenings = set()
-    fans = set()
-    for screening, fan in keys_set:
-        screenings.add(screening)
-        fans.add(fan)
-    keeper.set_availability(screenings, fans)
-    keeper.set_ticket_status(screenings, fans)
-    return keeper
+    return FestivalWarningKeeper(festival)
 
 
 @timed_method
@@ -103,12 +80,12 @@ def get_warnings(festival, details_getter, keys_set=None):
         """For profiling reasons only"""
         details = []
         for keys in _keys_set:
-            for warning in ScreeningWarning.get_fan_warnings(*keys, availability_keeper=keeper):
+            for warning in warning_keeper.get_fan_warnings(*keys):
                 details.append(details_getter(warning))
         return details
 
-    keys_set = keys_set or get_warnings_keys(festival)
-    keeper = get_availability_keeper(keys_set)
+    warning_keeper = get_festival_warning_keeper(festival)
+    keys_set = keys_set or warning_keeper.get_keys_set()
     warning_details = get_fan_warnings(keys_set)
     return warning_details
 
@@ -146,19 +123,28 @@ def get_other_attended_screenings(screening, fan):
 
 
 @profiled_method(OVERLAP_PROFILER)
-def get_overlapping_attended_screenings(screening, fan, first_only=True):
-    festival = screening.film.festival
-    manager = Attendance.attendances
-    filter_kwargs = {
-        'fan': fan,
-        'screening__film__festival': festival,
-        'screening__start_dt__date': screening.start_dt.date(),
-    }
-    attended_screenings = [a.screening for a in manager.filter(**filter_kwargs) if a.screening != screening]
+def get_overlapping_attended_screenings(screening, fan, first_only=True, interval_index=None):
+    """
+    Return the screenings on the same day as the given screening that
+    are attended by the given fan and overlap the given screening.
+    If an interval index is given, the attended screenings are taken
+    from the index instead of from the database.
+    """
+    if interval_index is None:
+        festival = screening.film.festival
+        manager = Attendance.attendances
+        filter_kwargs = {
+            'fan': fan,
+            'screening__film__festival': festival,
+            'screening__start_dt__date': screening.start_dt.date(),
+        }
+        interval_index = ScreeningIntervalIndex()
+        for attendance in manager.filter(**filter_kwargs).select_related('screening__screen'):
+            interval_index.add_attendance(fan, attendance.screening)
     overlapping_screenings = []
-    for day_screening in attended_screenings:
-        if day_screening.overlaps(screening):
-            overlapping_screenings.append(day_screening)
+    for attended_screening in interval_index.attended_overlapping_screenings(screening, fan):
+        if attended_screening.start_dt.date() == screening.start_dt.date():
+            overlapping_screenings.append(attended_screening)
             if first_only:
                 break
     return overlapping_screenings
@@ -175,28 +161,32 @@ class ScreeningStatusGetter:
 
     def __init__(self, session, day_screenings):
         self.session = session
-        self.day_screenings = day_screenings
+        self.day_screenings = list(day_screenings)
         self.fan = current_fan(self.session)
         self.sorted_fans = get_sorted_fan_list(self.fan)
-        self.attendances_by_screening = self._get_attendances_by_screening()
-        self.attendance_by_screening_by_fan = self._get_attendance_by_screening_by_fan(self.attendances_by_screening)
-        self.attends_by_screening = {s: self.attendance_by_screening_by_fan[s][self.fan] for s in day_screenings}
-        self.has_attended_film_by_screening = self._get_has_attended_film_by_screening()
+        self.attendant_ids_by_screening_id = self._get_attendant_ids_by_screening_id()
+        self.attendance_by_screening_by_fan = self._get_attendance_by_screening_by_fan()
+        self.attends_by_screening = {s: self.attendance_by_screening_by_fan[s][self.fan] for s in self.day_screenings}
+        self.attended_film_ids = self._get_attended_film_ids()
         self.keeper = self._get_availability_keeper()
+        self.interval_index = self._get_interval_index()
 
     def update_attendances_by_screening(self, screening):
-        self.attendances_by_screening[screening] = Attendance.attendances.filter(screening=screening)
+        self.attendant_ids_by_screening_id.setdefault(screening.id, set()).add(self.fan.id)
+        self.attendance_by_screening_by_fan.setdefault(screening, {})[self.fan] = True
         self.attends_by_screening[screening] = True
-        self.has_attended_film_by_screening = self._get_has_attended_film_by_screening()
+        self.attended_film_ids.add(screening.film_id)
+        self.interval_index.add_attendance(self.fan, screening)
 
     def get_screening_status(self, screening, attendants):
-        fan = current_fan(self.session)
+        fan = self.fan
+        has_ticket = self.keeper.get_ticket(screening, fan) is not None
         if fan in attendants:
-            if screening.fan_has_ticket(fan):
+            if has_ticket:
                 status = Screening.ScreeningStatus.ATTENDS
             else:
                 status = Screening.ScreeningStatus.NEEDS_TICKETS
-        elif screening.fan_has_ticket(fan):
+        elif has_ticket:
             status = Screening.ScreeningStatus.SHOULD_SELL_TICKETS
         elif attendants:
             status = Screening.ScreeningStatus.FRIEND_ATTENDS
@@ -205,7 +195,7 @@ class ScreeningStatusGetter:
         elif self._has_attended_film(screening):
             status = Screening.ScreeningStatus.ATTENDS_FILM
         else:
-            status = self._get_other_status(screening, self.day_screenings)
+            status = self._get_other_status(screening)
         return status
 
     @classmethod
@@ -245,10 +235,8 @@ class ScreeningStatusGetter:
         return fits
 
     def get_attendants(self, screening):
-        attendances = self.attendances_by_screening[screening]
-        attendant_ids = attendances.values_list('fan', flat=True)
-        attendants = FilmFan.film_fans.filter(id__in=attendant_ids)
-        sorted_attendants = get_sorted_fan_list(self.fan, fan_query_set=attendants)
+        attendant_ids = self.attendant_ids_by_screening_id.get(screening.id, set())
+        sorted_attendants = [fan for fan in self.sorted_fans if fan.id in attendant_ids]
         return sorted_attendants
 
     def get_attendants_str(self, screening):
@@ -259,28 +247,29 @@ class ScreeningStatusGetter:
         attendants = self.get_attendants(screening)
         return [fan for fan in attendants if fan != self.fan]
 
-    def _get_attendances_by_screening(self):
-        attendances_by_screening = {s: Attendance.attendances.filter(screening=s) for s in self.day_screenings}
-        return attendances_by_screening
+    def _get_attendant_ids_by_screening_id(self):
+        screening_ids = [s.id for s in self.day_screenings]
+        attendances = Attendance.attendances.filter(screening_id__in=screening_ids)
+        attendant_ids_by_screening_id = {}
+        for screening_id, fan_id in attendances.values_list('screening_id', 'fan_id'):
+            attendant_ids_by_screening_id.setdefault(screening_id, set()).add(fan_id)
+        return attendant_ids_by_screening_id
 
-    def _get_attendance_by_screening_by_fan(self, attendances_by_screening):
+    def _get_attendance_by_screening_by_fan(self):
         attendance_by_screening_by_fan = {}
-        for screening, attendances in attendances_by_screening.items():
-            for fan in self.sorted_fans:
-                fan_attends = fan in [attendance.fan for attendance in attendances]
-                try:
-                    attendance_by_screening_by_fan[screening][fan] = fan_attends
-                except KeyError:
-                    attendance_by_screening_by_fan[screening] = {fan: fan_attends}
+        for screening in self.day_screenings:
+            attendant_ids = self.attendant_ids_by_screening_id.get(screening.id, set())
+            attendance_by_screening_by_fan[screening] = {fan: fan.id in attendant_ids for fan in self.sorted_fans}
         return attendance_by_screening_by_fan
 
-    def _get_has_attended_film_by_screening(self):
-        manager = Attendance.attendances
-        return {s: manager.filter(screening__film=s.film, fan=self.fan).exists() for s in self.day_screenings}
+    def _get_attended_film_ids(self):
+        film_ids = {s.film_id for s in self.day_screenings}
+        attendances = Attendance.attendances.filter(fan=self.fan, screening__film_id__in=film_ids)
+        return set(attendances.values_list('screening__film_id', flat=True))
 
     def _has_attended_film(self, screening):
         """ Returns whether the current fan attends another screening of the same film. """
-        current_fan_attends_other_filmscreening = self.has_attended_film_by_screening[screening]
+        current_fan_attends_other_filmscreening = screening.film_id in self.attended_film_ids
         return current_fan_attends_other_filmscreening
 
     def _get_availability_keeper(self):
@@ -289,30 +278,29 @@ class ScreeningStatusGetter:
         keeper.set_ticket_status(self.day_screenings, self.sorted_fans)
         return keeper
 
-    def _available_fans(self, screening):
-        available_fan_ids = []
-        a_by_f_list = [a_by_f for s, a_by_f in self.keeper.available_by_screening_by_fan.items() if s == screening]
-        """See test_dict_of_dict_items which proves this correct."""
-
-        for available_by_fan in a_by_f_list:
-            for fan, available in available_by_fan.items():
-                if available:
-                    available_fan_ids.append(fan.id)
+    def _get_interval_index(self):
+        interval_index = ScreeningIntervalIndex(self.day_screenings)
+        for screening, attends_by_fan in self.attendance_by_screening_by_fan.items():
+            for fan, attends in attends_by_fan.items():
+                if attends:
+                    interval_index.add_attendance(fan, screening)
+        return interval_index
 
-        fan_query_set = FilmFan.film_fans.filter(id__in=available_fan_ids)
-        return get_sorted_fan_list(self.fan, fan_query_set=fan_query_set)
+    def _available_fans(self, screening):
+        available_by_fan = self.keeper.available_by_screening_by_fan.get(screening, {})
+        return [fan for fan in self.sorted_fans if available_by_fan.get(fan)]
 
-    def _get_other_status(self, screening, screenings):
+    def _get_other_status(self, screening):
         status = Screening.ScreeningStatus.FREE
         overlapping_screenings = []
         no_travel_time_screenings = []
-        for s in screenings:
-            if self.attends_by_screening[s]:
-                if s.start_dt.date() == screening.start_dt.date():
-                    if screening.overlaps(s):
-                        overlapping_screenings.append(s)
-                    elif screening.overlaps(s, use_travel_time=True):
-                        no_travel_time_screenings.append(s)
+        index = self.interval_index
+        for s in index.attended_overlapping_screenings(screening, self.fan, use_travel_time=True):
+            if s.start_dt.date() == screening.start_dt.date():
+                if index.overlaps(screening, s):
+                    overlapping_screenings.append(s)
+                else:
+                    no_travel_time_screenings.append(s)
         if overlapping_screenings:
             status = Screening.ScreeningStatus.TIME_OVERLAP
         elif no_travel_time_screenings:
@@ -389,25 +377,18 @@ class AvailabilityKeeper:
     def __init__(self):
         self.available_by_screening_by_fan = {}
         self.ticket_by_screening_by_fan = {}
+        self.timeline = AvailabilityTimeline()
 
     def set_availability(self, screenings, fans):
-        manager = Availabilities.availabilities
+        self.timeline = AvailabilityTimeline.for_screenings(screenings, fans)
         for screening in screenings:
-            self.available_by_screening_by_fan[screening] = {}
-            kwargs = {
-                'start_dt__lte': screening.start_dt,
-                'end_dt__gte': screening.end_dt,
-                'fan__in': fans,
-            }
-            availabilities = manager.filter(**kwargs)
-            available_fans = [availability.fan for availability in availabilities]
-            for fan in available_fans:
-                self.available_by_screening_by_fan[screening][fan] = True
+            available_fans = self.timeline.get_available_fans(screening, fans)
+            self.available_by_screening_by_fan[screening] = {fan: True for fan in available_fans}
 
     def set_ticket_status(self, screenings, fans):
         manager = Ticket.tickets
 
-        tickets = manager.filter(screening__in=screenings, fan__in=fans)
+        tickets = manager.filter(screening__in=screenings, fan__in=fans).select_related('screening', 'fan')
         for ticket in tickets:
             screening = ticket.screening
             fan = ticket.fan
@@ -431,6 +412,113 @@ class AvailabilityKeeper:
         return ticket
 
 
+class FestivalWarningKeeper:
+    """
+    Keeps the attendances, tickets and availabilities of a festival in
+    memory, so that the warnings of all screening-fan combinations can
+    be computed in one pass with a fixed number of queries.
+
+    The data can be limited to the given fans, as the warnings of a fan
+    don't depend on the attendances and tickets of other fans.
+    """
+    related_fields = ['screening__film__festival', 'screening__screen__theater', 'fan']
+
+    def __init__(self, festival, fans=None):
+        self.festival = festival
+        self.fans = fans
+        self.attendance_keys = set()
+        self.ticket_keys = set()
+        self.attendance_count_by_film_by_fan = {}
+        self.interval_index = ScreeningIntervalIndex()
+        self.timeline = AvailabilityTimeline()
+        self.keeper = AvailabilityKeeper()
+        self._load_attendances()
+        self._load_tickets()
+        self._load_availabilities()
+
+    def get_keys_set(self):
+        """Return the screening-fan tuples that could have warnings."""
+        return self.attendance_keys | self.ticket_keys
+
+    def get_fan_warnings(self, screening, fan):
+        """
+        Yield the same warnings as ScreeningWarning.get_fan_warnings(),
+        without querying the database.
+        """
+        # Get tickets status.
+        ticket = self.keeper.get_ticket(screening, fan)
+        has_ticket = ticket is not None
+        confirmed = ticket.confirmed if ticket else False
+
+        # Get attendance status.
+        attends = (screening, fan) in self.attendance_keys
+
+        # Get warnings concerning tickets.
+        warnings = []
+        warning_type = ScreeningWarning.WarningType
+        if attends and not has_ticket:
+            warnings.append(ScreeningWarning(screening, fan, warning_type.NEEDS_TICKET))
+        if has_ticket and not attends:
+            warnings.append(ScreeningWarning(screening, fan, warning_type.SHOULD_SELL_TICKET))
+        if attends and has_ticket and not confirmed:
+            warnings.append(ScreeningWarning(screening, fan, warning_type.AWAITS_CONFIRMATION))
+
+        if attends:
+            # Check if screenings of the same film are attended.
+            if self.attendance_count_by_film_by_fan[screening.film][fan] > 1:
+                warnings.append(ScreeningWarning(screening, fan, warning_type.ATTENDS_SAME_FILM))
+
+            # Check if overlapping screenings are attended.
+            if get_overlapping_attended_screenings(screening, fan, interval_index=self.interval_index):
+                warnings.append(ScreeningWarning(screening, fan, warning_type.ATTENDS_OVERLAPPING))
+
+            # Check if fan is available for screening.
+            if not self.get_availability(screening, fan):
+                warnings.append(ScreeningWarning(screening, fan, warning_type.ATTENDS_WHILE_UNAVAILABLE))
+
+        for warning in warnings:
+            yield warning
+
+    def get_availability(self, screening, fan):
+        return self.timeline.fan_fits_screening(fan, screening)
+
+    def _filter(self, manager):
+        queryset = manager.filter(screening__film__festival=self.festival)
+        if self.fans is not None:
+            queryset = queryset.filter(fan__in=self.fans)
+        return queryset
+
+    def _load_attendances(self):
+        attendances = self._filter(Attendance.attendances).select_related(*self.related_fields)
+        for attendance in attendances:
+            screening = attendance.screening
+            fan = attendance.fan
+            self.attendance_keys.add((screening, fan))
+
+            count_by_fan = self.attendance_count_by_film_by_fan.setdefault(screening.film, {})
+            try:
+                count_by_fan[fan] += 1
+            except KeyError:
+                count_by_fan[fan] = 1
+
+            self.interval_index.add_attendance(fan, screening)
+
+    def _load_tickets(self):
+        tickets = self._filter(Ticket.tickets).select_related(*self.related_fields)
+        for ticket in tickets:
+            self.ticket_keys.add((ticket.screening, ticket.fan))
+            try:
+                self.keeper.ticket_by_screening_by_fan[ticket.screening][ticket.fan] = ticket
+            except KeyError:
+                self.keeper.ticket_by_screening_by_fan[ticket.screening] = {ticket.fan: ticket}
+
+    def _load_availabilities(self):
+        keys_set = self.get_keys_set()
+        screenings = {screening for screening, _ in keys_set}
+        fans = {fan for _, fan in keys_set}
+        self.timeline = AvailabilityTimeline.for_screenings(screenings, fans)
+
+
 class ScreeningWarning:
     """
     Represents a warning that concerns a screening and a filmfan.
@@ -581,7 +669,7 @@ class ScreeningWarning:
     def get_warning_stats(cls, festival, warnings=None):
         # Get the warnings.
         getter = cls._get_warning_details
-        warning_details = get_warning_details(warnings, getter) if warnings else get_warnings(festival, getter)
+        warning_details = get_warning_details(warnings, getter) if warnings is not None else get_warnings(festival, getter)
 
         # Calculate the statistics.
         count_by_symbol = {}
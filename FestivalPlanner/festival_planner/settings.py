@@ -57,6 +57,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'festival_planner.request_context.RequestContextMiddleware',
+    'festival_planner.log_store.LogStoreMiddleware',
+    'festival_planner.debug_tools.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -139,3 +142,12 @@ LOGIN_REDIRECT_URL = 'films:index'
 LOGOUT_REDIRECT_URL = 'authentication:logged_out'
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Film rating cache backend. 'local' keeps the films list caches per
+# process, 'sqlite' shares them between processes through the given file.
+FILM_RATING_CACHE_BACKEND = 'local'
+FILM_RATING_CACHE_PATH = BASE_DIR / 'film_rating_cache.sqlite3'
+
+# Profiling. When enabled, the span tree of every request is recorded
+# and aggregated, see festival_planner.debug_tools.
+PROFILING_ENABLED = False
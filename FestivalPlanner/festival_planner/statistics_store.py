@@ -0,0 +1,77 @@
+from django.db.models import Count
+
+from festivals.models import Festival, FestivalStatistics
+from films.models import Film, FilmFanFilmRating
+from screenings.models import Screening, Attendance, Ticket
+from sections.models import Section, Subsection
+
+STATISTICS_VERSION = 1
+STALE_VERSION = 0
+
+
+class StatisticsStore:
+    """
+    Keeps the number of films, ratings, screenings, attendances,
+    tickets, sections and subsections per festival in the festival
+    statistics table, so that the admin overview pages don't need
+    count queries per festival.
+
+    The counts of all festivals are computed with one grouped query
+    per model. Loaders and dumpers refresh the counts of the festival
+    they handle, other changes mark the counts of the concerned
+    festivals as out of date.
+    """
+    manager_and_lookup_by_field = {
+        'film_count': (Film.films, 'festival'),
+        'rating_count': (FilmFanFilmRating.film_ratings, 'film__festival'),
+        'screening_count': (Screening.screenings, 'film__festival'),
+        'attendance_count': (Attendance.attendances, 'screening__film__festival'),
+        'ticket_count': (Ticket.tickets, 'screening__film__festival'),
+        'section_count': (Section.sections, 'festival'),
+        'subsection_count': (Subsection.subsections, 'section__festival'),
+    }
+
+    @classmethod
+    def refresh(cls, festival_ids=None):
+        """Count the objects of the given festivals, of all festivals if none are given, and store the counts."""
+        festivals = Festival.festivals.all() if festival_ids is None else Festival.festivals.filter(id__in=festival_ids)
+        count_by_field_by_festival_id = {festival_id: {} for festival_id in festivals.values_list('id', flat=True)}
+        for field, (manager, lookup) in cls.manager_and_lookup_by_field.items():
+            counts = manager.filter(**{f'{lookup}__in': list(count_by_field_by_festival_id)})
+            for festival_id, count in counts.values_list(lookup).annotate(count=Count('pk')).order_by():
+                count_by_field_by_festival_id[festival_id][field] = count
+
+        statistics = [
+            FestivalStatistics(festival_id=festival_id, version=STATISTICS_VERSION, **count_by_field)
+            for festival_id, count_by_field in count_by_field_by_festival_id.items()
+        ]
+        update_fields = ['version', 'updated', *cls.manager_and_lookup_by_field]
+        FestivalStatistics.statistics.bulk_create(
+            statistics, update_conflicts=True, unique_fields=['festival'], update_fields=update_fields
+        )
+        return {s.festival_id: s for s in statistics}
+
+    @classmethod
+    def mark(cls, festival_ids=None):
+        """Mark the counts of the given festivals, of all festivals if none are given, as out of date."""
+        statistics = FestivalStatistics.statistics.all()
+        if festival_ids is not None:
+            statistics = statistics.filter(festival_id__in=festival_ids)
+        statistics.update(version=STALE_VERSION)
+
+    @classmethod
+    def get_statistics_by_festival_id(cls):
+        """Return the statistics of all festivals by festival id, refreshing those that are out of date."""
+        statistics = FestivalStatistics.statistics.filter(version=STATISTICS_VERSION)
+        statistics_by_festival_id = {s.festival_id: s for s in statistics}
+        festival_ids = set(Festival.festivals.values_list('id', flat=True))
+        outdated_ids = festival_ids - set(statistics_by_festival_id)
+        if outdated_ids:
+            statistics_by_festival_id |= cls.refresh(outdated_ids)
+        return statistics_by_festival_id
+
+    @classmethod
+    def get_statistics(cls, festival):
+        statistics = FestivalStatistics.statistics.filter(festival=festival, version=STATISTICS_VERSION).first()
+        return statistics or cls.refresh([festival.id])[festival.id]
+
@@ -0,0 +1,239 @@
+import datetime
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+
+from authentication.models import FilmFan
+from availabilities.models import Availabilities
+from festivals.models import FestivalBase, Festival
+from films.models import Film, FilmFanFilmRating, user_name_to_fan_name
+from screenings.models import Screening, Attendance, Ticket
+from sections.models import Section, Subsection
+from theaters.models import City, Theater, Screen
+
+SECTION_COLORS = ['red', 'orange', 'yellow', 'lime', 'green', 'blue', 'navy', 'purple', 'fuchsia', 'grey']
+SUBTITLES = ['en', 'nl, en', 'fr, en', 'it, en', '']
+LANGUAGES = ['en', 'nl', 'fr', 'de', 'it']
+MEDIUM_CATEGORIES = ['films', 'films', 'films', 'films', 'events']
+DAY_START_HOUR = 9
+DAY_END_HOUR = 24
+BATCH_SIZE = 1000
+
+SIZE_BY_NAME = {
+    'small': {
+        'film_count': 200,
+        'fan_count': 4,
+        'theater_count': 4,
+        'screens_per_theater': 3,
+        'day_count': 7,
+    },
+    'medium': {
+        'film_count': 1000,
+        'fan_count': 6,
+        'theater_count': 8,
+        'screens_per_theater': 4,
+        'day_count': 10,
+    },
+    'large': {
+        'film_count': 3000,
+        'fan_count': 8,
+        'theater_count': 12,
+        'screens_per_theater': 5,
+        'day_count': 12,
+    },
+}
+
+
+class SyntheticFestivalGenerator:
+    """
+    Fills the database with a festival of configurable size, from
+    sections to availabilities, to measure how the application scales.
+
+    The festival depends only on the seed and the size parameters, so
+    repeated runs generate the same data.
+    """
+    section_count = 8
+    subsections_per_section = 4
+    screenings_per_film = 3
+    rated_fraction = 0.8
+    attended_screenings_per_fan_per_day = 4
+    ticket_fraction = 0.5
+
+    def __init__(self, film_count=200, fan_count=4, theater_count=4, screens_per_theater=3, day_count=7,
+                 seed=0, year=2030):
+        self.film_count = film_count
+        self.fan_count = fan_count
+        self.theater_count = theater_count
+        self.screens_per_theater = screens_per_theater
+        self.day_count = day_count
+        self.seed = seed
+        self.year = year
+        self.random = random.Random(seed)
+        self.festival = None
+        self.fans = []
+        self.users = []
+        self.screens = []
+        self.films = []
+        self.screenings = []
+
+    @classmethod
+    def for_size(cls, size_name, **kwargs):
+        return cls(**(SIZE_BY_NAME[size_name] | kwargs))
+
+    @transaction.atomic
+    def generate(self):
+        city = self._create_city()
+        self.festival = self._create_festival(city)
+        subsections = self._create_sections()
+        self.screens = self._create_screens(city)
+        self.films = self._create_films(subsections)
+        self.screenings = self._create_screenings()
+        self.fans, self.users = self._create_fans()
+        self._create_ratings()
+        self._create_attendances_and_tickets()
+        self._create_availabilities()
+        return self.festival
+
+    def fan_names(self):
+        return [fan.name for fan in self.fans]
+
+    def _next_id(self, manager, field):
+        return (manager.aggregate(max_id=Max(field))['max_id'] or 0) + 1
+
+    def _create_city(self):
+        city_id = self._next_id(City.cities, 'city_id')
+        return City.cities.create(city_id=city_id, name=f'Synthopolis {city_id}', country='nl')
+
+    def _create_festival(self, city):
+        base_count = FestivalBase.festival_bases.count()
+        base = FestivalBase.festival_bases.create(mnemonic=f'Syn{base_count}', name='Synthetic Festival',
+                                                  home_city=city)
+        start_date = datetime.date(self.year, 1, 20)
+        end_date = start_date + datetime.timedelta(days=self.day_count - 1)
+        return Festival.festivals.create(base=base, year=self.year, start_date=start_date, end_date=end_date,
+                                         festival_color=Festival.TURQUOISE)
+
+    def _create_sections(self):
+        sections = Section.sections.bulk_create([
+            Section(festival=self.festival, section_id=i + 1, name=f'Section {i + 1}',
+                    color=SECTION_COLORS[i % len(SECTION_COLORS)])
+            for i in range(self.section_count)
+        ])
+        subsections = [
+            Subsection(subsection_id=s * self.subsections_per_section + i + 1, section=section,
+                       name=f'Subsection {s + 1}.{i + 1}', description=f'Subsection {i + 1} of {section.name}',
+                       url=f'https://synthetic.example/sections/{s + 1}/{i + 1}')
+            for s, section in enumerate(sections) for i in range(self.subsections_per_section)
+        ]
+        return Subsection.subsections.bulk_create(subsections)
+
+    def _create_screens(self, city):
+        first_theater_id = self._next_id(Theater.theaters, 'theater_id')
+        first_screen_id = self._next_id(Screen.screens, 'screen_id')
+        theaters = Theater.theaters.bulk_create([
+            Theater(theater_id=first_theater_id + i, city=city, parse_name=f'Theater {i + 1}',
+                    abbreviation=f'th{i + 1}', priority=self.random.choice(Theater.Priority.values))
+            for i in range(self.theater_count)
+        ])
+        screens = [
+            Screen(screen_id=first_screen_id + t * self.screens_per_theater + i, theater=theater,
+                   parse_name=f'Zaal {i + 1}', abbreviation=f'{i + 1}',
+                   address_type=Screen.ScreenAddressType.PHYSICAL)
+            for t, theater in enumerate(theaters) for i in range(self.screens_per_theater)
+        ]
+        return Screen.screens.bulk_create(screens)
+
+    def _create_films(self, subsections):
+        films = []
+        for i in range(self.film_count):
+            title = f'Synthetic Film {i + 1:05}'
+            films.append(Film(
+                festival=self.festival,
+                film_id=i + 1,
+                seq_nr=i + 1,
+                sort_title=title.lower(),
+                title=title,
+                title_language=self.random.choice(LANGUAGES),
+                subsection=self.random.choice(subsections),
+                duration=datetime.timedelta(minutes=self.random.choice([15, 75, 90, 105, 120, 150])),
+                medium_category=self.random.choice(MEDIUM_CATEGORIES),
+                reviewer=None,
+                url=f'https://synthetic.example/films/{i + 1}',
+            ))
+        return Film.films.bulk_create(films, batch_size=BATCH_SIZE)
+
+    def _create_screenings(self):
+        screenings = []
+        start_datetime = datetime.datetime.combine(self.festival.start_date, datetime.time(DAY_START_HOUR))
+        slot_minutes = 15
+        slot_count = (DAY_END_HOUR - DAY_START_HOUR) * 60 // slot_minutes
+        used_keys = set()
+        for film in self.films:
+            for _ in range(self.screenings_per_film):
+                screen = self.random.choice(self.screens)
+                day = self.random.randrange(self.day_count)
+                slot = self.random.randrange(slot_count)
+                start_dt = start_datetime + datetime.timedelta(days=day, minutes=slot * slot_minutes)
+                key = (film.id, screen.id, start_dt)
+                if key in used_keys:
+                    continue
+                used_keys.add(key)
+                screenings.append(Screening(
+                    film=film,
+                    screen=screen,
+                    start_dt=start_dt,
+                    end_dt=start_dt + film.duration,
+                    subtitles=self.random.choice(SUBTITLES),
+                    q_and_a=self.random.random() < 0.2,
+                ))
+        return Screening.screenings.bulk_create(screenings, batch_size=BATCH_SIZE)
+
+    def _create_fans(self):
+        first_seq_nr = self._next_id(FilmFan.film_fans, 'seq_nr')
+        fans = []
+        users = []
+        for i in range(self.fan_count):
+            username = f'syn{self.festival.id}fan{i + 1}'
+            user = User.objects.create_user(username=username)
+            fan = FilmFan.film_fans.create(name=user_name_to_fan_name(username), seq_nr=first_seq_nr + i,
+                                           is_admin=i == 0)
+            users.append(user)
+            fans.append(fan)
+        return fans, users
+
+    def _create_ratings(self):
+        ratings = []
+        rating_values = FilmFanFilmRating.Rating.values[1:]
+        for fan in self.fans:
+            for film in self.films:
+                if self.random.random() < self.rated_fraction:
+                    rating = self.random.choice(rating_values)
+                    ratings.append(FilmFanFilmRating(film=film, film_fan=fan, rating=rating, original_rating=rating))
+        FilmFanFilmRating.film_ratings.bulk_create(ratings, batch_size=BATCH_SIZE)
+
+    def _create_attendances_and_tickets(self):
+        attendances = []
+        tickets = []
+        attended_count = min(len(self.screenings), self.attended_screenings_per_fan_per_day * self.day_count)
+        for fan in self.fans:
+            for screening in self.random.sample(self.screenings, attended_count):
+                attendances.append(Attendance(fan=fan, screening=screening))
+                if self.random.random() < self.ticket_fraction:
+                    tickets.append(Ticket(fan=fan, screening=screening, confirmed=self.random.random() < 0.5))
+        Attendance.attendances.bulk_create(attendances, batch_size=BATCH_SIZE)
+        Ticket.tickets.bulk_create(tickets, batch_size=BATCH_SIZE)
+
+    def _create_availabilities(self):
+        availabilities = []
+        for fan in self.fans:
+            for day in range(self.day_count):
+                if self.random.random() < 0.2:
+                    continue
+                date = self.festival.start_date + datetime.timedelta(days=day)
+                start_hour = self.random.choice([DAY_START_HOUR, DAY_START_HOUR + 3, DAY_START_HOUR + 6])
+                start_dt = datetime.datetime.combine(date, datetime.time(start_hour))
+                end_dt = datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time(0))
+                availabilities.append(Availabilities(fan=fan, start_dt=start_dt, end_dt=end_dt))
+        Availabilities.availabilities.bulk_create(availabilities, batch_size=BATCH_SIZE)
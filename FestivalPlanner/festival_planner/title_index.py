@@ -0,0 +1,113 @@
+import threading
+import unicodedata
+from operator import itemgetter
+
+from django.db.models import F
+
+from films.models import Film, FilmDataVersion
+
+MIN_NGRAM_LENGTH = 2
+MAX_NGRAM_LENGTH = 3
+
+
+def normalize_title(text):
+    """Return the given text case folded and with diacritics removed."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def get_ngrams(text, length):
+    return {text[i:i + length] for i in range(len(text) - length + 1)}
+
+
+class TitleIndex:
+    """
+    Keeps an n-gram index of the film titles of festivals in memory, so
+    that finding the films whose sort title or title contains a snippet
+    doesn't require scanning all films of the festival.
+
+    The snippet and the titles are compared case and diacritic
+    insensitive. The candidate films are found by intersecting the
+    films of each n-gram of the snippet and confirmed by a substring
+    test on the few candidates left.
+
+    The index of a festival is built when it is first needed and built
+    again after films of the festival have been saved, deleted or
+    loaded. The index is kept with the titles version of the festival,
+    which is kept in the database, so that films saved by other
+    processes are found too, while ratings, attendances and other fan
+    actions leave the index alone.
+    """
+    version_kind = 'titles'
+    version_and_index_by_festival_id = {}
+    lock = threading.Lock()
+
+    def __init__(self, films=()):
+        self.film_by_id = {}
+        self.keys_by_film_id = {}
+        self.film_ids_by_ngram = {}
+        for film in films:
+            self._add_film(film)
+
+    @classmethod
+    def for_festival(cls, festival):
+        version = cls.get_version(festival)
+        with cls.lock:
+            kept_version, index = cls.version_and_index_by_festival_id.get(festival.id, (None, None))
+        if index is None or kept_version != version:
+            index = cls(Film.films.filter(festival=festival))
+            with cls.lock:
+                cls.version_and_index_by_festival_id[festival.id] = (version, index)
+        return index
+
+    @classmethod
+    def get_version(cls, festival):
+        film_data_version, _ = FilmDataVersion.film_data_versions.get_or_create(festival=festival, kind=cls.version_kind)
+        return film_data_version.version
+
+    @classmethod
+    def mark(cls, festival_ids):
+        """Increase the titles versions of the given festivals."""
+        film_data_versions = FilmDataVersion.film_data_versions.filter(festival_id__in=festival_ids, kind=cls.version_kind)
+        film_data_versions.update(version=F('version') + 1)
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.version_and_index_by_festival_id = {}
+
+    def search(self, text):
+        """
+        Return the films of which the sort title or the title contains
+        the given text, sorted by the position of the text in the sort
+        title, or else in the title, and by sort title.
+        """
+        snippet = normalize_title(text)
+        start_by_film_id = {}
+        for film_id in self._get_candidate_ids(snippet):
+            sort_key, title_key = self.keys_by_film_id[film_id]
+            start = sort_key.find(snippet)
+            if start < 0:
+                start = title_key.find(snippet)
+            if start >= 0:
+                start_by_film_id[film_id] = start
+        films_and_starts = [(self.film_by_id[i], s) for i, s in start_by_film_id.items()]
+        sorted_tuples = sorted([(f, s, f.sort_title) for f, s in films_and_starts], key=itemgetter(1, 2))
+        return [f for f, s, t in sorted_tuples]
+
+    def _get_candidate_ids(self, snippet):
+        if len(snippet) < MIN_NGRAM_LENGTH:
+            return set(self.film_by_id)
+        length = min(len(snippet), MAX_NGRAM_LENGTH)
+        id_sets = sorted((self.film_ids_by_ngram.get(n, set()) for n in get_ngrams(snippet, length)), key=len)
+        return set.intersection(*id_sets)
+
+    def _add_film(self, film):
+        keys = (normalize_title(film.sort_title), normalize_title(film.title))
+        self.film_by_id[film.id] = film
+        self.keys_by_film_id[film.id] = keys
+        for key in keys:
+            for length in range(MIN_NGRAM_LENGTH, MAX_NGRAM_LENGTH + 1):
+                for ngram in get_ngrams(key, length):
+                    self.film_ids_by_ngram.setdefault(ngram, set()).add(film.id)
+
@@ -2,6 +2,7 @@ import csv
 import re
 from os import path
 
+from festival_planner.log_store import LogStore
 from festivals.models import current_festival
 from films.models import current_fan, get_user_fan
 
@@ -21,34 +22,30 @@ def application_name():
 
 def initialize_log(session, action='Load'):
     """
-    Initialize log cookie.
+    Start a new log and keep its key in the session.
     """
-    session['log'] = {'results': [], 'action': action}
+    LogStore.start_log(session, action)
 
 
 def add_log(session, text, indent=0):
     """
-    Add text to the results of the log cookie.
+    Add text to the results of the current log.
     """
-    if 'log' not in session:
-        initialize_log(session, 'Uninitialized log')
-    if 'results' not in session['log']:
-        initialize_log(session, 'Uninitialized log results')
-    session['log']['results'].append(f'{INDENT_STRING * indent}{text}')
+    LogStore.add_line(session, f'{INDENT_STRING * indent}{text}')
 
 
 def get_log(session):
     """
-    Get the log cookie.
+    Get the action and the first results of the current log.
     """
-    return session.get('log')
+    return LogStore.get_log(session)
 
 
 def unset_log(session):
     """
-    Unset the log cookie.
+    Unset the current log.
     """
-    session['log'] = None
+    LogStore.unset_log(session)
 
 
 def wrap_up_form_errors(form_errors):
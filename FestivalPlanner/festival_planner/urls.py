@@ -17,6 +17,8 @@ from django.conf.urls import include
 from django.contrib import admin
 from django.urls import path
 
+from festival_planner.profiling_view import ProfilingReportView
+
 urlpatterns = [
     path('admin/', admin.site.urls, name='admin'),
     path('authentication/', include('authentication.urls')),
@@ -27,6 +29,7 @@ urlpatterns = [
     path('screenings/', include('screenings.urls')),
     path('theaters/', include('theaters.urls')),
     path('loader/', include('loader.urls')),
+    path('profiling/', ProfilingReportView.as_view(), name='profiling'),
 ]
 
 admin.autodiscover()
@@ -0,0 +1,83 @@
+from django.db import transaction
+
+from festival_planner.screening_status_getter import FestivalWarningKeeper, ScreeningWarning, get_warnings
+from screenings.models import FanWarning, WarningRefresh
+
+
+class WarningStore:
+    """
+    Keeps the warnings of a festival in the fan warning table, so that
+    reading the warnings is an indexed query instead of a computation
+    over all attendances, tickets and availabilities of the festival.
+
+    Changes of attendances, tickets, availabilities and screenings mark
+    the warnings of the concerned fans as out of date. The warnings of
+    the marked fans are computed again when the warnings of the festival
+    are read.
+    """
+    related_fields = FestivalWarningKeeper.related_fields
+
+    @classmethod
+    def mark(cls, festival_id, fan_ids=None):
+        """
+        Mark the warnings of the given fans in the given festival as out
+        of date, those of all fans if no fans are given.
+        """
+        if fan_ids is None:
+            refreshes = [WarningRefresh(festival_id=festival_id)]
+        else:
+            refreshes = [WarningRefresh(festival_id=festival_id, fan_id=fan_id) for fan_id in set(fan_ids)]
+        WarningRefresh.warning_refreshes.bulk_create(refreshes)
+
+    @classmethod
+    def refresh(cls, festival):
+        """Compute the warnings of the fans that are marked out of date and store them."""
+        marks = list(WarningRefresh.warning_refreshes.filter(festival=festival).values_list('id', 'fan_id'))
+        if not marks:
+            return
+        fan_ids = {fan_id for _, fan_id in marks}
+        fan_ids = None if None in fan_ids else fan_ids
+        keeper = FestivalWarningKeeper(festival, fans=fan_ids)
+        fan_warnings = []
+        for screening, fan in keeper.get_keys_set():
+            for warning in keeper.get_fan_warnings(screening, fan):
+                kwargs = {'screening': screening, 'fan': fan, 'warning_type': warning.warning.value}
+                fan_warnings.append(FanWarning(festival=festival, **kwargs))
+        with transaction.atomic():
+            stored_warnings = FanWarning.fan_warnings.filter(festival=festival)
+            if fan_ids is not None:
+                stored_warnings = stored_warnings.filter(fan_id__in=fan_ids)
+            stored_warnings.delete()
+            FanWarning.fan_warnings.bulk_create(fan_warnings)
+            WarningRefresh.warning_refreshes.filter(id__in=[mark_id for mark_id, _ in marks]).delete()
+
+    @classmethod
+    def rebuild(cls, festival):
+        """Compute and store the warnings of all fans in the given festival."""
+        cls.mark(festival.id)
+        cls.refresh(festival)
+
+    @classmethod
+    def get_warnings(cls, festival):
+        """Return the warnings of the given festival, in the order they were stored per fan."""
+        cls.refresh(festival)
+        fan_warnings = FanWarning.fan_warnings.filter(festival=festival).order_by('id')
+        warning_type = ScreeningWarning.WarningType
+        return [ScreeningWarning(w.screening, w.fan, warning_type(w.warning_type))
+                for w in fan_warnings.select_related(*cls.related_fields)]
+
+    @classmethod
+    def check(cls, festival):
+        """
+        Compare the stored warnings of the given festival with the
+        warnings computed on the fly.
+        Return the keys of the missing and the extra stored warnings as
+        screening id, fan id, warning type tuples.
+        """
+        def get_key(warning):
+            return warning.screening.id, warning.fan.id, warning.warning.value
+
+        stored_keys = {get_key(warning) for warning in cls.get_warnings(festival)}
+        computed_keys = set(get_warnings(festival, get_key))
+        return computed_keys - stored_keys, stored_keys - computed_keys
+
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FestivalsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'festivals'
+
+    def ready(self):
+        # Register the signal receivers that keep the stored festival data current.
+        from festival_planner import festival_data
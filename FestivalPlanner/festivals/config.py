@@ -1,4 +1,6 @@
 import os
+import threading
+from types import MappingProxyType
 
 import yaml
 
@@ -6,10 +8,45 @@ import yaml
 COMMON_CONFIG_PATH = os.path.expanduser('~/Projects/FilmFestivalPlanner/Configs/common.yml')
 
 
+def freeze(value):
+    """Return a read-only view of the given parsed YAML value."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
 class Config:
+    """
+    Reads the common configuration file once per process and shares
+    the result as a read-only view between the modules that use it.
+    The file is only read again when its modification time changes.
+    """
     config = None
     config_path = COMMON_CONFIG_PATH
+    entry_by_path = {}
+    parse_count = 0
+    lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.config_path = path or self.config_path
+        self.config = self.load(self.config_path)
+
+    @classmethod
+    def load(cls, path):
+        mtime = os.stat(path).st_mtime_ns
+        with cls.lock:
+            entry = cls.entry_by_path.get(path)
+        if entry is None or entry[0] != mtime:
+            with open(path, 'r') as stream:
+                entry = (mtime, freeze(yaml.safe_load(stream)))
+            with cls.lock:
+                cls.entry_by_path[path] = entry
+                cls.parse_count += 1
+        return entry[1]
 
-    def __init__(self):
-        with open(self.config_path, 'r') as stream:
-            self.config = yaml.safe_load(stream)
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entry_by_path = {}
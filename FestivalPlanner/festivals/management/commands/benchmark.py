@@ -0,0 +1,215 @@
+import csv
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+import festivals.models
+import films.models
+from festival_planner import debug_tools
+from festival_planner.day_schema_cache import DaySchemaCache
+from festival_planner.synthetic_festival import SyntheticFestivalGenerator, SIZE_BY_NAME
+from festival_planner.tools import CSV_DIALECT
+from festivals.models import switch_festival
+from films.models import Film, FilmFanFilmRating
+from loader.forms.loader_forms import FilmLoader, RatingLoader, ScreeningLoader, RatingDumper, \
+    FILMS_FILE_HEADER, get_subsection_id
+from screenings.forms.screening_forms import PlannerForm
+from screenings.models import Screening
+
+VIEW_NAMES = ['screenings:day_schema', 'screenings:warnings', 'films:films']
+
+
+class QueryCounter:
+    """
+    Counts the executed queries without keeping them, unlike the
+    queries log, which is limited to the last 9000 queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Time the main views, the planner and the loaders against synthetic festivals of several sizes.'
+
+    # The checks import the URL configuration, which queries the database
+    # before the benchmark database exists.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', default=['small'], choices=list(SIZE_BY_NAME),
+                            help='Festival sizes to benchmark.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per target.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic festival generator.')
+        parser.add_argument('--output', default='benchmark_results.json', help='File to write the results to.')
+
+    def handle(self, *args, **options):
+        debug_tools.SUPPRESS_DEBUG_PRINT = True
+        setup_test_environment()
+        old_db_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        festivals.models.TEST_BASE_DIR = tempfile.TemporaryDirectory()
+        results = []
+        try:
+            for size_name in options['sizes']:
+                results.extend(self.benchmark_size(size_name, options['seed'], options['repeat']))
+        finally:
+            festivals.models.clean_base_dir()
+            festivals.models.TEST_BASE_DIR = None
+            connection.creation.destroy_test_db(old_db_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as stream:
+            json.dump({'seed': options['seed'], 'repeat': options['repeat'], 'results': results}, stream, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} results written to {options["output"]}'))
+
+    def benchmark_size(self, size_name, seed, repeat):
+        self.stdout.write(f'Generating {size_name} festival.')
+        generator = SyntheticFestivalGenerator.for_size(size_name, seed=seed)
+        festival = generator.generate()
+        fan_names = generator.fan_names()
+        films.models.FAN_NAMES_BY_FESTIVAL_BASE[festival.base.mnemonic] = fan_names
+        films.models.FANS_IN_RATINGS_TABLE = fan_names
+        os.makedirs(festival.planner_data_dir())
+        os.makedirs(festival.festival_data_dir())
+
+        client = Client()
+        client.force_login(generator.users[0])
+        session = client.session
+        switch_festival(session, festival)
+        generator.fans[0].switch_current(session)
+        session.save()
+
+        size = {
+            'size': size_name,
+            'films': len(generator.films),
+            'screenings': len(generator.screenings),
+            'fans': len(generator.fans),
+        }
+        results = []
+        for view_name in VIEW_NAMES:
+            url = reverse(view_name)
+            results.append(size | self.measure(view_name, repeat, lambda: self.assert_ok(client.get(url), url)))
+        results.extend(size | result for result in self.measure_day_schema_cache(client, repeat))
+
+        results.append(size | self.measure('auto_plan_screenings', repeat, lambda: self.plan(festival)))
+
+        self.write_films_file(festival)
+        self.write_screenings_file(festival)
+        RatingDumper(self.new_session(festival)).dump_objects(
+            festival.ratings_file(), objects=FilmFanFilmRating.film_ratings.filter(film__festival=festival))
+        loaders = [
+            ('film_loader', lambda s: FilmLoader(s, festival)),
+            ('rating_loader', lambda s: RatingLoader(s, festival)),
+            ('screening_loader', lambda s: ScreeningLoader(s, festival, festival_pk='film__festival__pk')),
+        ]
+        for target, new_loader in loaders:
+            results.append(size | self.measure(target, repeat,
+                                               lambda: new_loader(self.new_session(festival)).load_objects()))
+        return results
+
+    def measure(self, target, repeat, func):
+        durations = []
+        query_counts = []
+        for _ in range(repeat):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                func()
+                durations.append(time.perf_counter() - start)
+            query_counts.append(counter.count)
+        result = {
+            'target': target,
+            'median_seconds': statistics.median(durations),
+            'min_seconds': min(durations),
+            'max_seconds': max(durations),
+            'queries': max(query_counts),
+        }
+        self.stdout.write(f'{target}: {result["median_seconds"]:.3f}s, {result["queries"]} queries')
+        return result
+
+    def measure_day_schema_cache(self, client, repeat):
+        """Time the day schema with an empty row cache and with the rows cached by the previous run."""
+        url = reverse('screenings:day_schema')
+
+        def get_cold():
+            DaySchemaCache.clear()
+            self.assert_ok(client.get(url), url)
+
+        cold_result = self.measure('day_schema_cold', repeat, get_cold)
+        DaySchemaCache.reset_counters()
+        warm_result = self.measure('day_schema_warm', repeat, lambda: self.assert_ok(client.get(url), url))
+        warm_result['hit_rate'] = DaySchemaCache.hit_rate()
+        self.stdout.write(f'day_schema_warm: hit rate {warm_result["hit_rate"]:.2f}')
+        return [cold_result, warm_result]
+
+    @staticmethod
+    def assert_ok(response, url):
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} returned status {response.status_code}')
+
+    def plan(self, festival):
+        session = self.new_session(festival)
+        eligible_ratings = FilmFanFilmRating.get_eligible_ratings()
+        eligible_films = list(Film.films.filter(festival=festival, filmfanfilmrating__rating__in=eligible_ratings,
+                                                screening__isnull=False).distinct())
+        PlannerForm.auto_plan_screenings(session, eligible_films)
+        PlannerForm.undo_auto_planning(session, festival)
+
+    @staticmethod
+    def new_session(festival):
+        session = SessionStore()
+        switch_festival(session, festival)
+        session['fan_name'] = films.models.FANS_IN_RATINGS_TABLE[0]
+        return session
+
+    @staticmethod
+    def write_films_file(festival):
+        with open(festival.films_file(), 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile, dialect=CSV_DIALECT)
+            writer.writerow(FILMS_FILE_HEADER)
+            for film in Film.films.filter(festival=festival).select_related('subsection'):
+                writer.writerow([
+                    film.seq_nr,
+                    film.film_id,
+                    film.sort_title,
+                    film.title,
+                    film.title_language,
+                    get_subsection_id(film),
+                    f'{int(film.duration.total_seconds() // 60)}′',
+                    film.medium_category,
+                    film.reviewer or '',
+                    film.url,
+                ])
+
+    @staticmethod
+    def write_screenings_file(festival):
+        screenings = Screening.screenings.filter(film__festival=festival).select_related('film', 'screen')
+        with open(festival.screenings_file(), 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile, dialect=CSV_DIALECT)
+            writer.writerow(ScreeningLoader.expected_header)
+            for screening in screenings:
+                writer.writerow([
+                    screening.film.film_id,
+                    screening.screen.screen_id,
+                    screening.start_dt.isoformat(sep=' '),
+                    screening.end_dt.isoformat(sep=' '),
+                    '',
+                    screening.subtitles or '',
+                    'Q&A' if screening.q_and_a else '',
+                    '',
+                    'SOLD OUT' if screening.sold_out else '',
+                ])
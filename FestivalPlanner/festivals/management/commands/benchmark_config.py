@@ -0,0 +1,91 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from festivals.config import Config, COMMON_CONFIG_PATH
+
+LOADER_DIR = settings.BASE_DIR.parent / 'FilmFestivalLoader'
+
+DJANGO_STARTUP_CODE = """
+import os
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'festival_planner.settings')
+django.setup()
+import films.views
+import loader.forms.loader_forms
+from festivals.config import Config
+print(Config.parse_count)
+"""
+
+SCRAPER_STARTUP_CODE = """
+import Shared.planner_interface
+from Shared.application_tools import Config
+print(Config.parse_count)
+"""
+
+
+class Command(BaseCommand):
+    help = 'Time parsing the common configuration and the startup of Django and the scrapers.'
+
+    # The checks import the URL configuration, which isn't needed to time the configuration.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per target.')
+        parser.add_argument('--output', default='config_benchmark_results.json', help='File to write the results to.')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        measured_results = [
+            self.measure('config_parse', repeat, self.parse_config),
+            self.measure('config_memoized', repeat, lambda: Config.load(COMMON_CONFIG_PATH)),
+            self.measure_startup('django_startup', repeat, DJANGO_STARTUP_CODE, settings.BASE_DIR),
+            self.measure_startup('scraper_startup', repeat, SCRAPER_STARTUP_CODE, LOADER_DIR),
+        ]
+        results = [result for result in measured_results if result is not None]
+
+        with open(options['output'], 'w') as stream:
+            json.dump({'repeat': repeat, 'results': results}, stream, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} results written to {options["output"]}'))
+
+    @staticmethod
+    def parse_config():
+        Config.clear()
+        Config.load(COMMON_CONFIG_PATH)
+
+    def measure(self, target, repeat, func):
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        return self.get_result(target, durations)
+
+    def measure_startup(self, target, repeat, code, cwd):
+        durations = []
+        parse_count = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process = subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True)
+            durations.append(time.perf_counter() - start)
+            if process.returncode:
+                self.stderr.write(f'{target} failed: {process.stderr.strip().splitlines()[-1]}')
+                return None
+            parse_count = int(process.stdout.split()[-1])
+        return self.get_result(target, durations, parses=parse_count)
+
+    def get_result(self, target, durations, **kwargs):
+        result = {
+            'target': target,
+            'median_seconds': statistics.median(durations),
+            'min_seconds': min(durations),
+            'max_seconds': max(durations),
+        } | kwargs
+        parses = f', {kwargs["parses"]} parses' if 'parses' in kwargs else ''
+        self.stdout.write(f'{target}: {result["median_seconds"]:.6f}s{parses}')
+        return result
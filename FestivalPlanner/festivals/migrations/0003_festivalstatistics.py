@@ -0,0 +1,36 @@
+# Generated by Django 6.1.2 on 2026-10-17 08:11
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('festivals', '0002_alter_festivalbase_home_city'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FestivalStatistics',
+            fields=[
+                ('festival', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='festivals.festival')),
+                ('version', models.IntegerField(default=0)),
+                ('film_count', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+                ('screening_count', models.IntegerField(default=0)),
+                ('attendance_count', models.IntegerField(default=0)),
+                ('ticket_count', models.IntegerField(default=0)),
+                ('section_count', models.IntegerField(default=0)),
+                ('subsection_count', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'festival_statistics',
+            },
+            managers=[
+                ('statistics', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-17 08:51
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.db import migrations, models
+
+
+def stamp_all_festivals(apps, schema_editor):
+    festival_model = apps.get_model('festivals', 'Festival')
+    fan_model = apps.get_model('authentication', 'FilmFan')
+    stamp_model = apps.get_model('festivals', 'DataStamp')
+    fans = list(fan_model._default_manager.all())
+    stamps = [stamp_model(festival=festival, fan=fan) for festival in festival_model._default_manager.all() for fan in fans]
+    stamp_model._default_manager.bulk_create(stamps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('festivals', '0003_festivalstatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataStamp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=1)),
+                ('modified', models.DateTimeField(auto_now_add=True)),
+                ('fan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.filmfan')),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='festivals.festival')),
+            ],
+            options={
+                'db_table': 'data_stamp',
+                'constraints': [models.UniqueConstraint(fields=('festival', 'fan'), name='unique_festival_fan')],
+            },
+            managers=[
+                ('stamps', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RunPython(stamp_all_festivals, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ import os
 
 from django.db import models
 
+from festival_planner.request_context import resolve_in_request
 from festivals.config import Config
 
 TEST_BASE_DIR = None
@@ -134,6 +135,63 @@ class Festival(models.Model):
         return os.path.join(self.festival_data_dir(), 'calendar.csv')
 
 
+class FestivalStatistics(models.Model):
+    """
+    Summary table with the number of objects per festival, as displayed
+    on the admin overview pages.
+    A row is current when its version equals the version of the
+    statistics store, out-of-date rows have version zero.
+    """
+
+    # Define the fields.
+    festival = models.OneToOneField(Festival, on_delete=models.CASCADE, primary_key=True, related_name='statistics')
+    version = models.IntegerField(default=0)
+    film_count = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    screening_count = models.IntegerField(default=0)
+    attendance_count = models.IntegerField(default=0)
+    ticket_count = models.IntegerField(default=0)
+    section_count = models.IntegerField(default=0)
+    subsection_count = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    # Define a manager.
+    statistics = models.Manager()
+
+    class Meta:
+        db_table = 'festival_statistics'
+
+    def __str__(self):
+        return f'Statistics of {self.festival}'
+
+
+class DataStamp(models.Model):
+    """
+    Stamp table, holds a version and a modification time per festival
+    and fan, which change when the data shown in the list views of the
+    festival changes. The list views use them to answer conditional
+    requests without rendering the page again.
+    """
+
+    # Define the fields.
+    festival = models.ForeignKey(Festival, on_delete=models.CASCADE)
+    fan = models.ForeignKey('authentication.FilmFan', on_delete=models.CASCADE)
+    version = models.IntegerField(default=1)
+    modified = models.DateTimeField(auto_now_add=True)
+
+    # Define a manager.
+    stamps = models.Manager()
+
+    class Meta:
+        db_table = 'data_stamp'
+        constraints = [
+            models.UniqueConstraint(fields=['festival', 'fan'], name='unique_festival_fan')
+        ]
+
+    def __str__(self):
+        return f'Version {self.version} of {self.festival} for {self.fan}'
+
+
 def default_festival(today=None):
     """
     Return a festival object that will do as a default festival when
@@ -160,6 +218,11 @@ def set_current_festival(session):
 
 def current_festival(session):
     festival_id = session.get('festival')
+    key = ('festival', festival_id)
+    return resolve_in_request(key, lambda: get_festival_or_default(festival_id), session)
+
+
+def get_festival_or_default(festival_id):
     if festival_id is None:
         return default_festival()
     festival = Festival.festivals.get(id=festival_id)
@@ -1,10 +1,22 @@
+import os
+import tempfile
 from datetime import date
 
-from django.test import TestCase
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from authentication.tests import set_up_user_with_fan
 from festival_planner import debug_tools
-from festivals.models import Festival, FestivalBase
+from festival_planner.request_context import RequestContextMiddleware, get_request_context
+from festival_planner.synthetic_festival import SyntheticFestivalGenerator
+from festival_planner.tools import add_base_context
+from festivals.config import Config
+from festivals.models import Festival, FestivalBase, current_festival, switch_festival
+from films.models import current_fan, Film, FilmFanFilmRating
+from screenings.models import Screening
 from theaters.models import City
 
 
@@ -64,3 +76,165 @@ class FestivalModelTests(TestCase):
             response.context['festival_rows'],
             [festival_2, festival_1, festival_3],
         )
+
+
+class ConfigTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.temp_dir.name, 'common.yml')
+        with open(self.config_path, 'w') as stream:
+            stream.write('Constants:\n    MaxShortMinutes: 40\n')
+
+    def tearDown(self):
+        super().tearDown()
+        Config.entry_by_path.pop(self.config_path, None)
+        self.temp_dir.cleanup()
+
+    def test_config_is_parsed_once(self):
+        """
+        Instantiating the configuration more than once parses the file
+        once and shares the same read-only view.
+        """
+        # Arrange.
+        parse_count = Config.parse_count
+
+        # Act.
+        configs = [Config(self.config_path).config for _ in range(3)]
+
+        # Assert.
+        self.assertEqual(Config.parse_count, parse_count + 1)
+        self.assertIs(configs[0], configs[2])
+        with self.assertRaises(TypeError):
+            configs[0]['Constants']['MaxShortMinutes'] = 20
+
+    def test_changed_config_is_parsed_again(self):
+        """
+        The configuration is parsed again after the file was modified.
+        """
+        # Arrange.
+        _ = Config(self.config_path).config
+        with open(self.config_path, 'w') as stream:
+            stream.write('Constants:\n    MaxShortMinutes: 20\n')
+        mtime_ns = os.stat(self.config_path).st_mtime_ns + 1_000_000_000
+        os.utime(self.config_path, ns=(mtime_ns, mtime_ns))
+
+        # Act.
+        config = Config(self.config_path).config
+
+        # Assert.
+        self.assertEqual(config['Constants']['MaxShortMinutes'], 20)
+
+
+class RequestContextTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.city = City.cities.create(city_id=1, name='Berlin', country='de')
+        self.festival = create_festival('IFFR', self.city, '2021-01-27', '2021-02-06')
+        self.other_festival = create_festival('IDFA', self.city, '2021-11-10', '2021-11-21')
+        self.fan, self.user, _ = set_up_user_with_fan('john', 'jOhN', is_admin=True)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = SessionStore()
+        self.request.session['festival'] = self.festival.id
+        self.request.session['fan_name'] = self.fan.name
+        self.contexts = []
+
+    def arrange_view(self, request, lookup_count=3):
+        """
+        Look up the base context and the current festival and fan several times, like views do.
+        """
+        session = request.session
+        _ = add_base_context(request, {})
+        for _ in range(lookup_count):
+            _ = current_festival(session)
+            _ = current_fan(session)
+        context = add_base_context(request, {})
+        self.contexts.append(context)
+        return context
+
+    def count_queries(self, view):
+        with CaptureQueriesContext(connection) as context:
+            _ = view(self.request)
+        return len(context.captured_queries)
+
+    def test_request_context_saves_queries(self):
+        """
+        With the request context middleware, the festival, the fan and
+        the user fan are queried once per request.
+        """
+        # Arrange.
+        queries_before = self.count_queries(self.arrange_view)
+        middleware = RequestContextMiddleware(self.arrange_view)
+        repeating_middleware = RequestContextMiddleware(lambda request: self.arrange_view(request, lookup_count=6))
+
+        # Act.
+        queries_after = self.count_queries(middleware)
+        repeated_queries_after = self.count_queries(repeating_middleware)
+
+        # Assert.
+        self.assertLess(queries_after, queries_before)
+        self.assertEqual(repeated_queries_after, queries_after)
+        self.assertEqual(self.contexts[0]['festival'], self.contexts[1]['festival'])
+        self.assertEqual(self.contexts[1]['current_fan'], self.fan)
+        self.assertIs(self.contexts[1]['user_is_admin'], True)
+        self.assertIs(self.contexts[1]['user_represents_fan'], False)
+        self.assertIsNone(get_request_context())
+
+    def test_request_context_follows_session_changes(self):
+        """
+        The current festival is looked up again when the session switches festivals.
+        """
+        # Arrange.
+        def view(request):
+            festival_before = current_festival(request.session)
+            switch_festival(request.session, self.other_festival)
+            return festival_before, current_festival(request.session)
+
+        middleware = RequestContextMiddleware(view)
+
+        # Act.
+        festival_before, festival_after = middleware(self.request)
+
+        # Assert.
+        self.assertEqual(festival_before, self.festival)
+        self.assertEqual(festival_after, self.other_festival)
+
+
+class SyntheticFestivalTests(TestCase):
+
+    @staticmethod
+    def generate(seed):
+        kwargs = {
+            'film_count': 20,
+            'fan_count': 2,
+            'theater_count': 2,
+            'screens_per_theater': 2,
+            'day_count': 3,
+            'seed': seed,
+        }
+        generator = SyntheticFestivalGenerator(**kwargs)
+        festival = generator.generate()
+        screenings = Screening.screenings.filter(film__festival=festival).order_by('film__film_id', 'start_dt')
+        ratings = FilmFanFilmRating.film_ratings.filter(film__festival=festival).order_by('film__film_id')
+        return {
+            'films': Film.films.filter(festival=festival).count(),
+            'screenings': [(s.film.film_id, s.screen.parse_name, s.start_dt.time()) for s in screenings],
+            'ratings': [(r.film.film_id, r.rating) for r in ratings],
+        }
+
+    def test_synthetic_festival_is_deterministic(self):
+        """
+        Generating a synthetic festival twice with the same seed yields the same data.
+        """
+        # Act.
+        first_data = self.generate(seed=7)
+        second_data = self.generate(seed=7)
+
+        # Assert.
+        self.assertEqual(first_data['films'], 20)
+        self.assertGreater(len(first_data['screenings']), 0)
+        self.assertEqual(first_data['screenings'], second_data['screenings'])
+        self.assertEqual(first_data['ratings'], second_data['ratings'])
@@ -1,6 +1,3 @@
-import copy
-from datetime import datetime
-
 from django import forms
 from django.core.validators import RegexValidator
 from django.db import transaction, IntegrityError
@@ -10,6 +7,8 @@ from authentication.models import FilmFan
 from festival_planner.cache import FilmRatingCache
 from festival_planner.cookie import Warnings
 from festival_planner.fan_action import RatingAction
+from festival_planner.festival_data import mark_festival_data
+from festival_planner.rating_matrix import RatingMatrix
 from festival_planner.tools import add_log
 from festivals.config import Config
 from festivals.models import rating_action_key, current_festival
@@ -44,6 +43,7 @@ class PickRating(forms.Form):
         min_length=2,
     )
     film_rating_cache = None
+    rating_matrix = None
     rating_action_by_field = {key: RatingAction(key) for key in FIELD_BY_POST_ATTENDANCE.values()}
 
     @classmethod
@@ -86,12 +86,18 @@ class PickRating(forms.Form):
         if not post_attendance:
             zero_kwargs |= {'original_rating': UNRATED_RATING}
         zero_ratings = manager.filter(**zero_kwargs)
+        matrix_value = int(rating_value)
         if zero_ratings.count():
             zero_ratings.delete()
+            matrix_value = None
 
-        # Update cache if applicable.
+        # Update caches if applicable.
         if not post_attendance and cls.film_rating_cache:
             cls.film_rating_cache.update_festival_caches(session, film, fan, rating_value)
+        if not post_attendance and cls.rating_matrix and cls.rating_matrix.festival_id == film.festival_id:
+            cls.rating_matrix.update(film, fan, matrix_value)
+            # The patched matrix includes the rating, which increased the ratings version.
+            cls.rating_matrix.generation = cls.get_rating_matrix_generation(film.festival)
 
         return new_rating
 
@@ -108,6 +114,33 @@ class PickRating(forms.Form):
         alternative_films |= set(list(manager.filter(main_title=default_film)))
         return alternative_films
 
+    @classmethod
+    def get_rating_matrix_generation(cls, festival):
+        """
+        Return the generation of the rating matrix of the given festival.
+        It includes the ratings version of the festival, which all
+        processes share, so that rating changes in other processes
+        invalidate the kept matrix too.
+        """
+        if not cls.film_rating_cache:
+            return None
+        return cls.film_rating_cache.get_generation(festival), RatingMatrix.get_version(festival)
+
+    @classmethod
+    def load_rating_matrix(cls, festival):
+        """Read the rating matrix of the given festival and keep it alongside the film rating cache."""
+        generation = cls.get_rating_matrix_generation(festival)
+        cls.rating_matrix = RatingMatrix.for_festival(festival, generation=generation)
+        return cls.rating_matrix
+
+    @classmethod
+    def get_rating_matrix(cls, festival):
+        """Return the kept rating matrix of the given festival, read it again if invalidated."""
+        generation = cls.get_rating_matrix_generation(festival)
+        if generation is not None and cls.rating_matrix and cls.rating_matrix.is_valid(festival, generation):
+            return cls.rating_matrix
+        return cls.load_rating_matrix(festival)
+
     @classmethod
     def invalidate_festival_caches(cls, session, errors=None):
         errors = errors or []
@@ -130,6 +163,8 @@ class TitlesForm(forms.Form):
         film_ = Film.films.filter(id=alternative_title_film_id)
         _ = film_.update(main_title=main_film)
 
+        mark_festival_data(film_.values_list('festival_id', flat=True), fan_ids=())
+
         # Set the ratings of the alt film to those of the main film
         # after saving the original ratings.
         alt_film = film_.first()
@@ -215,13 +250,3 @@ def init_rating_action(session, old_rating_str, new_rating, field):
         'field': field,
     }
     PickRating.rating_action_by_field[field].init_action(session, **kwargs)
-
-
-def refreshed_rating_action(session, tag):
-    key = rating_action_key(session, tag)
-    if key in session:
-        action = copy.deepcopy(session[key])
-        action['action_time'] = datetime.fromisoformat(action['action_time'])
-    else:
-        action = None
-    return action
@@ -0,0 +1,32 @@
+# Generated by Django 6.1.2 on 2026-10-17 14:12
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('festivals', '0004_datastamp'),
+        ('films', '0009_filmfanfilmrating_original_rating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('version', models.IntegerField(default=1)),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='festivals.festival')),
+            ],
+            options={
+                'db_table': 'film_data_version',
+                'constraints': [models.UniqueConstraint(fields=('festival', 'kind'), name='unique_festival_kind')],
+            },
+            managers=[
+                ('film_data_versions', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
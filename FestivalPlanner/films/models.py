@@ -1,6 +1,7 @@
 from django.db import models
 
 from authentication.models import FilmFan
+from festival_planner.request_context import resolve_in_request
 from festivals.config import Config
 from festivals.models import Festival, current_festival
 from sections.models import Subsection
@@ -52,21 +53,24 @@ class Film(models.Model):
     def duration_str(self):
         return ':'.join(f'{self.duration}'.split(':')[:2])
 
-    def rating_strings(self):
+    def rating_strings(self, ordered_ratings=None):
         """
         Returns a string of fan initials with their ratings, the representative
         rating of the film, and the maximum rating of the film.
         The representative rating string is the highest rating, with a question
         mark added when the lowest rating significantly differs.
+        The ratings of the film, ordered by rating, can be given to save a query.
         """
-        ordered_ratings = FilmFanFilmRating.film_ratings.filter(film=self).order_by('rating')
+        if ordered_ratings is None:
+            ratings = FilmFanFilmRating.film_ratings.filter(film=self).select_related('film_fan')
+            ordered_ratings = list(ratings.order_by('rating', 'id'))
 
         # Get a summary of fans and their ratings.
         fans_rating_str = ''.join([r.str_fan_rating() for r in ordered_ratings])
 
         # Get the representative rating.
-        min_rating = get_rating_as_int(ordered_ratings.first())
-        max_rating = get_rating_as_int(ordered_ratings.last())
+        min_rating = get_rating_as_int(ordered_ratings[0] if ordered_ratings else None)
+        max_rating = get_rating_as_int(ordered_ratings[-1] if ordered_ratings else None)
         film_rating_str = str(max_rating)
         if min_rating != FilmFanFilmRating.Rating.INDECISIVE and max_rating - min_rating >= MIN_ALARM_RATING_DIFF:
             film_rating_str += '?'
@@ -162,6 +166,31 @@ class FilmFanFilmVote(models.Model):
         return f"{self.film} - {self.film_fan.initial()}{self.vote}"
 
 
+class FilmDataVersion(models.Model):
+    """
+    Version table, holds a counter per festival and kind of film data,
+    like the titles, that is increased when that data changes. Processes
+    that keep film data in memory compare the counter with the one they
+    kept the data with.
+    """
+    # Define the fields.
+    festival = models.ForeignKey(Festival, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16)
+    version = models.IntegerField(default=1)
+
+    # Define a manager.
+    film_data_versions = models.Manager()
+
+    class Meta:
+        db_table = 'film_data_version'
+        constraints = [
+            models.UniqueConstraint(fields=['festival', 'kind'], name='unique_festival_kind')
+        ]
+
+    def __str__(self):
+        return f'Version {self.version} of the {self.kind} of {self.festival}'
+
+
 UNRATED_RATING = FilmFanFilmRating.Rating.UNRATED
 CLASS_BY_POST_ATTENDANCE = {False: FilmFanFilmRating, True: FilmFanFilmVote}
 FIELD_BY_POST_ATTENDANCE = {False: 'rating', True: 'vote'}
@@ -181,8 +210,8 @@ def set_current_fan(request):
 
 def current_fan(session):
     fan_name = session.get('fan_name')
-    fan = FilmFan.film_fans.get(name=fan_name) if fan_name else None
-    return fan
+    key = ('fan', fan_name)
+    return resolve_in_request(key, lambda: FilmFan.film_fans.get(name=fan_name) if fan_name else None, session)
 
 
 def unset_current_fan(session):
@@ -198,8 +227,8 @@ def get_user_fan(user):
     if not user.is_authenticated:
         return None
     user_fan_name = user_name_to_fan_name(user.username)
-    user_fan = FilmFan.film_fans.get(name=user_fan_name) if user_fan_name is not None else None
-    return user_fan
+    key = ('user_fan', user_fan_name)
+    return resolve_in_request(key, lambda: FilmFan.film_fans.get(name=user_fan_name))
 
 
 def initial(fan, session):
@@ -1,3 +1,4 @@
+import csv
 import os
 import re
 import tempfile
@@ -10,17 +11,23 @@ from urllib.parse import urlparse, urlunparse
 
 import yaml
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.http import HttpRequest
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 import festivals.models
 from authentication.models import me, FilmFan
 from authentication.tests import set_up_user_with_fan
 from festival_planner import debug_tools
-from festival_planner.cache import FilmRatingCache
+from festival_planner.cache import FilmRatingCache, FilmRatingCacheData, LocalCacheBackend, SqliteCacheBackend
 from festival_planner.cookie import Filter
+from festival_planner.data_stamp_store import DataStampStore
+from festival_planner.film_info_store import FilmInfoStore
+from festival_planner.rating_matrix import RatingMatrix
+from festival_planner.title_index import TitleIndex
+from festival_planner.tools import CSV_DIALECT
 from festivals.models import current_festival, FestivalBase, Festival
 from festivals.tests import create_festival
 from films import views, models
@@ -407,6 +414,9 @@ class ViewsTestCase(TestCase):
         # Cleanup the fans who appear in the rating views.
         models.FANS_IN_RATINGS_TABLE[:] = []
 
+        # Forget the title indexes of festivals rolled back by earlier tests.
+        TitleIndex.clear()
+
     def tearDown(self):
         super().tearDown()
         _ = self.client.post(reverse('authentication:logout'))
@@ -934,6 +944,85 @@ class FilmListViewTests(ViewsTestCase):
                             + r' \(' + f'{rating_name}' + r'\)')
         self.assertRegex(get_decoded_content(redirect_response), log_re)
 
+    def test_film_list_queries_do_not_depend_on_film_count(self):
+        """
+        The film ratings view reads the ratings of all films at once.
+        """
+        # Arrange.
+        festival = create_festival('RMF', self.city, '2024-08-01', '2024-08-10')
+        models.FANS_IN_RATINGS_TABLE[:] = [self.admin_fan.name, self.regular_fan.name]
+        _ = self.get_regular_fan_request()
+
+        def arrange_rated_films(first_film_id, count):
+            for film_id in range(first_film_id, first_film_id + count):
+                film = create_film(film_id=film_id, title=f'Matrix Part {film_id}', minutes=95, festival=festival)
+                create_rating(film, self.admin_fan, rating=8)
+                create_rating(film, self.regular_fan, rating=6)
+            PickRating.film_rating_cache.invalidate_festival_caches(festival)
+
+        # The first request creates the ratings version of the festival.
+        _ = self.client.get(reverse('films:films'))
+        arrange_rated_films(1, 2)
+        with CaptureQueriesContext(connection) as few_films_context:
+            few_films_response = self.client.get(reverse('films:films'))
+        arrange_rated_films(3, 6)
+
+        # Act.
+        with CaptureQueriesContext(connection) as many_films_context:
+            many_films_response = self.client.get(reverse('films:films'))
+
+        # Assert.
+        self.assertEqual(few_films_response.status_code, HTTPStatus.OK)
+        self.assertEqual(many_films_response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(many_films_response.context['film_rows']), 8)
+        self.assertEqual(len(many_films_context.captured_queries), len(few_films_context.captured_queries))
+        self.assertEqual(many_films_response.context['rated_features_count'], 8)
+
+    def test_rating_matrix_is_patched_when_rating_changes(self):
+        """
+        Changing a rating in the film ratings view updates the kept rating
+        matrix in place instead of reading it again.
+        """
+        # Arrange.
+        festival = create_festival('RMF', self.city, '2024-08-01', '2024-08-10')
+        film = create_film(film_id=2001, title='Odysseus in Trouble', minutes=128, festival=festival)
+        create_rating(film, self.admin_fan, rating=5)
+        _ = self.get_admin_request()
+        _ = self.client.get(reverse('films:films'))
+        rating_matrix = PickRating.rating_matrix
+        post_data = self.arrange_get_rating_post_data(film, rating_value=9)
+
+        # Act.
+        _ = self.client.post(reverse('films:films'), data=post_data)
+
+        # Assert.
+        self.assertIs(PickRating.get_rating_matrix(festival), rating_matrix)
+        self.assertEqual(rating_matrix.get_rating(film, self.admin_fan), 9)
+        self.assertEqual(FilmFanFilmRating.film_ratings.get(film=film, film_fan=self.admin_fan).rating, 9)
+
+    def test_rating_matrix_follows_rating_changes_of_other_processes(self):
+        """
+        A rating that changes without patching the kept rating matrix, as
+        happens in other processes, invalidates the kept matrix.
+        """
+        # Arrange.
+        festival = create_festival('RMO', self.city, '2024-08-01', '2024-08-10')
+        film = create_film(film_id=2002, title='Odysseus Returns', minutes=101, festival=festival)
+        rating = create_rating(film, self.admin_fan, rating=5)
+        _ = self.get_admin_request()
+        _ = self.client.get(reverse('films:films'))
+        kept_matrix = PickRating.get_rating_matrix(festival)
+
+        # Act.
+        rating.rating = 9
+        rating.save()
+        rating_matrix = PickRating.get_rating_matrix(festival)
+
+        # Assert.
+        self.assertEqual(kept_matrix.get_rating(film, self.admin_fan), 5)
+        self.assertIsNot(rating_matrix, kept_matrix)
+        self.assertEqual(rating_matrix.get_rating(film, self.admin_fan), 9)
+
     def test_logged_in_fan_can_change_rating(self):
         """
         A logged in fan can change an existing rating of a film.
@@ -1461,3 +1550,305 @@ class ReviewersViewTests(ViewsTestCase):
         self.assertRegex(filter_content, r'>\s*' + f'{self.reviewer_cannes}' + r'\s*<')
         self.assertNotRegex(filter_content, r'>\s*' + f'{self.reviewer_patience}' + r'\s*<')
         self.assertRegex(filter_content, compiled_all_re)
+
+
+class FilmRatingCacheBackendTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        arrange_film_fans()
+        self.fan = FilmFan.film_fans.get(name='paul')
+        self.festival = create_std_festival()
+        self.films = [create_film(i, f'Film {i}', 90, festival=self.festival) for i in range(1, 4)]
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.backends = [
+            LocalCacheBackend(),
+            SqliteCacheBackend(os.path.join(self.tmp_dir.name, 'cache.sqlite3')),
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def _arrange_cache_data(self, backend):
+        film_rows = [{
+            'film': film,
+            'fan_ratings': [{'fan': self.fan, 'rating_str': UNRATED_STR, 'choices': []}],
+        } for film in self.films]
+        return FilmRatingCacheData(film_rows, self.festival.id, backend.get_generation(self.festival.id))
+
+    def test_patched_film_row_is_returned(self):
+        """
+        A film row patched in the cache backend is returned with the patch.
+        """
+        for backend in self.backends:
+            # Arrange.
+            generation = backend.get_generation(self.festival.id)
+            backend.set('key', self._arrange_cache_data(backend))
+            film = self.films[1]
+
+            # Act.
+            backend.patch_film_row('key', film.id, lambda row: row['fan_ratings'][0].update({'rating_str': '8'}))
+
+            # Assert.
+            film_rows = backend.get('key', generation).get_film_rows()
+            self.assertEqual([row['film'] for row in film_rows], self.films)
+            self.assertEqual([row['fan_ratings'][0]['rating_str'] for row in film_rows], [UNRATED_STR, '8', UNRATED_STR])
+
+    def test_festival_invalidation_by_generation(self):
+        """
+        Incrementing the festival generation invalidates the caches of the festival.
+        """
+        for backend in self.backends:
+            # Arrange.
+            backend.set('key', self._arrange_cache_data(backend))
+            generation = backend.get_generation(self.festival.id)
+
+            # Act.
+            backend.increment_generation(self.festival.id)
+
+            # Assert.
+            new_generation = backend.get_generation(self.festival.id)
+            self.assertEqual(new_generation, generation + 1)
+            self.assertTrue(backend.contains('key', generation))
+            self.assertFalse(backend.contains('key', new_generation))
+            self.assertEqual(backend.festival_keys(self.festival.id, new_generation), [])
+            self.assertRaises(KeyError, backend.get, 'key', new_generation)
+
+    def test_least_recently_used_cache_is_evicted(self):
+        """
+        The least recently used caches are evicted when the number of caches exceeds the maximum.
+        """
+        for backend in self.backends:
+            # Arrange.
+            generation = backend.get_generation(self.festival.id)
+            for key in ['a', 'b', 'c']:
+                backend.set(key, self._arrange_cache_data(backend))
+            _ = backend.get('a', generation)
+
+            # Act.
+            backend.evict(2)
+
+            # Assert.
+            self.assertEqual(set(backend.keys()), {'a', 'c'})
+            self.assertEqual(backend.count(), 2)
+
+
+class FilmInfoStoreTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        festivals.models.TEST_BASE_DIR = tempfile.TemporaryDirectory()
+        FilmInfoStore.clear()
+        self.festival = new_std_festival()
+        self.film = create_film(1, 'The Store Keeper', 91, festival=self.festival)
+        os.makedirs(self.festival.planner_data_dir())
+
+    def tearDown(self):
+        super().tearDown()
+        FilmInfoStore.clear()
+        festivals.models.clean_base_dir()
+
+    def _arrange_write_descriptions(self, description, mtime):
+        path = self.festival.filminfo_csv_file()
+        with open(path, 'w', newline='') as csvfile:
+            csv_writer = csv.writer(csvfile, dialect=CSV_DIALECT)
+            csv_writer.writerow([self.film.film_id, description, ''])
+            csv_writer.writerow([self.film.film_id + 1, 'Another description', ''])
+        os.utime(path, (mtime, mtime))
+
+    def test_description_without_file(self):
+        """
+        A film has no description when the festival has no descriptions file.
+        """
+        # Act.
+        description = FilmInfoStore.get_description(self.film)
+
+        # Assert.
+        self.assertIsNone(description)
+        self.assertIsNone(FilmInfoStore.get_film_info(self.festival))
+
+    def test_descriptions_are_read_once(self):
+        """
+        The descriptions file is read once as long as it doesn't change.
+        """
+        # Arrange.
+        self._arrange_write_descriptions('A keeper of stores.', 1000000)
+        description_by_film_id = FilmInfoStore.get_description_by_film_id(self.festival)
+
+        # Act.
+        description = FilmInfoStore.get_description(self.film)
+
+        # Assert.
+        self.assertEqual(description, 'A keeper of stores.')
+        self.assertIs(FilmInfoStore.get_description_by_film_id(self.festival), description_by_film_id)
+        self.assertEqual(len(description_by_film_id), 2)
+
+    def test_descriptions_are_read_again_when_file_changes(self):
+        """
+        The descriptions are read again when the modification time of the file has changed.
+        """
+        # Arrange.
+        self._arrange_write_descriptions('A keeper of stores.', 1000000)
+        _ = FilmInfoStore.get_description(self.film)
+        self._arrange_write_descriptions('A storer of keeps.', 2000000)
+
+        # Act.
+        description = FilmDetailView.get_description(self.film)
+
+        # Assert.
+        self.assertEqual(description, 'A storer of keeps.')
+
+    def test_film_info_is_read_again_when_file_changes(self):
+        """
+        The film info is read once and read again when the file has changed.
+        """
+        # Arrange.
+        path = self.festival.filminfo_yaml_file()
+        for mtime, articles in [(1000000, ['First']), (2000000, ['Second', 'version'])]:
+            with open(path, 'w') as stream:
+                yaml.dump({'articles': {self.film.film_id: articles}}, stream)
+            os.utime(path, (mtime, mtime))
+            first_info = FilmInfoStore.get_film_info(self.festival)
+
+            # Act.
+            film_info = FilmInfoStore.get_film_info(self.festival)
+
+            # Assert.
+            self.assertIs(film_info, first_info)
+            self.assertEqual(film_info['articles'][self.film.film_id], articles)
+
+
+class RatingMatrixTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        arrange_film_fans()
+        self.fans = list(FilmFan.film_fans.order_by('seq_nr'))
+        self.festival = new_std_festival()
+        self.films = [create_film(i, f'Rows and Columns {i}', 90, festival=self.festival) for i in range(1, 4)]
+
+    def test_matrix_is_read_in_one_query(self):
+        """
+        The ratings of all films of a festival are read with one query.
+        """
+        # Arrange.
+        create_rating(self.films[0], self.fans[0], rating=8)
+        create_rating(self.films[0], self.fans[1], rating=UNRATED_RATING, original_rating=6)
+        create_rating(self.films[2], self.fans[3], rating=10)
+        other_film = create_film(1, 'Elsewhere', 90)
+        create_rating(other_film, self.fans[0], rating=3)
+
+        # Act.
+        with CaptureQueriesContext(connection) as context:
+            rating_matrix = RatingMatrix.for_festival(self.festival)
+
+        # Assert.
+        self.assertEqual(len(context.captured_queries), 1)
+        for film in self.films:
+            for fan in self.fans:
+                self.assertEqual(rating_matrix.get_rating_str(film, fan), models.fan_rating_str(fan, film))
+        self.assertEqual(sorted(rating_matrix.get_ratings(self.films[0])), [0, 8])
+        self.assertEqual(rating_matrix.get_ratings(self.films[1]), [])
+        self.assertIsNone(rating_matrix.get_rating(other_film, self.fans[0]))
+
+    def test_matrix_can_be_patched(self):
+        """
+        A single rating can be set and removed in place.
+        """
+        # Arrange.
+        create_rating(self.films[0], self.fans[0], rating=8)
+        rating_matrix = RatingMatrix.for_festival(self.festival)
+
+        # Act.
+        rating_matrix.update(self.films[1], self.fans[2], 7)
+        rating_matrix.update(self.films[0], self.fans[0], None)
+
+        # Assert.
+        self.assertEqual(rating_matrix.get_rating(self.films[1], self.fans[2]), 7)
+        self.assertEqual(rating_matrix.get_rating_str(self.films[0], self.fans[0]), UNRATED_STR)
+        self.assertEqual(rating_matrix.get_ratings(self.films[1]), [7])
+
+
+class TitleIndexTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        TitleIndex.clear()
+        self.festival = new_std_festival()
+        self.film_1 = create_film(1, 'Amélie à Paris', 122, festival=self.festival, sort_title='amelie a paris')
+        self.film_2 = create_film(2, 'Le Fabuleux Destin', 122, festival=self.festival, sort_title='fabuleux destin, le')
+        self.film_3 = create_film(3, 'PARISIENNES', 95, festival=self.festival)
+
+    def tearDown(self):
+        super().tearDown()
+        TitleIndex.clear()
+
+    def test_search_is_case_and_diacritic_insensitive(self):
+        """
+        A snippet matches titles regardless of case and diacritics.
+        """
+        # Arrange.
+        index = TitleIndex.for_festival(self.festival)
+
+        # Act.
+        with CaptureQueriesContext(connection) as context:
+            found_paris = index.search('PARIS')
+            found_amelie = index.search('AMÉL')
+            found_ie = index.search('ie')
+
+        # Assert.
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(found_paris, [self.film_3, self.film_1])
+        self.assertEqual(found_amelie, [self.film_1])
+        self.assertEqual(found_ie, [self.film_1, self.film_3])
+
+    def test_index_is_refreshed_when_film_changes(self):
+        """
+        The index of a festival is built once and built again when one of its films is saved.
+        """
+        # Arrange.
+        index = TitleIndex.for_festival(self.festival)
+        self.film_2.title = 'Le Fabuleux Destin de Montmartre'
+        self.film_2.sort_title = 'fabuleux destin de montmartre, le'
+
+        # Act.
+        self.film_2.save()
+        new_index = TitleIndex.for_festival(self.festival)
+
+        # Assert.
+        self.assertIs(TitleIndex.for_festival(self.festival), new_index)
+        self.assertIsNot(new_index, index)
+        self.assertEqual(index.search('montmartre'), [])
+        self.assertEqual([f.id for f in new_index.search('montmartre')], [self.film_2.id])
+
+    def test_index_follows_films_loaded_by_other_processes(self):
+        """
+        Films that are loaded in another process, which only marks the shared titles version, are found.
+        """
+        # Arrange.
+        index = TitleIndex.for_festival(self.festival)
+        film_kwargs = {'film_id': 4, 'seq_nr': 4, 'sort_title': 'montmartre', 'title': 'Montmartre',
+                       'duration': timedelta(minutes=90), 'medium_category': 'films', 'url': ''}
+
+        # Act.
+        Film.films.bulk_create([Film(festival=self.festival, **film_kwargs)])
+        TitleIndex.mark([self.festival.id])
+        new_index = TitleIndex.for_festival(self.festival)
+
+        # Assert.
+        self.assertEqual(index.search('montmartre'), [])
+        self.assertEqual([f.title for f in new_index.search('montmartre')], ['Montmartre'])
+
+    def test_index_is_kept_when_rating_changes(self):
+        """
+        Saving a rating, which changes the data stamps of the festival, keeps the index.
+        """
+        # Arrange.
+        fan = FilmFan.film_fans.create(name='Jimmie', is_admin=False, seq_nr=3)
+        index = TitleIndex.for_festival(self.festival)
+        stamp_version = DataStampStore.get_festival_version(self.festival)
+
+        # Act.
+        _ = create_rating(self.film_1, fan, rating=8)
+
+        # Assert.
+        self.assertGreater(DataStampStore.get_festival_version(self.festival), stamp_version)
+        self.assertIs(TitleIndex.for_festival(self.festival), index)
@@ -1,9 +1,6 @@
-import csv
-import re
 from datetime import timedelta
-from operator import attrgetter, itemgetter
+from operator import attrgetter
 
-import yaml
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Exists, OuterRef
 from django.http import HttpResponseRedirect
@@ -14,17 +11,21 @@ from django.views.generic import FormView, DetailView, ListView, TemplateView
 from authentication.models import FilmFan
 from festival_planner.cache import FilmRatingCache, FILM_SUBMIT_PREFIX
 from festival_planner.cookie import Filter, Cookie
+from festival_planner.data_stamp_store import ConditionalGetMixin
 from festival_planner.debug_tools import pr_debug, timed_method
+from festival_planner.film_info_store import FilmInfoStore
 from festival_planner.fragment_keeper import FilmFragmentKeeper
+from festival_planner.rating_matrix import RatingMatrix
 from festival_planner.screening_status_getter import ScreeningStatusGetter
 from festival_planner.shared_template_referrer_view import SharedTemplateReferrerView
+from festival_planner.title_index import TitleIndex
 from festival_planner.tools import add_base_context, unset_log, wrap_up_form_errors, application_name, get_log, \
-    initialize_log, add_log, CSV_DIALECT, get_submit_name, get_data_from_submit
+    initialize_log, add_log, get_submit_name, get_data_from_submit
 from festivals.config import Config
 from festivals.models import current_festival
 from films.forms.film_forms import PickRating, UserForm, TitlesForm, UPDATE_WARNING
 from films.models import FilmFanFilmRating, Film, current_fan, get_judging_fans, fan_rating_str, \
-    FilmFanFilmVote, fan_rating, UNRATED_STR, get_judgement_choices
+    fan_rating, UNRATED_STR, get_judgement_choices
 from screenings.models import Attendance
 from sections.models import Subsection, Section
 
@@ -40,26 +41,12 @@ class FilmsFinder:
     def search_title(self, session, text):
         initialize_log(session, action=f'Search "{text}"')
         festival = current_festival(session)
-        self.found_films = []
-        start_by_film = {}
-        for film in Film.films.filter(festival=festival):
-            start_pos = self.start_position_of_text(film, text)
-            if start_pos is not None:
-                self.found_films.append(film)
-                start_by_film[film] = start_pos
-                add_log(session, film.sort_title)
-        if self.found_films:
-            sorted_tuples = sorted([(f, s, f.sort_title) for f, s in start_by_film.items()], key=itemgetter(1, 2))
-            self.found_films = [f for f, s, t in sorted_tuples]
-        else:
+        self.found_films = TitleIndex.for_festival(festival).search(text)
+        for film in self.found_films:
+            add_log(session, film.sort_title)
+        if not self.found_films:
             add_log(session, f'No title found containing "{text}"')
 
-    @staticmethod
-    def start_position_of_text(film, text):
-        re_search_text = re.compile(f'{text.lower()}')
-        m = re_search_text.search(film.sort_title)
-        return m.start() if m else None
-
 
 class IndexView(TemplateView):
     """
@@ -154,7 +141,7 @@ class FilmsView(SharedTemplateReferrerView):
         self.form_view = FilmsFormView
 
 
-class FilmsListView(LoginRequiredMixin, ListView):
+class FilmsListView(ConditionalGetMixin, LoginRequiredMixin, ListView):
     template_name = FilmsView.template_name
     context_object_name = 'film_rows'
     http_method_names = ['get']
@@ -168,6 +155,7 @@ class FilmsListView(LoginRequiredMixin, ListView):
     logged_in_fan = None
     festival = None
     selected_films = None
+    rating_matrix = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -233,6 +221,9 @@ class FilmsListView(LoginRequiredMixin, ListView):
         # Set the fragment names.
         self.fragment_keeper.add_fragments(self.selected_films)
 
+        # Read all ratings of the festival at once.
+        self.rating_matrix = PickRating.load_rating_matrix(self.festival)
+
         # Fill the film rows.
         film_rows = [self._get_film_row(row_nr, film) for row_nr, film in enumerate(self.selected_films)]
 
@@ -323,19 +314,17 @@ class FilmsListView(LoginRequiredMixin, ListView):
     def _read_film_descriptions(self, session):
         if not get_log(session):
             initialize_log(session, action='Read descriptions')
-        film_info_file = self.festival.filminfo_csv_file()
         try:
-            with open(film_info_file, 'r', newline='') as csvfile:
-                object_reader = csv.reader(csvfile, dialect=CSV_DIALECT)
-                self.description_by_film_id = {int(row[0]): row[1] for row in object_reader}
-                add_log(session, f'{len(self.description_by_film_id)} descriptions found.')
+            self.description_by_film_id = FilmInfoStore.get_description_by_film_id(self.festival)
+            add_log(session, f'{len(self.description_by_film_id)} descriptions found.')
         except FileNotFoundError as e:
             self.description_by_film_id = {}
             add_log(session, f'{e}: No descriptions file found.')
 
     def _get_film_row(self, row_nr, film):
         prefix = FilmsView.submit_name_prefix
-        fan_ratings = get_fan_ratings(film, self.fan_list, self.logged_in_fan, prefix, FilmsView.post_attendance)
+        fan_ratings = get_fan_ratings(film, self.fan_list, self.logged_in_fan, prefix, FilmsView.post_attendance,
+                                      rating_matrix=self.rating_matrix)
         film_rating_row = {
             'film': film,
             'fragment_name': self.fragment_keeper.get_fragment_name(row_nr),
@@ -364,10 +353,10 @@ class FilmsListView(LoginRequiredMixin, ListView):
             'projected_plannable_count': projected_plannable_count,
         }
 
-    def _get_count_by_rating(self, film_rating_queryset_tuples):
+    def _get_count_by_rating(self, film_ratings_tuples):
         count_by_eligible_rating = {}
-        for film, rating_queryset in film_rating_queryset_tuples:
-            best_rating = max([r.rating for r in rating_queryset])
+        for film, ratings in film_ratings_tuples:
+            best_rating = max(ratings)
             if best_rating in self.eligible_ratings:
                 try:
                     count_by_eligible_rating[best_rating] += 1
@@ -381,8 +370,8 @@ class FilmsListView(LoginRequiredMixin, ListView):
         film_count = len(feature_films)
 
         # Filter out the data with eligible ratings.
-        manager = FilmFanFilmRating.film_ratings
-        dirty_film_rating_sets = [(f, manager.filter(film=f, rating__gt=0)) for f in feature_films]
+        rating_matrix = self.rating_matrix or PickRating.get_rating_matrix(self.festival)
+        dirty_film_rating_sets = [(f, [r for r in rating_matrix.get_ratings(f) if r > 0]) for f in feature_films]
         film_rating_sets = [(f, ratings) for f, ratings in dirty_film_rating_sets if ratings]
         rated_films_count = len(film_rating_sets)
         count_by_eligible_rating = self._get_count_by_rating(film_rating_sets)
@@ -477,6 +466,7 @@ class VotesListView(LoginRequiredMixin, ListView):
     attended_films = []
     logged_in_fan = None
     festival = None
+    vote_matrix = None
 
     def dispatch(self, request, *args, **kwargs):
         session = self.request.session
@@ -496,6 +486,9 @@ class VotesListView(LoginRequiredMixin, ListView):
         # Set the fragment names.
         self.fragment_keeper.add_fragments(selected_films)
 
+        # Read the votes of the attended films at once.
+        self.vote_matrix = RatingMatrix.for_films(selected_films, post_attendance=True)
+
         # Fill the vote rows.
         vote_rows = [self.get_vote_row(row_nr, film) for row_nr, film in enumerate(selected_films)]
 
@@ -529,7 +522,8 @@ class VotesListView(LoginRequiredMixin, ListView):
     def get_vote_row(self, row_nr, film):
         prefix = VotesView.submit_name_prefix
         post_attendance = VotesView.post_attendance
-        fan_votes = get_fan_ratings(film, self.fan_list, self.logged_in_fan, prefix, post_attendance)
+        fan_votes = get_fan_ratings(film, self.fan_list, self.logged_in_fan, prefix, post_attendance,
+                                    rating_matrix=self.vote_matrix)
         vote_row = {
             'film': film,
             'duration_str': film.duration_str(),
@@ -614,19 +608,7 @@ class FilmDetailView(LoginRequiredMixin, DetailView):
 
     @staticmethod
     def get_description(film):
-        film_info_file = film.festival.filminfo_csv_file()
-        try:
-            with open(film_info_file, 'r', newline='') as csvfile:
-                object_reader = csv.reader(csvfile, dialect=CSV_DIALECT)
-                descriptions = [row[1] for row in object_reader if film.film_id == int(row[0])]
-        except FileNotFoundError:
-            description = None
-        else:
-            try:
-                description = descriptions[0].strip() or None
-            except IndexError:
-                description = None
-        return description
+        return FilmInfoStore.get_description(film)
 
     @staticmethod
     def _get_film_info(film):
@@ -634,30 +616,19 @@ class FilmDetailView(LoginRequiredMixin, DetailView):
         combi_data = []
         screened_data = []
         film_metadata = {}
-        filminfo_yaml_file = film.festival.filminfo_yaml_file()
-        try:
-            """
-            TODO: Read this information for as much as reasonable festivals.
-            """
-            with open(filminfo_yaml_file, 'r') as stream:
-                yaml_object = yaml.safe_load(stream)
-        except FileNotFoundError:
-            pass
-        else:
+        """
+        TODO: Read this information for as much as reasonable festivals.
+        """
+        yaml_object = FilmInfoStore.get_film_info(film.festival)
+        if yaml_object is not None:
             try:
                 articles = yaml_object['articles'][film.film_id]
             except KeyError:
                 pass
             try:
-                combi_dict = yaml_object['combinations']
-                combination_films_by_film_id = {i: l for i, l in combi_dict.items()}
-                screened_dict = yaml_object['screened_films']
-                screened_films_by_film_id = {i: l for i, l in screened_dict.items()}
-                metadata_dict = yaml_object['metadata']
-                metadata_by_film_id = {i: metadata for i, metadata in metadata_dict.items()}
-                combi_data = combination_films_by_film_id[film.film_id]
-                screened_data = screened_films_by_film_id[film.film_id]
-                film_metadata = metadata_by_film_id[film.film_id]
+                combi_data = yaml_object['combinations'][film.film_id]
+                screened_data = yaml_object['screened_films'][film.film_id]
+                film_metadata = yaml_object['metadata'][film.film_id]
             except KeyError:
                 combi_data = []
                 screened_data = []
@@ -676,7 +647,7 @@ class FilmDetailView(LoginRequiredMixin, DetailView):
         return display_all_query
 
 
-class ReviewersView(ListView):
+class ReviewersView(ConditionalGetMixin, ListView):
     """
     Displays statistics of reviewers.
     Pre-attendance judgements ("ratings") are compared with post_attendance judgements ("votes").
@@ -685,11 +656,14 @@ class ReviewersView(ListView):
     context_object_name = 'reviewer_rows'
     http_method_names = ['get']
     title = 'Reviewers Statistics'
+    all_festivals = True
     fan_list = None
     judged_filter = Filter('not judged', filtered=True, action_true='Display all')
     festival_filter = Filter('other festivals', filtered=True,
                              action_true='All festivals', action_false='Current festival')
     reviewed_films = None
+    rating_matrix = None
+    vote_matrix = None
     total_film_count = None
     unexpected_errors = []
 
@@ -712,6 +686,9 @@ class ReviewersView(ListView):
         self.reviewed_films = Film.films.exclude(reviewer=None)
         if self.festival_filter.on(session):
             self.reviewed_films = self.reviewed_films.filter(festival=festival)
+        self.reviewed_films = list(self.reviewed_films)
+        self.rating_matrix = RatingMatrix.for_films(self.reviewed_films)
+        self.vote_matrix = RatingMatrix.for_films(self.reviewed_films, post_attendance=True)
         reviewers = set([film.reviewer for film in self.reviewed_films])
         reviewer_rows = self._get_reviewer_rows(reviewers)
         sort_key = 'reviewer' if self.judged_filter.off(session) else 'avg_discrepancy'
@@ -770,16 +747,16 @@ class ReviewersView(ListView):
 
             discrepancies = []
             for film in sorted(judge_set, key=attrgetter('sort_title')):
-                rating = fan_rating(fan, film)
-                vote = fan_rating(fan, film, manager=FilmFanFilmVote.film_votes)
-                discrepancy = rating.rating - vote.vote
+                rating = self.rating_matrix.get_rating(film, fan)
+                vote = self.vote_matrix.get_rating(film, fan)
+                discrepancy = rating - vote
                 discrepancies.append(discrepancy)
                 dropdown_row = {
                     'film': film.title,
                     'festival': str(film.festival),
                     'fan': fan,
-                    'rating': rating.rating,
-                    'vote': vote.vote,
+                    'rating': rating,
+                    'vote': vote,
                     'discrepancy': discrepancy,
                 }
                 dropdown_rows.append(dropdown_row)
@@ -808,16 +785,10 @@ class ReviewersView(ListView):
         return discrepancy_count, avg_discrepancy
 
     def _get_fan_judge_set(self, reviewer, fan):
-        filter_kwargs = {'film__in': self.reviewed_films, 'film__reviewer': reviewer, 'film_fan': fan}
-        ratings = (FilmFanFilmRating.film_ratings
-                   .filter(**filter_kwargs)
-                   .select_related('film'))
-        rating_set = set([rating.film for rating in ratings])
-        votes = (FilmFanFilmVote.film_votes
-                 .filter(**filter_kwargs)
-                 .select_related('film'))
-        vote_set = set([vote.film for vote in votes])
-        judge_set = rating_set & vote_set
+        reviewed_films = [film for film in self.reviewed_films if film.reviewer == reviewer]
+        judge_set = set([film for film in reviewed_films
+                         if self.rating_matrix.get_rating(film, fan) is not None
+                         and self.vote_matrix.get_rating(film, fan) is not None])
         return judge_set
 
 
@@ -1001,12 +972,15 @@ def film_fan(request):
     return render(request, 'films/film_fan.html', context)
 
 
-def get_fan_ratings(film, fan_list, logged_in_fan, submit_name_prefix, post_attendance=False):
+def get_fan_ratings(film, fan_list, logged_in_fan, submit_name_prefix, post_attendance=False, rating_matrix=None):
     film_rating_props = []
     choices = get_judgement_choices(post_attendance)
     for fan in fan_list:
         # Set a rating string to display.
-        rating_str = fan_rating_str(fan, film, post_attendance)
+        if rating_matrix is not None:
+            rating_str = rating_matrix.get_rating_str(film, fan)
+        else:
+            rating_str = fan_rating_str(fan, film, post_attendance)
 
         # Get choices for this fan.
         choice_props = [{
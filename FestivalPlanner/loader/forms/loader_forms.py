@@ -1,18 +1,25 @@
 import csv
 import datetime
+import itertools
 import os
 
-from django.db import IntegrityError, transaction
+from django.db import IntegrityError, transaction, models
 from django.forms import Form, BooleanField, SlugField
 
 from authentication.models import FilmFan
 from festival_planner.debug_tools import pr_debug
+from festival_planner.festival_data import mark_festival_data
+from festival_planner.film_info_store import FilmInfoStore
+from festival_planner.log_store import LogStore
+from festival_planner.rating_matrix import RatingMatrix
+from festival_planner.statistics_store import StatisticsStore
+from festival_planner.title_index import TitleIndex
 from festival_planner.tools import initialize_log, add_log, CSV_DIALECT
 from festivals.config import Config
 from festivals.models import Festival, FestivalBase
 from films.forms.film_forms import PickRating
 from films.models import Film, FilmFanFilmRating, minutes_str
-from films.views import FilmsView, FilmDetailView
+from films.views import FilmsView
 from screenings.models import Screening, Attendance, Ticket
 from sections.models import Section, Subsection
 from theaters.models import Theater, theaters_path, City, cities_path, Screen, screens_path, cities_cache_path, \
@@ -26,13 +33,28 @@ FESTIVALS_BACKUP_PATH = os.path.join(BACKUP_DATA_DIR, 'festivals.csv')
 FILMS_BACKUP_PATH = os.path.join(BACKUP_DATA_DIR, 'films.csv')
 FILM_FANS_BACKUP_PATH = os.path.join(BACKUP_DATA_DIR, 'film_fans.csv')
 RATINGS_BACKUP_PATH = os.path.join(BACKUP_DATA_DIR, 'ratings.csv')
-FILMS_FILE_HEADER = Config().config['Headers']['FilmsFileHeader']
+FILMS_FILE_HEADER = list(Config().config['Headers']['FilmsFileHeader'])
+BULK_BATCH_SIZE = 500
+DUMP_CHUNK_SIZE = BULK_BATCH_SIZE
+DUMP_BUFFER_SIZE = 64 * 1024
 
 
 def get_subsection_id(film):
     return film.subsection.subsection_id if film.subsection else ''
 
 
+def get_field_value(field, value):
+    """Return the given value as stored in the given model field."""
+    if isinstance(value, models.Model):
+        value = value.pk
+    return None if value is None else field.to_python(value)
+
+
+def get_object_values(obj, fields):
+    """Return the values of the given fields as stored in the given object."""
+    return tuple(getattr(obj, field.attname) for field in fields)
+
+
 class RatingLoaderForm(Form):
     import_mode = BooleanField(
         label='Use import mode, all ratings are replaced',
@@ -69,6 +91,7 @@ class SingleTableDumperForm(Form):
         add_log(session, f'Dumping the {festival} {data_name}.')
         if not dumper_class(session).dump_objects(dumpfile, queryset):
             add_log(session, f'Failed to dump the {festival} {data_name}.')
+        StatisticsStore.refresh([festival.id])
 
 
 class TheaterDataLoaderForm(Form):
@@ -157,6 +180,7 @@ class BaseLoader:
         self.file_required = file_required
         self.object_name = None
         self.objects_on_file = None
+        self.object_by_values_by_map_key = {}
 
     def read_objects(self, objects_file, values_list):
         """
@@ -233,11 +257,9 @@ class BaseLoader:
         :param kwargs: Keyword arguments to crate the foreign key object
 
         """
-        foreign_object = None
         object_str = foreign_class.__name__
-        try:
-            foreign_object = foreign_manager.get(**kwargs)
-        except foreign_class.DoesNotExist:
+        foreign_object = self.find_object(foreign_manager, **kwargs)
+        if foreign_object is None:
             missing_attributes = []
             for attribute, value in kwargs.items():
                 if self.foreign_objects:
@@ -257,6 +279,37 @@ class BaseLoader:
                 return None
         return foreign_object
 
+    def find_object(self, manager, **kwargs):
+        """
+        Member method to find an object by field values without querying
+        the database for each object.
+
+        All objects of the manager, as limited by get_prefetch_queryset(),
+        are read once and indexed by the values of the given fields.
+
+        :param manager: Manager of the object class
+        :param kwargs: Values by field name of the object to find
+        :return: The object found, None if no object matches
+        """
+        model = manager.model
+        fields = [model._meta.get_field(name) for name in kwargs.keys()]
+        map_key = (model, tuple(field.attname for field in fields))
+        try:
+            object_by_values = self.object_by_values_by_map_key[map_key]
+        except KeyError:
+            queryset = self.get_prefetch_queryset(manager)
+            object_by_values = {get_object_values(obj, fields): obj for obj in queryset}
+            self.object_by_values_by_map_key[map_key] = object_by_values
+        values = tuple(get_field_value(field, value) for field, value in zip(fields, kwargs.values()))
+        return object_by_values.get(values)
+
+    def get_prefetch_queryset(self, manager):
+        """
+        "Virtual" method to limit the objects that find_object() reads
+        from the given manager.
+        """
+        return manager.all()
+
     def get_value_by_field(self, obj):
         """
         "Virtual" method to return a value by field dictionary from the
@@ -287,11 +340,18 @@ class BaseLoader:
 class SimpleLoader(BaseLoader):
     key_fields = []
     default_fields = []
+    bulk_mode = False
     label_by_created = {
         True: 'created',
         False: 'updated',
         None: 'cause integrity error',
     }
+    festival_lookup_by_model = {
+        Film: 'festival',
+        Screening: 'film__festival',
+        Section: 'festival',
+        Subsection: 'section__festival',
+    }
 
     def __init__(self, session, object_name, object_manager, objects_file,
                  festival=None, festival_pk=None, file_required=True):
@@ -305,16 +365,18 @@ class SimpleLoader(BaseLoader):
         self.delete_disappeared_objects = True
 
     def load_objects(self):
+        # Write the log lines in one batch, also those logged within a rolled back transaction.
+        with LogStore.collecting():
+            return self._load_objects()
+
+    def _load_objects(self):
         existing_object_set = set()
         updated_object_set = set()
 
         # Select the existing objects.
         existing_objects = None
         if self.delete_disappeared_objects:
-            if self.festival:
-                existing_objects = self.object_manager.filter(**self.festival_filter)
-            else:
-                existing_objects = self.object_manager.all()
+            existing_objects = self.get_existing_objects()
             existing_object_set = set(list(existing_objects))
 
         # Read the objects from the member file into the designated list.
@@ -340,6 +402,11 @@ class SimpleLoader(BaseLoader):
         # Allow subclasses to round up.
         self.finalize()
 
+        # Loaders without a festival load the theater data, which all festivals show.
+        mark_festival_data(None if self.festival is None else [self.festival.id])
+        if self.festival:
+            StatisticsStore.refresh([self.festival.id])
+
         return True
 
     def load_new_objects(self, target_object_list, foreign_objects=None):
@@ -360,11 +427,28 @@ class SimpleLoader(BaseLoader):
 
         return True
 
+    def get_existing_objects(self):
+        if self.festival:
+            existing_objects = self.object_manager.filter(**self.festival_filter)
+        else:
+            existing_objects = self.object_manager.all()
+        return existing_objects
+
+    def get_prefetch_queryset(self, manager):
+        queryset = manager.all()
+        festival_lookup = self.festival_lookup_by_model.get(manager.model)
+        if self.festival and festival_lookup:
+            queryset = queryset.filter(**{festival_lookup: self.festival})
+        return queryset
+
     def atomic_update_or_create(self, updated_object_set):
         transaction_committed = False
         try:
             with transaction.atomic():
-                self.update_or_create(updated_object_set)
+                if self.bulk_mode:
+                    self.bulk_update_or_create(updated_object_set)
+                else:
+                    self.update_or_create(updated_object_set)
                 transaction_committed = True
         except IntegrityError as e:
             self.add_log(f'{e}: database rolled back.')
@@ -389,6 +473,62 @@ class SimpleLoader(BaseLoader):
                 objects_by_created[created] = 1
 
         # Log the results.
+        self.log_results(objects_by_created)
+
+    def bulk_update_or_create(self, updated_object_set):
+        """
+        Update objects or create ones when absent, like update_or_create(),
+        but compare the records with the existing objects in memory and
+        write the differences in batches.
+        """
+        model = self.object_manager.model
+        key_fields = [model._meta.get_field(name) for name in self.key_fields]
+        object_by_key = {get_object_values(obj, key_fields): obj for obj in self.get_existing_objects()}
+        new_objects = []
+        changed_object_by_pk = {}
+        changed_field_names = set()
+        objects_by_created = {}
+
+        # Find out which objects should be updated or created.
+        for value_by_field in self.value_by_field_list:
+            keys, defaults = self.pop_key_fields(value_by_field)
+            key = tuple(get_field_value(field, keys[field.name]) for field in key_fields)
+            try:
+                affected_object = object_by_key[key]
+            except KeyError:
+                affected_object = model(**value_by_field)
+                object_by_key[key] = affected_object
+                new_objects.append(affected_object)
+                created = True
+            else:
+                created = False
+                for name, value in defaults.items():
+                    field = model._meta.get_field(name)
+                    if getattr(affected_object, field.attname) != get_field_value(field, value):
+                        setattr(affected_object, name, value)
+                        changed_field_names.add(name)
+                        if affected_object.pk is not None:
+                            changed_object_by_pk[affected_object.pk] = affected_object
+                if affected_object.pk is not None:
+                    updated_object_set.add(affected_object)
+
+            # Update statistics.
+            try:
+                objects_by_created[created] += 1
+            except KeyError:
+                objects_by_created[created] = 1
+
+        # Write the differences.
+        self.object_manager.bulk_create(new_objects, batch_size=BULK_BATCH_SIZE)
+        if changed_object_by_pk:
+            changed_objects = list(changed_object_by_pk.values())
+            fields = sorted(changed_field_names)
+            self.object_manager.bulk_update(changed_objects, fields, batch_size=BULK_BATCH_SIZE)
+
+        # Log the results.
+        self.log_results(objects_by_created)
+
+    def log_results(self, objects_by_created):
         for created, count in objects_by_created.items():
             self.add_log(f'{count} {self.object_name} records {self.label_by_created[created]}.')
         if not objects_by_created:
@@ -428,6 +568,7 @@ class SimpleLoader(BaseLoader):
 class FilmLoader(SimpleLoader):
     expected_header = FILMS_FILE_HEADER
     key_fields = ['festival', 'film_id']
+    bulk_mode = True
     manager = Film.films
 
     def __init__(self, session, festival):
@@ -448,12 +589,8 @@ class FilmLoader(SimpleLoader):
         url = row[9]
 
         # Get the main title if the film already exists.
-        try:
-            existing_film = Film.films.get(festival=self.festival, film_id=film_id)
-        except Film.DoesNotExist:
-            main_title = None
-        else:
-            main_title = existing_film.main_title
+        existing_film = self.find_object(Film.films, festival=self.festival, film_id=film_id)
+        main_title = existing_film.main_title if existing_film else None
 
         # Get the subsection.
         subsection = None
@@ -462,9 +599,7 @@ class FilmLoader(SimpleLoader):
             Relies on uniqueness of subsection_id together with section.festival,
             which is guaranteed ion the Loader.
             """
-            subsection = Subsection.subsections.filter(section__festival_id=self.festival.id,
-                                                       subsection_id=subsection_id
-                                                       ).first()
+            subsection = self.find_object(Subsection.subsections, subsection_id=subsection_id)
 
         value_by_field = {
             'festival': self.festival,
@@ -482,10 +617,15 @@ class FilmLoader(SimpleLoader):
         }
         yield value_by_field
 
+    def finalize(self):
+        # Bulk updates bypass the signals that keep the title index current.
+        TitleIndex.mark([self.festival.id])
+
 
 class RatingLoader(SimpleLoader):
     expected_header = ['filmid', 'filmfan', 'rating', 'original_rating']
     key_fields = ['film', 'film_fan']
+    bulk_mode = True
     manager = FilmFanFilmRating.film_ratings
 
     def __init__(self, session, festival):
@@ -517,6 +657,10 @@ class RatingLoader(SimpleLoader):
         }
         yield value_by_field
 
+    def finalize(self):
+        # Bulk updates bypass the signals that keep the rating matrices current.
+        RatingMatrix.mark([self.festival.id])
+
 
 class SectionLoader(SimpleLoader):
     key_fields = ['section_id', 'festival']
@@ -573,6 +717,7 @@ class SubsectionLoader(SimpleLoader):
 
 class CityLoader(SimpleLoader):
     key_fields = ['city_id']
+    bulk_mode = True
     manager = City.cities
     file = cities_path()
 
@@ -599,6 +744,7 @@ class CityLoader(SimpleLoader):
 
 class TheaterLoader(SimpleLoader):
     key_fields = ['theater_id']
+    bulk_mode = True
     manager = Theater.theaters
     file = theaters_path()
 
@@ -633,6 +779,7 @@ class TheaterLoader(SimpleLoader):
 
 class ScreenLoader(SimpleLoader):
     key_fields = ['screen_id']
+    bulk_mode = True
     manager = Screen.screens
     file = screens_path()
 
@@ -670,6 +817,7 @@ class ScreeningLoader(SimpleLoader):
                        'subtitles', 'qanda', 'extra', 'sold_out']
     alternative_header = expected_header[:-1]
     key_fields = ['film', 'screen', 'start_dt']
+    bulk_mode = True
     manager = Screening.screenings
 
     def __init__(self, session, festival, festival_pk=None):
@@ -698,16 +846,14 @@ class ScreeningLoader(SimpleLoader):
         extra_film = None
         if extra:
             extra_film_ids = [int(id_str) for id_str in extra.split('|')]
-            kwargs = {'festival': self.festival, 'film_id__in': extra_film_ids}
-            extra_film = Film.films.filter(**kwargs).first()
+            extra_films = [self.find_object(Film.films, festival=self.festival, film_id=i) for i in extra_film_ids]
+            extra_films = [f for f in extra_films if f]
+            extra_film = min(extra_films, key=lambda f: f.pk) if extra_films else None
         # TODO: change database as to support extra screenings instead of a combination program (#457).
 
-        try:
-            existing_screening = Screening.screenings.get(film=film, screen=screen, start_dt=start_dt)
-        except Screening.DoesNotExist:
-            auto_planned = False
-        else:
-            auto_planned = existing_screening.auto_planned
+        kwargs = {'film': film, 'screen': screen, 'start_dt': start_dt}
+        existing_screening = self.find_object(Screening.screenings, **kwargs)
+        auto_planned = existing_screening.auto_planned if existing_screening else False
 
         value_by_field = {
             'film': film,
@@ -748,6 +894,7 @@ class AttendanceLoader(SimpleLoader):
         'autoplanned', 'blocked', 'Maarten,Adrienne,Manfred,Piggel,Rijk,Geeth', 'ticketsbought', 'soldout'
     ]
     key_fields = ['fan', 'screening']
+    bulk_mode = True
     object_name = 'attendance'
     manager = Attendance.attendances
     fan_names = expected_header[ATTENDANCE_FIELD_INDEX].split(',')
@@ -778,11 +925,8 @@ class AttendanceLoader(SimpleLoader):
         screening = self.get_foreign_key(Screening, Screening.screenings, **screening_kwargs)
         attendance_props_by_fan_name = {}
         for i, fan_name in enumerate(self.fan_names):
-            try:
-                fan = FilmFan.film_fans.get(name=fan_name)
-            except FilmFan.DoesNotExist:
-                pass
-            else:
+            fan = self.find_object(FilmFan.film_fans, name=fan_name)
+            if fan:
                 fan_attendance = fan_attendances[i] == self.TRUE
                 if fan_attendance:
                     attendance_props_by_fan_name[fan_name] = {
@@ -871,7 +1015,14 @@ class ScreenUpdater(SimpleLoader):
 class BaseDumper:
     """
     Base class for dumping objects to CSV files.
+
+    Querysets are iterated in chunks, so that dumping many objects uses
+    bounded memory. Related objects listed in related_fields are joined
+    in the same query, other data needed by object_row() can be read
+    once per chunk in prepare_chunk().
     """
+    related_fields = []
+    chunk_size = DUMP_CHUNK_SIZE
 
     def __init__(self, session, object_name, manager, header=None):
         self.session = session
@@ -880,25 +1031,48 @@ class BaseDumper:
         self.header = header
 
     def dump_objects(self, file, objects=None):
-        objects = objects or self.manager.all()
+        objects = self.manager.all() if objects is None else objects
         self.add_log(f'Dumping {self.object_name} data.')
+        object_count = 0
         try:
-            with open(file, 'w', newline='') as csvfile:
+            with open(file, 'w', newline='', buffering=DUMP_BUFFER_SIZE) as csvfile:
                 csv_writer = csv.writer(csvfile, dialect=CSV_DIALECT)
                 if self.header:
                     csv_writer.writerow(self.header)
-                for obj in objects:
-                    row_generator = self.object_row(obj)
-                    for row in row_generator:
-                        csv_writer.writerow(row)
+                for chunk in self.iter_chunks(objects):
+                    self.prepare_chunk(chunk)
+                    for obj in chunk:
+                        csv_writer.writerows(self.object_row(obj))
+                    object_count += len(chunk)
         except PermissionError as e:
             self.add_log(f'{e}: File {file} could not be written.')
             return False
         else:
-            self.add_log(f'{len(objects)} existing {self.object_name} objects saved in {file}.')
+            self.add_log(f'{object_count} existing {self.object_name} objects saved in {file}.')
 
         return True
 
+    def iter_chunks(self, objects):
+        """
+        Yield the given objects in lists of at most chunk_size objects,
+        querysets are read chunk by chunk.
+        """
+        if isinstance(objects, models.QuerySet):
+            if self.related_fields:
+                objects = objects.select_related(*self.related_fields)
+            objects = objects.iterator(chunk_size=self.chunk_size)
+        object_iterator = iter(objects)
+        while chunk := list(itertools.islice(object_iterator, self.chunk_size)):
+            yield chunk
+
+    def prepare_chunk(self, chunk):
+        """
+        "Virtual" method to read data needed to dump the given objects.
+
+        :chunk: List of objects that are dumped next.
+        """
+        pass
+
     def object_row(self, obj):
         """
         "Virtual" method to dump one object to file
@@ -924,6 +1098,7 @@ class CityDumper(BaseDumper):
 
 class TheaterDumper(BaseDumper):
     manager = Theater.theaters
+    related_fields = ['city']
 
     def __init__(self, session):
         super().__init__(session, 'theater', self.manager)
@@ -940,6 +1115,7 @@ class TheaterDumper(BaseDumper):
 
 class ScreenDumper(BaseDumper):
     manager = Screen.screens
+    related_fields = ['theater']
 
     def __init__(self, session):
         super().__init__(session, 'screen', self.manager)
@@ -967,6 +1143,27 @@ class CalendarDumper(BaseDumper):
 
     def __init__(self, session):
         super().__init__(session, 'calendar', self.manager, header=self.header)
+        self.ordered_ratings_by_film_id = {}
+        self.description_by_film_id_by_festival_id = {}
+
+    def prepare_chunk(self, chunk):
+        if not self.FOR_AGENDA:
+            return
+        films = {obj['screening'].film for obj in chunk}
+        ratings = (FilmFanFilmRating.film_ratings
+                   .filter(film__in=films)
+                   .select_related('film_fan')
+                   .order_by('rating', 'id'))
+        self.ordered_ratings_by_film_id = {film.id: [] for film in films}
+        for rating in ratings:
+            self.ordered_ratings_by_film_id[rating.film_id].append(rating)
+        for film in films:
+            if film.festival_id not in self.description_by_film_id_by_festival_id:
+                try:
+                    description_by_film_id = FilmInfoStore.get_description_by_film_id(film.festival)
+                except FileNotFoundError:
+                    description_by_film_id = {}
+                self.description_by_film_id_by_festival_id[film.festival_id] = description_by_film_id
 
     def object_row(self, obj):
         dt_fmt = '%d-%m-%Y %H:%M'
@@ -986,19 +1183,20 @@ class CalendarDumper(BaseDumper):
             obj['filmscreening_count'],
         ])
 
-    @staticmethod
-    def _get_notes(obj):
+    def _get_notes(self, obj):
         separator = '|'
-        status = Screening.ScreeningStatus.ATTENDS
         screening = obj['screening']
-        fans_rating_str, film_rating_str, color = screening.film_rating_data(status)
+        film = screening.film
+        ordered_ratings = self.ordered_ratings_by_film_id[film.id]
+        fans_rating_str, film_rating_str, _ = film.rating_strings(ordered_ratings=ordered_ratings)
+        description = self.description_by_film_id_by_festival_id[film.festival_id].get(film.film_id)
         notes = [
-            f"Film duration: {minutes_str(screening.film.duration)}",
+            f"Film duration: {minutes_str(film.duration)}",
             f"Screening duration: {minutes_str(screening.end_dt - screening.start_dt)}",
             f"Attendants: {obj['attendants']}",
             f"Ratings: {fans_rating_str} ({film_rating_str})",
             '',
-            FilmDetailView.get_description(screening.film) or '',
+            (description or '').strip(),
         ]
         return separator.join(notes)
 
@@ -1012,6 +1210,7 @@ class CityBackupDumper(CityDumper):
 
 class FestivalBaseBackupDumper(BaseDumper):
     manager = FestivalBase.festival_bases
+    related_fields = ['home_city']
     header = ['mnemonic', 'name', 'image', 'city_id']
 
     def __init__(self, session):
@@ -1028,6 +1227,7 @@ class FestivalBaseBackupDumper(BaseDumper):
 
 class FestivalBackupDumper(BaseDumper):
     manager = Festival.festivals
+    related_fields = ['base']
     header = ['mnemonic', 'year', 'edition', 'start_date', 'end_date', 'color']
 
     def __init__(self, session):
@@ -1046,6 +1246,7 @@ class FestivalBackupDumper(BaseDumper):
 
 class FilmBackupDumper(BaseDumper):
     manager = Film.films
+    related_fields = ['festival__base', 'subsection']
     header = [
         'festival_mnemonic',
         'festival_year',
@@ -1096,6 +1297,7 @@ class FanBackupDumper(BaseDumper):
 
 class RatingBackupDumper(BaseDumper):
     manager = FilmFanFilmRating.film_ratings
+    related_fields = ['film__festival__base', 'film_fan']
     header = [
         'id', 'festival_mnemonic', 'festival_year', 'festival_edition', 'film_id', 'fan', 'rating', 'original_rating'
     ]
@@ -1118,6 +1320,7 @@ class RatingBackupDumper(BaseDumper):
 
 class RatingDumper(BaseDumper):
     manager = FilmFanFilmRating.film_ratings
+    related_fields = ['film', 'film_fan']
     header = RatingLoader.expected_header
 
     def __init__(self, session):
@@ -1135,13 +1338,20 @@ class AttendanceDumper(BaseDumper):
     FALSE = 'ONWAAR'
     field_by_bool = {True: TRUE, False: FALSE}
     fan_names = AttendanceLoader.fan_names
+    related_fields = ['screening__film', 'screening__screen', 'fan']
 
     def __init__(self, session):
         super().__init__(session, 'attendance', self.manager, self.header)
+        self.ticket_keys = set()
+
+    def prepare_chunk(self, chunk):
+        screening_ids = {attendance.screening_id for attendance in chunk}
+        tickets = Ticket.tickets.filter(screening_id__in=screening_ids)
+        self.ticket_keys = set(tickets.values_list('screening_id', 'fan_id'))
 
     def object_row(self, attendance):
         attending_fans = [self.field_by_bool[attendance.fan.name == fan_name] for fan_name in self.fan_names]
-        ticket_bought = Ticket.tickets.filter(screening=attendance.screening, fan=attendance.fan)
+        ticket_bought = (attendance.screening_id, attendance.fan_id) in self.ticket_keys
         field_by_index = {
             0: attendance.screening.film.film_id,
             1: attendance.screening.screen.screen_id,
@@ -1160,6 +1370,7 @@ class AttendanceDumper(BaseDumper):
 
 class TicketDumper(BaseDumper):
     manager = Ticket.tickets
+    related_fields = ['screening__film', 'screening__screen', 'fan']
     header = ['film_id', 'screen_id', 'start_dt', 'fan']
 
     def __init__(self, session):
@@ -0,0 +1,62 @@
+# Generated by Django 6.1.2 on 2026-10-17 07:56
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=128)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'action_log',
+            },
+            managers=[
+                ('action_logs', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActionLogLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField()),
+                ('log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='loader.actionlog')),
+            ],
+            options={
+                'db_table': 'action_log_line',
+            },
+            managers=[
+                ('log_lines', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FanActionRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action_key', models.CharField(max_length=64)),
+                ('value', models.JSONField()),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'fan_action_record',
+            },
+            managers=[
+                ('fan_actions', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -1,3 +1,60 @@
+from django.contrib.auth.models import User
 from django.db import models
 
-# Create your models here.
+
+class ActionLog(models.Model):
+    """
+    Action log table, holds the results of actions like loading data,
+    so that a session only needs to hold the key of its current log.
+    """
+    # Define the fields.
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    action = models.CharField(max_length=128)
+    created = models.DateTimeField(auto_now_add=True)
+
+    # Define a manager.
+    action_logs = models.Manager()
+
+    class Meta:
+        db_table = 'action_log'
+
+    def __str__(self):
+        return f'{self.action} results of {self.user}'
+
+
+class ActionLogLine(models.Model):
+    """
+    Action log line table, holds the result lines of action logs.
+    """
+    # Define the fields.
+    log = models.ForeignKey(ActionLog, on_delete=models.CASCADE)
+    text = models.TextField()
+
+    # Define a manager.
+    log_lines = models.Manager()
+
+    class Meta:
+        db_table = 'action_log_line'
+
+    def __str__(self):
+        return self.text
+
+
+class FanActionRecord(models.Model):
+    """
+    Fan action table, holds the last actions of the fans, like rating
+    a film, so that a session only needs to hold the keys of them.
+    """
+    # Define the fields.
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    action_key = models.CharField(max_length=64)
+    value = models.JSONField()
+
+    # Define a manager.
+    fan_actions = models.Manager()
+
+    class Meta:
+        db_table = 'fan_action_record'
+
+    def __str__(self):
+        return f'{self.action_key} of {self.user}'
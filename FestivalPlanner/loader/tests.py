@@ -5,22 +5,29 @@ import re
 import tempfile
 from http import HTTPStatus
 
-from django.test import RequestFactory
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 import festivals.models
 import theaters
 from festival_planner import debug_tools
-from festival_planner.tools import initialize_log, unset_log, CSV_DIALECT
+from festival_planner.file_metadata import FileMetadataStore
+from festival_planner.log_store import LogStore, LOG_SESSION_KEY, LOG_RING_SIZE, LOG_PAGE_SIZE
+from festival_planner.statistics_store import StatisticsStore, STATISTICS_VERSION
+from festival_planner.tools import initialize_log, unset_log, CSV_DIALECT, get_log
+from festivals.models import FestivalStatistics
 from festivals.tests import create_festival, mock_base_festival_mnemonic
 from films.models import FilmFanFilmRating, Film, FAN_NAMES_BY_FESTIVAL_BASE, UNRATED_RATING
 from films.tests import create_film, ViewsTestCase, get_request_with_session, new_film
 from films.views import FilmsView
 from loader.forms.loader_forms import FilmLoader, RatingLoader, CityDumper, TheaterDumper, ScreenDumper, \
-    get_subsection_id, ScreeningLoader
-from loader.views import SectionsLoaderView, get_festival_row, RatingsLoaderView, NewTheaterDataView, \
+    get_subsection_id, ScreeningLoader, AttendanceDumper, RatingDumper
+from loader.models import ActionLog, ActionLogLine
+from loader.views import file_record_count, SectionsLoaderView, get_festival_row, RatingsLoaderView, NewTheaterDataView, \
     RatingDumperView
-from screenings.models import Screening
+from screenings.models import Screening, Attendance, Ticket
 from sections.models import Section, Subsection
 from theaters.models import City, new_cities_path, new_theaters_path, new_screens_path, Theater, Screen
 
@@ -344,6 +351,64 @@ class RatingLoaderViewsTests(LoaderViewsTests):
         self.assertContains(redirect_response, '1:28')    # New duration.
         self.assertEqual(Film.films.count(), 2)
 
+    def write_films_file(self, films):
+        with open(self.festival.films_file(), 'w', newline='') as csv_films_file:
+            film_writer = csv.writer(csv_films_file, dialect=CSV_DIALECT)
+            film_writer.writerow(FilmLoader.expected_header)
+            for film in films:
+                film_writer.writerow(serialize_film(film))
+
+    def count_film_load_queries(self, session, film_count):
+        films = [new_film(film_id, f'Film {film_id}', 90, seq_nr=film_id, festival=self.festival)
+                 for film_id in range(1, film_count + 1)]
+        self.write_films_file(films)
+        with CaptureQueriesContext(connection) as context:
+            _ = FilmLoader(session, self.festival).load_objects()
+        return len(context.captured_queries)
+
+    def test_bulk_film_load_reports_created_updated_and_deleted(self):
+        """
+        Loading films in bulk mode reports created, updated and deleted films like single row updates do.
+        """
+        # Arrange.
+        request = self.get_admin_request()
+        session = request.session
+        initialize_log(session)
+        kept_film = create_film(1, 'Der schlaue Fuchs', 92, festival=self.festival, seq_nr=1)
+        _ = create_film(2, 'Die dumme Gans', 188, festival=self.festival, seq_nr=2)
+        kept_film.duration = datetime.timedelta(minutes=88)
+        new_film_3 = new_film(3, 'Der kluge Hund', 101, seq_nr=3, festival=self.festival)
+        self.write_films_file([kept_film, new_film_3])
+
+        # Act.
+        loaded = FilmLoader(session, self.festival).load_objects()
+
+        # Assert.
+        results = get_log(session)['results']
+        self.assertIs(loaded, True)
+        self.assertIn('1 film records created.', results)
+        self.assertIn('1 film records updated.', results)
+        self.assertIn('1 existing Films deleted.', results)
+        self.assertEqual(Film.films.get(film_id=1).duration, datetime.timedelta(minutes=88))
+        self.assertEqual(sorted(Film.films.values_list('film_id', flat=True)), [1, 3])
+
+    def test_bulk_film_load_query_count_independent_of_row_count(self):
+        """
+        Loading films in bulk mode takes a number of queries that doesn't grow with the number of films.
+        """
+        # Arrange.
+        request = self.get_admin_request()
+        session = request.session
+        initialize_log(session)
+        few_film_queries = self.count_film_load_queries(session, 3)
+
+        # Act.
+        many_film_queries = self.count_film_load_queries(session, 60)
+
+        # Assert.
+        self.assertEqual(Film.films.count(), 60)
+        self.assertEqual(many_film_queries, few_film_queries)
+
     def test_regular_user_cannot_load_rating_data(self):
         """
         A non-admin fan can't load data.
@@ -862,3 +927,342 @@ class ScreeningLoaderViewTests(CommonDataLoaderViewTests):
         self.assertEqual(redirect_response.status_code, HTTPStatus.OK)
         self.assertEqual(db_screening.screen.screen_id, screen.screen_id)
         self.assertNotEqual(db_screening.screen.id, screen.screen_id)
+
+
+class DumperTests(LoaderViewsTests):
+    def setUp(self):
+        super().setUp()
+        self.session = self.get_admin_request().session
+        initialize_log(self.session)
+        theater = Theater.theaters.create(theater_id=1, city=self.city, parse_name='Kino', abbreviation='k',
+                                          priority=Theater.Priority.HIGH)
+        self.screen = Screen.screens.create(screen_id=1, theater=theater, parse_name='Kino 1', abbreviation='1',
+                                            address_type=Screen.ScreenAddressType.PHYSICAL)
+
+    def tearDown(self):
+        super().tearDown()
+        unset_log(self.session)
+
+    def arrange_attendances(self, first_film_id, count):
+        start_dt = datetime.datetime.fromisoformat('2023-02-17 10:00')
+        for film_id in range(first_film_id, first_film_id + count):
+            film = create_film(film_id, f'Dump Number {film_id}', 90, festival=self.festival)
+            screening_start_dt = start_dt + datetime.timedelta(hours=2 * film_id)
+            screening = Screening.screenings.create(film=film, screen=self.screen, start_dt=screening_start_dt,
+                                                    end_dt=screening_start_dt + film.duration, q_and_a=False)
+            Attendance.attendances.create(screening=screening, fan=self.admin_fan)
+            if film_id % 2:
+                Ticket.tickets.create(screening=screening, fan=self.admin_fan)
+
+    def arrange_dump_attendances(self):
+        queryset = Attendance.attendances.filter(screening__film__festival=self.festival)
+        with CaptureQueriesContext(connection) as context:
+            dumped = AttendanceDumper(self.session).dump_objects(self.festival.attendances_file(), queryset)
+        with open(self.festival.attendances_file(), 'r', newline='') as csvfile:
+            rows = list(csv.reader(csvfile, dialect=CSV_DIALECT))
+        return dumped, rows, len(context.captured_queries)
+
+    def test_attendance_dump_query_count_independent_of_row_count(self):
+        """
+        Dumping attendances reads the tickets per chunk instead of per attendance.
+        """
+        # Arrange.
+        self.arrange_attendances(1, 2)
+        _, _, few_rows_query_count = self.arrange_dump_attendances()
+        self.arrange_attendances(3, 6)
+
+        # Act.
+        dumped, rows, many_rows_query_count = self.arrange_dump_attendances()
+
+        # Assert.
+        self.assertIs(dumped, True)
+        self.assertEqual(many_rows_query_count, few_rows_query_count)
+        self.assertEqual(len(rows), 9)
+        tickets_bought_by_film_id = {int(row[0]): row[9] for row in rows[1:]}
+        for film_id, tickets_bought in tickets_bought_by_film_id.items():
+            expected = AttendanceDumper.TRUE if film_id % 2 else AttendanceDumper.FALSE
+            self.assertEqual(tickets_bought, expected)
+        self.assertIn('8 existing attendance objects saved', ' '.join(get_log(self.session)['results']))
+
+    def test_dump_is_written_in_chunks(self):
+        """
+        Objects are dumped chunk by chunk and all of them are counted.
+        """
+        # Arrange.
+        fan = self.admin_fan
+        for film_id in range(1, 8):
+            film = create_film(film_id, f'Chunked {film_id}', 90, festival=self.festival)
+            create_rating(film, fan, FilmFanFilmRating.Rating.GOOD)
+        dumper = RatingDumper(self.session)
+        dumper.chunk_size = 3
+        queryset = FilmFanFilmRating.film_ratings.filter(film__festival=self.festival)
+
+        # Act.
+        chunks = list(dumper.iter_chunks(queryset))
+        dumped = dumper.dump_objects(self.festival.ratings_file(), queryset)
+
+        # Assert.
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertIs(dumped, True)
+        with open(self.festival.ratings_file(), 'r', newline='') as csvfile:
+            rows = list(csv.reader(csvfile, dialect=CSV_DIALECT))
+        self.assertEqual(len(rows), 8)
+        self.assertIn('7 existing rating objects saved', ' '.join(get_log(self.session)['results']))
+
+    def test_empty_queryset_dumps_header_only(self):
+        """
+        An empty queryset results in a file with just the header.
+        """
+        # Arrange.
+        film = create_film(1, 'Rated Elsewhere', 90)
+        create_rating(film, self.admin_fan, FilmFanFilmRating.Rating.GOOD)
+        queryset = FilmFanFilmRating.film_ratings.filter(film__festival=self.festival)
+
+        # Act.
+        dumped = RatingDumper(self.session).dump_objects(self.festival.ratings_file(), queryset)
+
+        # Assert.
+        self.assertIs(dumped, True)
+        with open(self.festival.ratings_file(), 'r', newline='') as csvfile:
+            rows = list(csv.reader(csvfile, dialect=CSV_DIALECT))
+        self.assertEqual(rows, [RatingDumper.header])
+
+
+class LogStoreTests(LoaderViewsTests):
+
+    def arrange_log(self, session, action, line_count):
+        LogStore.start_log(session, action)
+        for line_nr in range(line_count):
+            LogStore.add_line(session, f'Line {line_nr}')
+        session.save()
+
+    def test_session_only_holds_log_key(self):
+        """
+        Logged lines are stored in the log store, the session only holds
+        the key of the log.
+        """
+        # Arrange.
+        self.login(self.admin_credentials)
+        session = self.client.session
+
+        # Act.
+        self.arrange_log(session, 'Test logging', LOG_PAGE_SIZE + 5)
+
+        # Assert.
+        log = get_log(session)
+        self.assertEqual(session[LOG_SESSION_KEY], log['key'])
+        self.assertEqual(log['line_count'], LOG_PAGE_SIZE + 5)
+        self.assertEqual(len(log['results']), LOG_PAGE_SIZE)
+        self.assertEqual(ActionLog.action_logs.get(id=log['key']).user, self.admin_user)
+
+    def test_logs_per_user_are_bounded(self):
+        """
+        Starting a log deletes the oldest logs of the user when the ring
+        is full, together with their lines.
+        """
+        # Arrange.
+        self.login(self.admin_credentials)
+        session = self.client.session
+
+        # Act.
+        for log_nr in range(LOG_RING_SIZE + 3):
+            self.arrange_log(session, f'Action {log_nr}', 2)
+
+        # Assert.
+        logs = ActionLog.action_logs.filter(user=self.admin_user)
+        self.assertEqual(logs.count(), LOG_RING_SIZE)
+        self.assertEqual(logs.order_by('id').first().action, 'Action 3')
+        self.assertEqual(ActionLogLine.log_lines.filter(log__user=self.admin_user).count(), 2 * LOG_RING_SIZE)
+
+    def test_log_page_is_paginated(self):
+        """
+        The log page displays all lines of a log, page by page.
+        """
+        # Arrange.
+        self.login(self.admin_credentials)
+        session = self.client.session
+        self.arrange_log(session, 'Paged logging', LOG_PAGE_SIZE + 1)
+        url = reverse('loader:log', args=[LogStore.get_log_id(session)])
+
+        # Act.
+        first_response = self.client.get(url)
+        last_response = self.client.get(url, {'page': 2})
+
+        # Assert.
+        self.assertEqual(first_response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(first_response.context['log_lines']), LOG_PAGE_SIZE)
+        self.assertContains(first_response, 'Page 1 of 2')
+        self.assertEqual([line.text for line in last_response.context['log_lines']], [f'Line {LOG_PAGE_SIZE}'])
+
+    def test_log_of_other_user_is_not_found(self):
+        """
+        A user can't view the log of another user.
+        """
+        # Arrange.
+        self.login(self.admin_credentials)
+        session = self.client.session
+        self.arrange_log(session, 'Private logging', 1)
+        url = reverse('loader:log', args=[LogStore.get_log_id(session)])
+        self.client.logout()
+        self.login(self.regular_credentials)
+
+        # Act.
+        response = self.client.get(url)
+
+        # Assert.
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class FileMetadataTests(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        FileMetadataStore.clear()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'screenings.csv')
+
+    def tearDown(self):
+        super().tearDown()
+        FileMetadataStore.clear()
+        self.temp_dir.cleanup()
+
+    def arrange_write_file(self, text, mtime_ns=None):
+        with open(self.path, 'w', newline='') as stream:
+            stream.write(text)
+        if mtime_ns is not None:
+            os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def test_metadata_of_file(self):
+        """
+        The metadata of a file hold the record count and the header.
+        A last line without a line end is counted too.
+        """
+        # Arrange.
+        self.arrange_write_file('filmid;title\n1;Fuchs\n2;Gans')
+
+        # Act.
+        metadata = FileMetadataStore.get_metadata(self.path)
+
+        # Assert.
+        self.assertEqual(metadata.line_count, 3)
+        self.assertEqual(metadata.record_count(has_header=True), 2)
+        self.assertEqual(metadata.header, ['filmid', 'title'])
+        self.assertEqual(file_record_count(self.path), 3)
+
+    def test_missing_file_has_no_records(self):
+        """
+        A missing file has no metadata, no header and no records.
+        """
+        # Act.
+        metadata = FileMetadataStore.get_metadata(self.path)
+
+        # Assert.
+        self.assertIsNone(metadata)
+        self.assertIsNone(FileMetadataStore.get_header(self.path))
+        self.assertEqual(file_record_count(self.path, has_header=True), 0)
+
+    def test_unchanged_file_is_read_once(self):
+        """
+        The metadata of an unchanged file are only read once.
+        """
+        # Arrange.
+        self.arrange_write_file('filmid;title\n1;Fuchs\n')
+        read_count = FileMetadataStore.read_count
+
+        # Act.
+        counts = [file_record_count(self.path, has_header=True) for _ in range(3)]
+        header = FileMetadataStore.get_header(self.path)
+
+        # Assert.
+        self.assertEqual(counts, [1, 1, 1])
+        self.assertEqual(header, ['filmid', 'title'])
+        self.assertEqual(FileMetadataStore.read_count, read_count + 1)
+
+    def test_changed_file_is_read_again(self):
+        """
+        The metadata of a file are read again when the file has changed.
+        """
+        # Arrange.
+        self.arrange_write_file('filmid;title\n1;Fuchs\n')
+        metadata = FileMetadataStore.get_metadata(self.path)
+        mtime_ns = os.stat(self.path).st_mtime_ns + 1_000_000_000
+
+        # Act.
+        self.arrange_write_file('filmid;title\n1;Fuchs\n2;Gans\n', mtime_ns=mtime_ns)
+        changed_metadata = FileMetadataStore.get_metadata(self.path)
+
+        # Assert.
+        self.assertEqual(changed_metadata.record_count(has_header=True), 2)
+        self.assertNotEqual(changed_metadata.fingerprint, metadata.fingerprint)
+
+
+class FestivalStatisticsTests(LoaderViewsTests):
+
+    def arrange_films_and_ratings(self, festival, film_count):
+        for film_id in range(1, film_count + 1):
+            film = create_film(film_id, f'Film {film_id}', 90, festival=festival, seq_nr=film_id)
+            create_rating(film, self.admin_fan, FilmFanFilmRating.Rating.GOOD)
+
+    def count_overview_queries(self):
+        _ = self.client.get(reverse('loader:ratings'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('loader:ratings'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries)
+
+    def test_statistics_count_objects_per_festival(self):
+        """
+        The statistics of a festival hold the number of objects of that
+        festival only.
+        """
+        # Arrange.
+        other_festival = create_festival('IFFR', self.city, '2024-01-25', '2024-02-04')
+        self.arrange_films_and_ratings(self.festival, 3)
+        _ = create_film(4, 'Elsewhere', 90, festival=other_festival)
+
+        # Act.
+        statistics_by_festival_id = StatisticsStore.get_statistics_by_festival_id()
+
+        # Assert.
+        statistics = statistics_by_festival_id[self.festival.id]
+        self.assertEqual(statistics.film_count, 3)
+        self.assertEqual(statistics.rating_count, 3)
+        self.assertEqual(statistics.screening_count, 0)
+        self.assertEqual(statistics_by_festival_id[other_festival.id].film_count, 1)
+
+    def test_created_and_deleted_objects_mark_statistics(self):
+        """
+        Creating or deleting a counted object marks the statistics of its
+        festival as out of date, so that they are counted again.
+        """
+        # Arrange.
+        self.arrange_films_and_ratings(self.festival, 2)
+        _ = StatisticsStore.get_statistics(self.festival)
+
+        # Act.
+        Film.films.get(film_id=1).delete()
+
+        # Assert.
+        version = FestivalStatistics.statistics.get(festival=self.festival).version
+        self.assertNotEqual(version, STATISTICS_VERSION)
+        statistics = StatisticsStore.get_statistics(self.festival)
+        self.assertEqual((statistics.film_count, statistics.rating_count), (1, 1))
+
+    def test_overview_query_count_independent_of_festival_count(self):
+        """
+        The ratings overview page takes a number of queries that doesn't
+        grow with the number of festivals.
+        """
+        # Arrange.
+        self.login(self.admin_credentials)
+        self.arrange_films_and_ratings(self.festival, 2)
+        few_festival_queries = self.count_overview_queries()
+        for year in range(2019, 2023):
+            festival = create_festival(f'F{year}', self.city, f'{year}-02-16', f'{year}-02-26')
+            self.arrange_films_and_ratings(festival, 2)
+
+        # Act.
+        many_festival_queries = self.count_overview_queries()
+
+        # Assert.
+        self.assertEqual(many_festival_queries, few_festival_queries)
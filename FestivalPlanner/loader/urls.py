@@ -10,5 +10,6 @@ urlpatterns = [
     path('new_screens', views.NewTheaterDataView.as_view(), name='new_screens'),
     path('film_backup', views.FilmDataBackupView.as_view(), name='film_backup'),
     path('list_action', views.SingleTemplateListView.as_view(), name='list_action'),
-    path('<int:pk>/dump_data', views.SingleTemplateDumperView.as_view(), name='dump_data')
+    path('<int:pk>/dump_data', views.SingleTemplateDumperView.as_view(), name='dump_data'),
+    path('<int:pk>/log', views.ActionLogView.as_view(), name='log'),
 ]
@@ -4,48 +4,45 @@ from operator import attrgetter
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import MultipleObjectsReturned
 from django.http import HttpResponseRedirect
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
 from django.views import View
 from django.views.generic import FormView, ListView
 
 from authentication.models import FilmFan
 from festival_planner.cookie import Cookie
+from festival_planner.file_metadata import FileMetadataStore
+from festival_planner.log_store import LOG_PAGE_SIZE
 from festival_planner.shared_template_referrer_view import SharedTemplateReferrerView
+from festival_planner.statistics_store import StatisticsStore
 from festival_planner.tools import add_base_context, get_log, unset_log, initialize_log, wrap_up_form_errors
 from festivals.models import Festival, switch_festival, current_festival, FestivalBase
 from films.models import Film, FilmFanFilmRating
+from loader.models import ActionLog, ActionLogLine
 from loader.forms.loader_forms import SectionLoader, SubsectionLoader, RatingLoaderForm, TheaterDataLoaderForm, \
     TheaterDataDumperForm, CityLoader, TheaterLoader, ScreenLoader, TheaterDataUpdateForm, RatingDataBackupForm, \
     FILM_FANS_BACKUP_PATH, RATINGS_BACKUP_PATH, FILMS_BACKUP_PATH, \
     FESTIVALS_BACKUP_PATH, FESTIVAL_BASES_BACKUP_PATH, BACKUP_DATA_DIR, CITIES_BACKUP_PATH, \
     ScreeningLoader, AttendanceLoader, AttendanceDumper, RatingDumper, SingleTableDumperForm, TicketLoader, TicketDumper
 from screenings.forms.screening_forms import DummyForm
-from screenings.models import Screening, Attendance, Ticket
-from sections.models import Section, Subsection
+from screenings.models import Attendance, Ticket
 from theaters.models import Theater, City, cities_path, theaters_path, screens_path, Screen, new_screens_path, \
     new_cities_path, new_theaters_path
 
 
 def file_record_count(path, has_header=False):
-    try:
-        with open(path, newline='') as f:
-            record_count = len(f.readlines())
-        if has_header:
-            record_count -= 1
-    except FileNotFoundError:
-        record_count = 0
-    return record_count
+    return FileMetadataStore.get_record_count(path, has_header=has_header)
 
 
-def get_festival_row(festival):
+def get_festival_row(festival, statistics=None):
+    statistics = statistics or StatisticsStore.get_statistics(festival)
     festival_row = {
         'festival': festival,
         'id': festival.id,
         'section_count_on_file': file_record_count(festival.sections_file()),
-        'section_count': Section.sections.filter(festival=festival).count,
+        'section_count': statistics.section_count,
         'subsection_count_on_file': file_record_count(festival.subsections_file()),
-        'subsection_count': Subsection.subsections.filter(section__festival=festival).count,
+        'subsection_count': statistics.subsection_count,
     }
     return festival_row
 
@@ -255,8 +252,9 @@ class SectionsLoaderView(LoginRequiredMixin, ListView):
     unexpected_error = ''
 
     def get_queryset(self):
-        festivals = Festival.festivals.order_by('-start_date')
-        object_rows = [get_festival_row(festival) for festival in festivals]
+        festivals = Festival.festivals.order_by('-start_date').select_related('base')
+        statistics_by_festival_id = StatisticsStore.get_statistics_by_festival_id()
+        object_rows = [get_festival_row(festival, statistics_by_festival_id[festival.id]) for festival in festivals]
         return object_rows
 
     def get_context_data(self, **kwargs):
@@ -348,8 +346,10 @@ class RatingsLoaderView(LoginRequiredMixin, ListView):
         self.submit_name_prefix = 'ratings_'
 
     def get_queryset(self):
-        festival_list = sorted(Festival.festivals.all(), key=attrgetter('start_date'), reverse=True)
-        festival_rows = [self._get_festival_row(festival) for festival in festival_list]
+        festivals = Festival.festivals.select_related('base')
+        festival_list = sorted(festivals, key=attrgetter('start_date'), reverse=True)
+        statistics_by_festival_id = StatisticsStore.get_statistics_by_festival_id()
+        festival_rows = [self._get_festival_row(f, statistics_by_festival_id[f.id]) for f in festival_list]
         return festival_rows
 
     def get_context_data(self, **kwargs):
@@ -386,15 +386,15 @@ class RatingsLoaderView(LoginRequiredMixin, ListView):
 
         return render(request, 'loader/ratings.html', self.get_context_data())
 
-    def _get_festival_row(self, festival):
+    def _get_festival_row(self, festival, statistics):
         festival_row = {
             'str': festival,
             'submit_name': f'{self.submit_name_prefix}{festival.id}',
             'color': festival.festival_color,
             'film_count_on_file': file_record_count(festival.films_file(), has_header=True),
-            'film_count': Film.films.filter(festival=festival).count,
+            'film_count': statistics.film_count,
             'rating_count_on_file': file_record_count(festival.ratings_file(), has_header=True),
-            'rating_count': self._ratings_queryset(festival).count,
+            'rating_count': statistics.rating_count,
         }
         return festival_row
 
@@ -411,15 +411,15 @@ class BaseListActionListView(LoginRequiredMixin, ListView):
     object_list = None
     loader_class = None
     load_file = None
-    manager = None
+    count_field = None
     title = None
     list_name = None
-    festival_filter = None
     alternative_headers = None
 
     def get_queryset(self):
-        festivals = Festival.festivals.order_by('-start_date')
-        festival_rows = [self._get_festival_row(festival) for festival in festivals]
+        festivals = Festival.festivals.order_by('-start_date').select_related('base')
+        statistics_by_festival_id = StatisticsStore.get_statistics_by_festival_id()
+        festival_rows = [self._get_festival_row(f, statistics_by_festival_id[f.id]) for f in festivals]
         return festival_rows
 
     def get_context_data(self, *, object_list=None, **kwargs):
@@ -435,14 +435,13 @@ class BaseListActionListView(LoginRequiredMixin, ListView):
         unset_log(session)
         return context
 
-    def _get_festival_row(self, festival):
+    def _get_festival_row(self, festival, statistics):
         path = getattr(festival, self.load_file)()
-        festival_kwargs = {self.festival_filter: festival}
         festival_row = {
             'festival': festival,
             'field_props': self._get_field_props(path),
             'data_count_on_file': file_record_count(path, has_header=True),
-            'data_count': self.manager.filter(**festival_kwargs).count,
+            'data_count': getattr(statistics, self.count_field),
         }
         return festival_row
 
@@ -450,7 +449,7 @@ class BaseListActionListView(LoginRequiredMixin, ListView):
         loadable = False
         comments = []
         expected_header = self.loader_class.expected_header
-        header = ScreeningLoader.get_header(path)
+        header = FileMetadataStore.get_header(path)
 
         if not header:
             comments.append('File not found')
@@ -514,10 +513,9 @@ class ScreeningLoaderListView(BaseListActionListView):
     template_name = ScreeningsLoaderView.template_name
     loader_class = ScreeningLoader
     load_file = 'screenings_file'
-    manager = Screening.screenings
+    count_field = 'screening_count'
     title = 'Festival Screenings Loader'
     list_name = 'screenings'
-    festival_filter = 'film__festival'
     alternative_headers = [ScreeningLoader.alternative_header]
 
 
@@ -546,10 +544,9 @@ class AttendanceLoaderListView(BaseListActionListView):
     template_name = AttendanceLoaderView.template_name
     loader_class = AttendanceLoader
     load_file = 'screening_info_file'
-    manager = Attendance.attendances
+    count_field = 'attendance_count'
     title = 'Festival Attendances Loader'
     list_name = 'attendances'
-    festival_filter = 'screening__film__festival'
 
 
 class AttendanceLoaderFormView(BaseListActionFormView):
@@ -576,7 +573,7 @@ class TicketLoaderView(SharedTemplateReferrerView):
 class TicketLoaderListView(AttendanceLoaderListView):
     template_name = TicketLoaderView.template_name
     loader_class = TicketLoader
-    manager = Ticket.tickets
+    count_field = 'ticket_count'
     title = 'Festival Tickets Loader'
     list_name = 'tickets'
 
@@ -644,7 +641,7 @@ class BaseDumperView(LoginRequiredMixin, FormView):
     def add_display_props(self, name, queryset, dumpfile, has_header=False):
         self.display_props.append({
             'name': name,
-            'data_count': len(queryset),
+            'data_count': queryset.count(),
             'data_count_on_file': file_record_count(dumpfile, has_header=has_header),
         })
 
@@ -718,3 +715,28 @@ class SingleTemplateDumperView(SingleTemplateBaseView):
         'attendances': AttendanceDumperView,
         'tickets': TicketDumperView,
     }
+
+
+class ActionLogView(LoginRequiredMixin, ListView):
+    """
+    Displays all results of an action log of the current user, page by
+    page.
+    """
+    template_name = 'loader/log.html'
+    http_method_names = ['get']
+    context_object_name = 'log_lines'
+    paginate_by = LOG_PAGE_SIZE
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.action_log = None
+
+    def get_queryset(self):
+        self.action_log = get_object_or_404(ActionLog.action_logs, pk=self.kwargs['pk'], user=self.request.user)
+        return ActionLogLine.log_lines.filter(log=self.action_log).order_by('id')
+
+    def get_context_data(self, **kwargs):
+        context = add_base_context(self.request, super().get_context_data(**kwargs))
+        context['title'] = f'{self.action_log.action} Results'
+        context['action_log'] = self.action_log
+        return context
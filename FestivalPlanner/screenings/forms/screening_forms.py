@@ -6,9 +6,11 @@ from django.db import transaction
 
 from authentication.models import FilmFan
 from festival_planner.cookie import Errors
+from festival_planner.day_schema_cache import DaySchemaCache
 from festival_planner.debug_tools import pr_debug, ExceptionTracer, timed_method
 from festival_planner.fan_action import FixWarningAction
-from festival_planner.screening_status_getter import ScreeningStatusGetter
+from festival_planner.festival_data import mark_festival_data, collect_screening_fan_marks
+from festival_planner.planner_state import PlannerState
 from festival_planner.tools import add_log, initialize_log
 from festivals.models import current_festival
 from films.models import FilmFanFilmRating, current_fan, get_rating_as_int
@@ -37,15 +39,18 @@ class PlannerSortKeyKeeper:
         'start_dt': True,
     }
 
-    def __init__(self, screening, fan, attending_friends):
+    def __init__(self, screening, fan, attending_friends, highest_ratings=None, filmscreening_count=None):
         self.screening = screening
         film = screening.film
-        self.highest_rating, self.second_highest_rating = self.get_highest_ratings(film)
+        highest_ratings = highest_ratings or self.get_highest_ratings(film)
+        self.highest_rating, self.second_highest_rating = highest_ratings
         if self.second_highest_rating in FilmFanFilmRating.get_not_plannable_ratings():
             self.highest_rating = self.second_highest_rating
         self.attending_friend_count = len(attending_friends)
         self.q_and_a = screening.q_and_a
-        self.filmscreening_count = len(get_available_filmscreenings(film, fan))
+        if filmscreening_count is None:
+            filmscreening_count = len(get_available_filmscreenings(film, fan))
+        self.filmscreening_count = filmscreening_count
         self.duration = screening.duration()
         self.theater_priority = screening.screen.theater.priority
         self.start_dt = screening.start_dt
@@ -85,8 +90,9 @@ class PlannerReporter:
             self.screening_count_by_rating[rating] = 0
             self.planned_screenings_by_rating[rating] = []
 
-    def set_film_dicts(self, films):
-        self.highest_rating_by_film = {f: self._get_highest_rating(f) for f in films}
+    def set_film_dicts(self, films, get_highest_rating=None):
+        get_highest_rating = get_highest_rating or self._get_highest_rating
+        self.highest_rating_by_film = {f: get_highest_rating(f) for f in films}
         for film in films:
             rating = self.highest_rating_by_film[film]
             self.film_count_by_rating[rating] += 1
@@ -136,7 +142,7 @@ class PlannerReporter:
 
 class PlannerForm(DummyForm):
     tracer = None
-    getter = None
+    state = None
     reporter = None
     festival_screenings = None
     planned_screenings_count = None
@@ -157,8 +163,8 @@ class PlannerForm(DummyForm):
             return False
 
         # Initialize planning.
-        cls._set_screening_status_getter(session)
-        cls.reporter.set_film_dicts(eligible_films)
+        cls._set_planner_state(session)
+        cls.reporter.set_film_dicts(eligible_films, cls.state.get_highest_rating)
         add_log(session, f'Planning {len(eligible_films) if eligible_films else "0"} films')
         transaction_committed = True
         cls.planned_screenings_count = 0
@@ -166,9 +172,11 @@ class PlannerForm(DummyForm):
         # Plan the best screenings for this fan for this festival.
         try:
             with transaction.atomic():
-                eligible_screenings = cls.get_eligible_screenings(eligible_films)
+                related_fields = PlannerState.related_fields
+                eligible_screenings = cls.get_eligible_screenings(eligible_films).select_related(*related_fields)
                 cls.reporter.set_screening_count_by_rating(eligible_screenings)
                 cls._plan_rating_screenings(eligible_screenings, eligible_films)
+                cls.state.save()
         except Exception as e:
             cls._log_error(e, f'{cls.planned_screenings_count} updates rolled back')
             transaction_committed = False
@@ -203,6 +211,9 @@ class PlannerForm(DummyForm):
                     AttendanceForm.update_attendance(fan, screening, attends=False)
                 updated_count = manager.bulk_update(auto_planned_screenings, ['auto_planned'])
                 add_log(session, f'{updated_count} screenings updated')
+
+                dates = DaySchemaCache.get_screening_dates(auto_planned_screenings)
+                mark_festival_data([festival.id], dates, fan_ids=())
         except Exception as e:
             cls._log_error(e, 'Transaction rolled back')
             transaction_committed = False
@@ -220,37 +231,37 @@ class PlannerForm(DummyForm):
         return eligible_screenings
 
     @classmethod
-    def get_sorted_eligible_screenings(cls, screenings, fan=None):
-        sort_keys = []
-        for screening in screenings:
-            attending_friends = screening.attending_friends(fan) if fan else cls.getter.get_attending_friends(screening)
-            fan = fan or current_fan(cls.session)
-            sort_keys.append(PlannerSortKeyKeeper(screening, fan, attending_friends))
+    def get_sorted_eligible_screenings(cls, screenings, fan=None, timeline=None):
+        if fan:
+            sort_keys = []
+            for screening in screenings:
+                count = len(get_available_filmscreenings(screening.film, fan, timeline)) if timeline else None
+                attending_friends = screening.attending_friends(fan)
+                sort_keys.append(PlannerSortKeyKeeper(screening, fan, attending_friends, filmscreening_count=count))
+        else:
+            sort_keys = [cls.state.get_sort_key(s, PlannerSortKeyKeeper) for s in screenings]
         sorted_screenings = PlannerSortKeyKeeper.get_sorted_screenings(sort_keys)
         return sorted_screenings
 
     @classmethod
-    def _set_screening_status_getter(cls, session):
+    def _set_planner_state(cls, session):
         festival = current_festival(session)
-        cls.festival_screenings = Screening.screenings.filter(film__festival=festival)
+        cls.state = PlannerState(current_fan(session), festival)
+        cls.festival_screenings = cls.state.festival_screenings
         add_log(session, f'{len(cls.festival_screenings)} festival screenings')
-        cls.getter = ScreeningStatusGetter(session, cls.festival_screenings)
 
     @classmethod
     def _plan_rating_screenings(cls, eligible_screenings, films):
         sorted_eligible_screenings = cls.get_sorted_eligible_screenings(eligible_screenings)
+        film_ids = {film.id for film in films}
         for eligible_screening in sorted_eligible_screenings:
-            if cls._screening_is_plannable(eligible_screening, films):
-                rating, _ = PlannerSortKeyKeeper.get_highest_ratings(eligible_screening.film)
+            if cls._screening_is_plannable(eligible_screening, film_ids):
+                rating = cls.state.get_highest_rating(eligible_screening.film)
 
-                # Update the screening.
+                # Update the screening and the planner state.
                 cls.reporter.planned_screenings_by_rating[rating].append(eligible_screening)
-                eligible_screening.auto_planned = True
-                AttendanceForm.update_attendance(cls.getter.fan, eligible_screening)
-                eligible_screening.save()
-
-                # Update the status of other screenings.
-                cls.getter.update_attendances_by_screening(eligible_screening)
+                cls.state.plan(eligible_screening)
+                film_ids.discard(eligible_screening.film_id)
                 if eligible_screening.film in films:
                     films.remove(eligible_screening.film)
 
@@ -258,42 +269,18 @@ class PlannerForm(DummyForm):
                 cls.planned_screenings_count += 1
 
     @classmethod
-    def _get_screening_status(cls, screening):
-        attendants = cls.getter.get_attendants(screening)
-        return cls.getter.get_screening_status(screening, attendants)
-
-    @classmethod
-    def _screening_is_plannable(cls, screening, films):
+    def _screening_is_plannable(cls, screening, film_ids):
         plannable = False
-        if cls.getter.fits_availability(screening):
-            status = cls._get_screening_status(screening)
+        if cls.state.fits_availability(screening):
+            status = cls.state.get_screening_status(screening)
             if cls._status_ok(status):
-                plannable = cls._still_valid(screening, films) and cls._no_overlap(screening)
-            return plannable
+                plannable = screening.film_id in film_ids and not cls.state.has_overlap(screening)
+        return plannable
 
     @classmethod
     def _status_ok(cls, status):
         return status in [Screening.ScreeningStatus.FREE, Screening.ScreeningStatus.FRIEND_ATTENDS]
 
-    @classmethod
-    def _still_valid(cls, screening, films):
-        valid_screenings = Screening.screenings.filter(film__in=films)
-        return valid_screenings.contains(screening)
-
-    @classmethod
-    def _no_overlap(cls, eligible_screening):
-        screenings = cls.festival_screenings
-        overlap_screenings = [s for s in screenings if cls._overlaps_attended(s, eligible_screening)]
-        return not overlap_screenings
-
-    @classmethod
-    def _overlaps_attended(cls, day_screening, eligible_screening):
-        overlaps_attended = False
-        attends = cls.getter.attends_by_screening[day_screening]
-        if attends and day_screening.overlaps(eligible_screening, use_travel_time=True):
-            overlaps_attended = True
-        return overlaps_attended
-
     @classmethod
     def _log_error(cls, error, msg):
         cls.tracer.add_error([f'{error}', f'{msg}'])
@@ -383,7 +370,7 @@ class ScreeningWarningsForm(DummyForm):
     def fix_ticket_warnings(cls, session, fix_method, fan_names, screening_ids, wording):
         transaction_committed = True
         try:
-            with transaction.atomic():
+            with collect_screening_fan_marks(), transaction.atomic():
                 tickets, count_by_type = fix_method(fan_names, screening_ids)
         except Exception as e:
             transaction_committed = False
@@ -413,6 +400,12 @@ class ScreeningWarningsForm(DummyForm):
     def _confirm_tickets(cls, fan_names, screening_ids):
         tickets = Ticket.tickets.filter(fan__name__in=fan_names, screening__in=screening_ids)
         _ = tickets.update(confirmed=True)
+
+        festival_id_fan_id_set = set(tickets.values_list('screening__film__festival_id', 'fan_id'))
+        festival_ids = {festival_id for festival_id, _ in festival_id_fan_id_set}
+        fan_ids = {fan_id for _, fan_id in festival_id_fan_id_set}
+        dates = DaySchemaCache.get_screening_dates(Screening.screenings.filter(id__in=screening_ids))
+        mark_festival_data(festival_ids, dates, fan_ids)
         return tickets, {}
 
     @classmethod
@@ -433,7 +426,7 @@ class ScreeningWarningsForm(DummyForm):
 def update_attendance_statuses(update_method, session, screening, changed_pop_by_fan, update_log, manager=None):
     transaction_committed = True
     try:
-        with transaction.atomic():
+        with collect_screening_fan_marks(), transaction.atomic():
             for fan, bool_prop in changed_pop_by_fan.items():
                 update_method(fan, screening, manager=manager, bool_prop=bool_prop)
                 update_log(fan, bool_prop)
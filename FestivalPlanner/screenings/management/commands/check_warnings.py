@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from festival_planner.warning_store import WarningStore
+from festivals.models import Festival
+
+
+class Command(BaseCommand):
+    help = 'Compare the stored warnings of the given festivals, or of all festivals, with computed warnings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('festival_ids', nargs='*', type=int, help='Ids of the festivals to check.')
+
+    def handle(self, *args, **options):
+        festivals = Festival.festivals.all()
+        if options['festival_ids']:
+            festivals = festivals.filter(id__in=options['festival_ids'])
+        inconsistent_festivals = []
+        for festival in festivals:
+            missing_keys, extra_keys = WarningStore.check(festival)
+            for label, keys in [('Missing', missing_keys), ('Extra', extra_keys)]:
+                for screening_id, fan_id, warning_type in sorted(keys):
+                    self.stdout.write(f'{label} warning {warning_type} of fan {fan_id} for screening {screening_id}')
+            if missing_keys or extra_keys:
+                inconsistent_festivals.append(festival)
+            self.stdout.write(f'{festival}: {len(missing_keys)} missing, {len(extra_keys)} extra warnings.')
+        if inconsistent_festivals:
+            raise CommandError(f'Stored warnings differ in {len(inconsistent_festivals)} festival(s).')
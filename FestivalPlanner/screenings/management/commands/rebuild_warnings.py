@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from festival_planner.warning_store import WarningStore
+from festivals.models import Festival
+
+
+class Command(BaseCommand):
+    help = 'Compute and store the warnings of the given festivals, or of all festivals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('festival_ids', nargs='*', type=int, help='Ids of the festivals to rebuild.')
+
+    def handle(self, *args, **options):
+        festivals = Festival.festivals.all()
+        if options['festival_ids']:
+            festivals = festivals.filter(id__in=options['festival_ids'])
+        for festival in festivals:
+            WarningStore.rebuild(festival)
+            self.stdout.write(f'Rebuilt the warnings of {festival}.')
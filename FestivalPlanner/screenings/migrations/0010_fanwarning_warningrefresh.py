@@ -0,0 +1,57 @@
+# Generated by Django 6.1.2 on 2026-10-17 07:36
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.db import migrations, models
+
+
+def refresh_all_festivals(apps, schema_editor):
+    festival_model = apps.get_model('festivals', 'Festival')
+    refresh_model = apps.get_model('screenings', 'WarningRefresh')
+    refreshes = [refresh_model(festival=festival) for festival in festival_model._default_manager.all()]
+    refresh_model._default_manager.bulk_create(refreshes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('festivals', '0002_alter_festivalbase_home_city'),
+        ('screenings', '0009_screening_sold_out'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WarningRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fan', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='authentication.filmfan')),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='festivals.festival')),
+            ],
+            options={
+                'db_table': 'warning_refresh',
+            },
+            managers=[
+                ('warning_refreshes', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FanWarning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('warning_type', models.IntegerField()),
+                ('fan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.filmfan')),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='festivals.festival')),
+                ('screening', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='screenings.screening')),
+            ],
+            options={
+                'db_table': 'fan_warning',
+                'indexes': [models.Index(fields=['festival', 'fan'], name='fan_warning_festival_fan')],
+                'constraints': [models.UniqueConstraint(fields=('screening', 'fan', 'warning_type'), name='unique_screening_fan_warning')],
+            },
+            managers=[
+                ('fan_warnings', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RunPython(refresh_all_festivals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.1.2 on 2026-10-17 08:34
+
+import django.db.models.deletion
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('festivals', '0003_festivalstatistics'),
+        ('screenings', '0010_fanwarning_warningrefresh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DaySchemaVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('version', models.IntegerField(default=1)),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='festivals.festival')),
+            ],
+            options={
+                'db_table': 'day_schema_version',
+                'constraints': [models.UniqueConstraint(fields=('festival', 'date'), name='unique_festival_date')],
+            },
+            managers=[
+                ('day_versions', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.db import models
 from authentication.models import FilmFan
 from availabilities.models import Availabilities
 from festivals.config import Config
+from festivals.models import Festival
 from films.models import Film, FilmFanFilmRating
 from theaters.models import Screen
 
@@ -148,7 +149,7 @@ class Screening(models.Model):
         return ok
 
     def get_travel_time(self, other_screening):
-        same_theater = self.screen.theater == other_screening.screen.theater
+        same_theater = self.screen.theater_id == other_screening.screen.theater_id
         travel_time = WALK_TIME_SAME_THEATER if same_theater else TRAVEL_TIME_OTHER_THEATER
         return travel_time
 
@@ -157,7 +158,9 @@ class Screening(models.Model):
         availabilities = manager.filter(fan=fan, start_dt__lte=self.start_dt, end_dt__gte=self.end_dt)
         return availabilities or False
 
-    def get_available_fans(self):
+    def get_available_fans(self, timeline=None):
+        if timeline is not None:
+            return timeline.get_available_fans(self)
         manager = Availabilities.availabilities
         kwargs = {'start_dt__lte': self.start_dt, 'end_dt__gte': self.end_dt}
         available_fans = [availability.fan for availability in manager.filter(**kwargs)]
@@ -269,6 +272,78 @@ class Ticket(models.Model):
         return f'Ticket of {self.fan} for {self.screening.str_title()}'
 
 
+class FanWarning(models.Model):
+    """
+    Warning table, holds the warnings of the attended screenings and
+    the tickets of a festival, so that they can be read without
+    computing them.
+    The warning type is the value of a ScreeningWarning.WarningType.
+    """
+    # Define the fields.
+    festival = models.ForeignKey(Festival, on_delete=models.CASCADE)
+    screening = models.ForeignKey(Screening, on_delete=models.CASCADE)
+    fan = models.ForeignKey(FilmFan, on_delete=models.CASCADE)
+    warning_type = models.IntegerField()
+
+    # Define a manager.
+    fan_warnings = models.Manager()
+
+    class Meta:
+        db_table = 'fan_warning'
+        constraints = [
+            models.UniqueConstraint(fields=['screening', 'fan', 'warning_type'], name='unique_screening_fan_warning')
+        ]
+        indexes = [
+            models.Index(fields=['festival', 'fan'], name='fan_warning_festival_fan'),
+        ]
+
+    def __str__(self):
+        return f'Warning {self.warning_type} of {self.fan} for {self.screening.str_title()}'
+
+
+class WarningRefresh(models.Model):
+    """
+    Refresh table, holds the fans of which the stored warnings of a
+    festival are out of date. No fan means all fans of the festival.
+    """
+    # Define the fields.
+    festival = models.ForeignKey(Festival, on_delete=models.CASCADE)
+    fan = models.ForeignKey(FilmFan, null=True, on_delete=models.CASCADE)
+
+    # Define a manager.
+    warning_refreshes = models.Manager()
+
+    class Meta:
+        db_table = 'warning_refresh'
+
+    def __str__(self):
+        return f'Refresh warnings of {self.fan or "all fans"} in {self.festival}'
+
+
+class DaySchemaVersion(models.Model):
+    """
+    Version table, holds a counter per festival day that is increased
+    when the screenings, attendances, tickets, availabilities or ratings
+    shown in the day schema of that day change.
+    """
+    # Define the fields.
+    festival = models.ForeignKey(Festival, on_delete=models.CASCADE)
+    date = models.DateField()
+    version = models.IntegerField(default=1)
+
+    # Define a manager.
+    day_versions = models.Manager()
+
+    class Meta:
+        db_table = 'day_schema_version'
+        constraints = [
+            models.UniqueConstraint(fields=['festival', 'date'], name='unique_festival_date')
+        ]
+
+    def __str__(self):
+        return f'Version {self.version} of {self.festival} on {self.date.isoformat()}'
+
+
 def film_rating_strings(screening):
     return screening.film.rating_strings()
 
@@ -277,7 +352,9 @@ def filmscreenings(film):
     return Screening.screenings.filter(film=film)
 
 
-def get_available_filmscreenings(film, fan):
+def get_available_filmscreenings(film, fan, timeline=None):
     screenings = filmscreenings(film)
+    if timeline is not None:
+        return [s for s in screenings if timeline.fan_fits_screening(fan, s)]
     available_filmscreenings = [s for s in screenings if s.available_by_fan(fan)]
     return available_filmscreenings
@@ -1,22 +1,36 @@
 import datetime
 import re
 from http import HTTPStatus
+from io import StringIO
 
-from django.db import IntegrityError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from authentication.models import FilmFan
 from availabilities.models import Availabilities
 from availabilities.views import DAY_START_TIME
-from festival_planner import debug_tools
-from festival_planner.screening_status_getter import ScreeningWarning, ScreeningStatusGetter
-from festivals.models import FestivalBase, Festival, switch_festival, current_festival
+from festival_planner import debug_tools, data_stamp_store
+from festival_planner.data_stamp_store import DataStampStore
+from festival_planner.day_schema_cache import DaySchemaCache
+from festival_planner.debug_tools import PROFILE_AGGREGATOR, ProfileAggregator
+from festival_planner.festival_data import mark_festival_data
+from festival_planner.screening_interval_index import ScreeningIntervalIndex
+from festival_planner.screening_status_getter import ScreeningWarning, ScreeningStatusGetter, AvailabilityKeeper, \
+    FestivalWarningKeeper, get_warnings
+from festival_planner.statistics_store import StatisticsStore, STALE_VERSION
+from festival_planner.tools import initialize_log
+from festival_planner.warning_store import WarningStore
+from festivals.models import FestivalBase, Festival, switch_festival, current_festival, DataStamp, FestivalStatistics
+from films.forms.film_forms import init_rating_action
 from films.models import Film, FAN_NAMES_BY_FESTIVAL_BASE, LOWEST_PLANNABLE_RATING, FilmFanFilmRating, set_current_fan, \
-    UNRATED_RATING
+    UNRATED_RATING, FilmFanFilmVote
 from films.tests import create_film, ViewsTestCase, get_decoded_content
 from films.views import MAX_SHORT_MINUTES
-from screenings.models import Screening, Attendance, Ticket
+from screenings.forms.screening_forms import PlannerForm, ScreeningWarningsForm, AttendanceForm
+from screenings.models import Screening, Attendance, Ticket, DaySchemaVersion, WarningRefresh
 from sections.models import Section, Subsection
 from theaters.models import Theater, Screen, City
 
@@ -223,6 +237,9 @@ class ScreeningViewsTests(ViewsTestCase):
         super().setUp()
         debug_tools.SUPPRESS_DEBUG_PRINT = True
 
+        # The rolled back test databases repeat ids and day versions, which would find rows of other tests.
+        DaySchemaCache.clear()
+
         city = City.cities.create(city_id=2, name='Venezia', country='it')
 
         base_kwargs = {
@@ -347,6 +364,27 @@ class ScreeningViewsTests(ViewsTestCase):
         screening = self.arrange_create_screening(self.screen_sg, start_dt)
         return screening
 
+    def arrange_warning_prone_data(self):
+        fans = [self.regular_fan, self.admin_fan]
+        film_3 = create_film(17, 'Blood and Sand', 125, festival=self.festival)
+        film_4 = create_film(18, 'No Sleep Till', 93, festival=self.festival)
+        start_dt_1 = arrange_get_datetime('2024-08-30 20:00')
+        start_dt_2 = arrange_get_datetime('2024-08-31 11:30')
+        start_dt_3 = arrange_get_datetime('2024-09-02 14:15')
+        start_dt_4 = arrange_get_datetime('2024-09-02 14:00')
+        screening_1 = self.arrange_create_screening(self.screen_sg, start_dt_1, film=self.film)
+        screening_2 = self.arrange_create_screening(self.screen_pb, start_dt_2, film=self.film)
+        screening_3 = self.arrange_create_screening(self.screen_sc, start_dt_3, film=film_3)
+        screening_4 = self.arrange_create_screening(self.screen_sc, start_dt_4, film=film_4)
+
+        for screening in [screening_1, screening_2, screening_3, screening_4]:
+            _ = Attendance.attendances.create(fan=fans[0], screening=screening)
+        _ = Ticket.tickets.create(fan=fans[0], screening=screening_1, confirmed=True)
+        _ = Ticket.tickets.create(fan=fans[0], screening=screening_3)
+        _ = Ticket.tickets.create(fan=fans[1], screening=screening_2)
+        _ = Attendance.attendances.create(fan=fans[1], screening=screening_4)
+        WarningsViewTests._arrange_availability(fans[0], [screening_1, screening_3])
+
     def assert_screening_status(self, response, screening_status, view='day_schema'):
         def make_re_str(re_str):
             return str(re_str).replace('(', '\\(').replace(')', '\\)')
@@ -713,6 +751,56 @@ class PlannerViewTests(ScreeningViewsTests):
         self.assertFalse(self.bad_screening.auto_planned)
         self.assertTrue(self.good_screening.auto_planned)
 
+    def test_planning_skips_overlapping_screenings(self):
+        """
+        The planner plans one screening per film and skips screenings that overlap a planned screening.
+        """
+        # Arrange.
+        self.arrange_regular_user_props()
+        _ = self.arrange_get_film_rating(self.film, self.fan, LOWEST_PLANNABLE_RATING + 1)
+        _ = self.arrange_get_film_rating(self.film_2, self.fan, LOWEST_PLANNABLE_RATING)
+        start_dt = arrange_get_datetime('2024-08-28 09:00')
+        end_dt = arrange_get_datetime('2024-09-07 23:59')
+        Availabilities.availabilities.create(fan=self.fan, start_dt=start_dt, end_dt=end_dt)
+        planned_screening = self.arrange_create_screening(self.screen_sg, arrange_get_datetime('2024-08-30 11:15'))
+        overlapping_kwargs = {'film': self.film_2, 'screen': self.screen_pb}
+        overlapping_screening = self.arrange_create_screening(start_dt=arrange_get_datetime('2024-08-30 12:00'),
+                                                              **overlapping_kwargs)
+        other_screening = self.arrange_create_screening(start_dt=arrange_get_datetime('2024-08-29 12:00'),
+                                                        **overlapping_kwargs)
+
+        # Act.
+        committed = PlannerForm.auto_plan_screenings(self.session, [self.film, self.film_2])
+
+        # Assert.
+        self.assertIs(committed, True)
+        auto_planned_screenings = Screening.screenings.filter(auto_planned=True)
+        self.assertQuerySetEqual(auto_planned_screenings, [planned_screening, other_screening], ordered=False)
+        self.assertNotIn(overlapping_screening, auto_planned_screenings)
+        attended_screenings = [a.screening for a in Attendance.attendances.filter(fan=self.fan)]
+        self.assertCountEqual(attended_screenings, [planned_screening, other_screening])
+
+    def test_planning_updates_festival_statistics(self):
+        """
+        The attendances created by the planner are counted in the festival statistics.
+        """
+        # Arrange.
+        self.arrange_regular_user_props()
+        _ = self.arrange_get_film_rating(self.film, self.fan, LOWEST_PLANNABLE_RATING + 1)
+        start_dt = arrange_get_datetime('2024-08-28 09:00')
+        end_dt = arrange_get_datetime('2024-09-07 23:59')
+        Availabilities.availabilities.create(fan=self.fan, start_dt=start_dt, end_dt=end_dt)
+        _ = self.arrange_create_screening(self.screen_sg, arrange_get_datetime('2024-08-30 11:15'))
+        attendance_count = StatisticsStore.get_statistics(self.festival).attendance_count
+
+        # Act.
+        committed = PlannerForm.auto_plan_screenings(self.session, [self.film])
+
+        # Assert.
+        self.assertIs(committed, True)
+        self.assertEqual(attendance_count, 0)
+        self.assertEqual(StatisticsStore.get_statistics(self.festival).attendance_count, 1)
+
 
 class WarningsViewTests(ScreeningViewsTests):
     re_warning_count = re.compile(
@@ -1077,3 +1165,664 @@ class WarningsViewTests(ScreeningViewsTests):
         self._assert_warning_count(get_content, 2)
         self._assert_fan_warnings(redirect_content, [fan], warning_types_redirect)
         self._assert_warning_count(redirect_content, 1)
+
+
+class FestivalWarningKeeperTests(ScreeningViewsTests):
+    @staticmethod
+    def _get_warning_key(warning):
+        return warning.screening, warning.fan, warning.warning
+
+    def test_warnings_equal_per_pair_warnings(self):
+        """
+        The festival warning keeper yields the same warnings as the
+        screening-fan based warning computation.
+        """
+        # Arrange.
+        self.arrange_warning_prone_data()
+        keys_set = FestivalWarningKeeper(self.festival).get_keys_set()
+        keeper = AvailabilityKeeper()
+        keeper.set_availability({s for s, _ in keys_set}, {f for _, f in keys_set})
+        keeper.set_ticket_status({s for s, _ in keys_set}, {f for _, f in keys_set})
+        expected_warnings = []
+        for keys in keys_set:
+            expected_warnings.extend(ScreeningWarning.get_fan_warnings(*keys, availability_keeper=keeper))
+
+        # Act.
+        warnings = get_warnings(self.festival, self._get_warning_key)
+
+        # Assert.
+        self.assertEqual(len(expected_warnings), 11)
+        self.assertEqual(sorted(map(str, warnings)), sorted(str(self._get_warning_key(w)) for w in expected_warnings))
+        self.assertEqual(ScreeningWarning.get_warning_stats(self.festival)['count'], len(expected_warnings))
+
+    def test_warnings_take_fixed_number_of_queries(self):
+        """
+        Getting the warnings of a festival takes the same number of queries
+        regardless of the number of screenings and fans.
+        """
+        # Arrange.
+        self.arrange_warning_prone_data()
+
+        # Act/Assert.
+        with self.assertNumQueries(3):
+            warnings = get_warnings(self.festival, lambda w: w)
+        self.assertTrue(warnings)
+
+
+class WarningStoreTests(ScreeningViewsTests):
+    def test_stored_warnings_equal_computed_warnings(self):
+        """
+        The stored warnings of a festival equal the warnings computed
+        on the fly.
+        """
+        # Arrange.
+        self.arrange_warning_prone_data()
+
+        # Act.
+        missing_keys, extra_keys = WarningStore.check(self.festival)
+
+        # Assert.
+        self.assertEqual(missing_keys, set())
+        self.assertEqual(extra_keys, set())
+        self.assertEqual(len(WarningStore.get_warnings(self.festival)), 11)
+        call_command('check_warnings', self.festival.id, stdout=StringIO())
+
+    def test_stored_warnings_follow_attendance_changes(self):
+        """
+        Deleting an attendance updates the stored warnings of the fan
+        concerned.
+        """
+        # Arrange.
+        self.arrange_warning_prone_data()
+        warning_count = len(WarningStore.get_warnings(self.festival))
+        attendance = Attendance.attendances.get(fan=self.admin_fan)
+
+        # Act.
+        attendance.delete()
+
+        # Assert.
+        warnings = WarningStore.get_warnings(self.festival)
+        admin_warning_types = [w.warning for w in warnings if w.fan == self.admin_fan]
+        self.assertEqual(admin_warning_types, [ScreeningWarning.WarningType.SHOULD_SELL_TICKET])
+        self.assertLess(len(warnings), warning_count)
+        self.assertEqual(WarningStore.check(self.festival), (set(), set()))
+
+    def test_attendances_of_several_fans_mark_festival_data_once(self):
+        """
+        Changing the attendances of several fans at once marks the data
+        of the festival once, for all of these fans.
+        """
+        # Arrange.
+        screening = self.arrange_create_screening(self.screen_sg, arrange_get_datetime('2024-08-30 11:15'))
+        fans = [self.regular_fan, self.admin_fan]
+        WarningStore.refresh(self.festival)
+        stamp_version = DataStampStore.get_festival_version(self.festival)
+
+        # Act.
+        committed = AttendanceForm.update_attendances(self.client.session, screening, dict.fromkeys(fans, True),
+                                                      lambda fan, attends: None)
+
+        # Assert.
+        self.assertTrue(committed)
+        refreshes = WarningRefresh.warning_refreshes.filter(festival=self.festival)
+        self.assertEqual(set(refreshes.values_list('fan_id', flat=True)), {fan.id for fan in fans})
+        self.assertEqual(DataStampStore.get_festival_version(self.festival), stamp_version + 1)
+        self.assertEqual(WarningStore.check(self.festival), (set(), set()))
+
+    def test_stored_warnings_take_fixed_number_of_queries(self):
+        """
+        Reading the stored warnings of a festival that are up to date
+        takes one query to find out-of-date fans and one to read them.
+        """
+        # Arrange.
+        self.arrange_warning_prone_data()
+        WarningStore.refresh(self.festival)
+
+        # Act/Assert.
+        with self.assertNumQueries(2):
+            warnings = WarningStore.get_warnings(self.festival)
+        self.assertEqual(len(warnings), 11)
+
+
+class ScreeningIntervalIndexTests(ScreeningViewsTests):
+    def _arrange_screenings(self):
+        screens = [self.screen_sg, self.screen_b, self.screen_pb, self.screen_sc]
+        start_dt = arrange_get_datetime('2024-08-30 09:00')
+        screenings = []
+        for i in range(24):
+            screen = screens[i % len(screens)]
+            screening_start_dt = start_dt + datetime.timedelta(minutes=55 * i)
+            screenings.append(self.arrange_create_screening(screen, screening_start_dt))
+        return screenings
+
+    def test_overlapping_screenings_equal_linear_scan(self):
+        """
+        The interval index finds the same overlapping screenings as
+        checking all screenings with Screening.overlaps().
+        """
+        # Arrange.
+        screenings = self._arrange_screenings()
+        index = ScreeningIntervalIndex(screenings)
+
+        for use_travel_time in [False, True]:
+            for screening in screenings:
+                # Act.
+                overlapping_screenings = index.overlapping_screenings(screening, use_travel_time=use_travel_time)
+
+                # Assert.
+                expected_screenings = [
+                    s for s in screenings if s != screening and screening.overlaps(s, use_travel_time=use_travel_time)
+                ]
+                self.assertEqual(set(overlapping_screenings), set(expected_screenings))
+
+    def test_attended_overlapping_screenings(self):
+        """
+        The interval index only finds overlapping screenings attended by
+        the given fan and keeps track of added and removed attendances.
+        """
+        # Arrange.
+        screenings = self._arrange_screenings()
+        index = ScreeningIntervalIndex(screenings)
+        index.add_attendance(self.regular_fan, screenings[1])
+        index.add_attendance(self.admin_fan, screenings[2])
+        index.add_attendance(self.regular_fan, screenings[3])
+
+        # Act.
+        attended_screenings = index.attended_overlapping_screenings(screenings[2], self.regular_fan)
+        index.remove_attendance(self.regular_fan, screenings[1])
+        remaining_screenings = index.attended_overlapping_screenings(screenings[2], self.regular_fan)
+        admin_screenings = index.attended_overlapping_screenings(screenings[1], self.admin_fan)
+
+        # Assert.
+        self.assertEqual(set(attended_screenings), {screenings[1], screenings[3]})
+        self.assertEqual(remaining_screenings, [screenings[3]])
+        self.assertEqual(admin_screenings, [screenings[2]])
+
+
+class ScreeningStatusGetterTests(ScreeningViewsTests):
+
+    def _arrange_screenings(self, count):
+        start_dt = arrange_get_datetime('2024-08-30 09:00')
+        screenings = []
+        for i in range(count):
+            screening_start_dt = start_dt + datetime.timedelta(hours=3 * i)
+            screening = self.arrange_create_screening(self.screen_sg, screening_start_dt)
+            Attendance.attendances.create(fan=self.admin_fan, screening=screening)
+            Ticket.tickets.create(fan=self.fan, screening=screening)
+            screenings.append(screening)
+        return screenings
+
+    def _count_getter_queries(self, screenings):
+        with CaptureQueriesContext(connection) as context:
+            status_getter = ScreeningStatusGetter(self.session, screenings)
+        return status_getter, len(context.captured_queries)
+
+    def test_getter_query_count_independent_of_screening_count(self):
+        """
+        Constructing a screening status getter takes the same number of queries for few and many screenings.
+        """
+        # Arrange.
+        self.arrange_regular_user_props()
+        screenings = self._arrange_screenings(6)
+
+        # Act.
+        _, few_query_count = self._count_getter_queries(screenings[:2])
+        status_getter, many_query_count = self._count_getter_queries(screenings)
+
+        # Assert.
+        self.assertEqual(few_query_count, many_query_count)
+        for screening in screenings:
+            attendants = status_getter.get_attendants(screening)
+            self.assertEqual(attendants, [self.admin_fan])
+            self.assertEqual(status_getter.get_screening_status(screening, attendants),
+                             Screening.ScreeningStatus.SHOULD_SELL_TICKETS)
+            self.assertIs(status_getter.attendance_by_screening_by_fan[screening][self.admin_fan], True)
+            self.assertIs(status_getter.attendance_by_screening_by_fan[screening][self.fan], False)
+
+    def test_getter_follows_planned_attendance(self):
+        """
+        After an attendance update, the getter reports the current fan as attendant and the film as attended.
+        """
+        # Arrange.
+        self.arrange_regular_user_props()
+        screening, other_screening = self._arrange_screenings(2)
+        status_getter = ScreeningStatusGetter(self.session, [screening, other_screening])
+
+        # Act.
+        status_getter.update_attendances_by_screening(screening)
+
+        # Assert.
+        self.assertEqual(status_getter.get_attendants(screening), [self.fan, self.admin_fan])
+        self.assertIs(status_getter._has_attended_film(other_screening), True)
+
+
+class DaySchemaCacheTests(ScreeningViewsTests):
+    def setUp(self):
+        super().setUp()
+        self.arrange_regular_user_props()
+        self.other_film = create_film(8, 'Queer', 137, festival=self.festival)
+        self.day_1_screening = self.arrange_create_screening(self.screen_sg, arrange_get_datetime('2024-08-30 11:15'))
+        self.day_2_screening = self.arrange_create_screening(self.screen_b, arrange_get_datetime('2024-09-02 11:15'),
+                                                             film=self.other_film)
+
+    def get_day_schema(self, day_str):
+        response = self.client.get(reverse('screenings:day_schema') + f'?day={day_str}')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response
+
+    @staticmethod
+    def get_version(day_str):
+        return DaySchemaVersion.day_versions.get(date=datetime.date.fromisoformat(day_str)).version
+
+    def test_unchanged_day_is_served_from_cache(self):
+        """
+        The screen rows of an unchanged day are served from the cache, with fewer queries.
+        """
+        # Arrange.
+        with CaptureQueriesContext(connection) as cold_context:
+            cold_response = self.get_day_schema('2024-08-30')
+        DaySchemaCache.reset_counters()
+
+        # Act.
+        with CaptureQueriesContext(connection) as warm_context:
+            warm_response = self.get_day_schema('2024-08-30')
+
+        # Assert.
+        self.assertEqual(DaySchemaCache.hit_count, 1)
+        self.assertEqual(DaySchemaCache.miss_count, 0)
+        self.assertEqual(DaySchemaCache.hit_rate(), 1.0)
+        self.assertLess(len(warm_context.captured_queries), len(cold_context.captured_queries))
+        self.assert_screening_status(warm_response, Screening.ScreeningStatus.UNAVAILABLE)
+        self.assertEqual(get_decoded_content(warm_response).count('class="day-schema-screening"'),
+                         get_decoded_content(cold_response).count('class="day-schema-screening"'))
+
+    def test_attendance_invalidates_only_its_day(self):
+        """
+        An attendance changes the version of the day of its screening, not of days without screenings of its film.
+        """
+        # Arrange.
+        _ = self.get_day_schema('2024-08-30')
+        _ = self.get_day_schema('2024-09-02')
+        day_1_version = self.get_version('2024-08-30')
+        day_2_version = self.get_version('2024-09-02')
+
+        # Act.
+        _ = Attendance.attendances.create(fan=self.fan, screening=self.day_1_screening)
+        DaySchemaCache.reset_counters()
+        day_1_response = self.get_day_schema('2024-08-30')
+        _ = self.get_day_schema('2024-09-02')
+
+        # Assert.
+        self.assertGreater(self.get_version('2024-08-30'), day_1_version)
+        self.assertEqual(self.get_version('2024-09-02'), day_2_version)
+        self.assertEqual(DaySchemaCache.hit_count, 1)
+        self.assertEqual(DaySchemaCache.miss_count, 1)
+        self.assert_screening_status(day_1_response, Screening.ScreeningStatus.NEEDS_TICKETS)
+
+    def test_attendance_invalidates_days_of_same_film(self):
+        """
+        Attending a screening changes the status of the screenings of the same film on other days.
+        """
+        # Arrange.
+        later_screening = self.arrange_create_screening(self.screen_sp, arrange_get_datetime('2024-09-02 20:00'))
+        Availabilities.availabilities.create(fan=self.fan, start_dt=later_screening.start_dt,
+                                             end_dt=later_screening.end_dt + datetime.timedelta(hours=1))
+        response = self.get_day_schema('2024-09-02')
+        self.assert_screening_status(response, Screening.ScreeningStatus.FREE)
+
+        # Act.
+        _ = Attendance.attendances.create(fan=self.fan, screening=self.day_1_screening)
+        response = self.get_day_schema('2024-09-02')
+
+        # Assert.
+        self.assert_screening_status(response, Screening.ScreeningStatus.ATTENDS_FILM)
+
+    def test_theater_change_invalidates_all_days(self):
+        """
+        Changing the abbreviation of a theater changes the cached screen rows, which show it.
+        """
+        # Arrange.
+        _ = self.get_day_schema('2024-08-30')
+        day_version = self.get_version('2024-08-30')
+        theater = self.screen_sg.theater
+
+        # Act.
+        theater.abbreviation = 'pdc'
+        theater.save()
+        DaySchemaCache.reset_counters()
+        response = self.get_day_schema('2024-08-30')
+
+        # Assert.
+        self.assertGreater(self.get_version('2024-08-30'), day_version)
+        self.assertEqual(DaySchemaCache.hit_count, 0)
+        self.assertIn('pdc-g', get_decoded_content(response))
+
+    def test_marking_festival_data_marks_all_stores(self):
+        """
+        Marking the data of a festival marks the warnings of the given fans, the statistics, the given days and the
+        data stamps of that festival.
+        """
+        # Arrange.
+        _ = self.get_day_schema('2024-08-30')
+        _ = self.get_day_schema('2024-09-02')
+        _ = StatisticsStore.get_statistics(self.festival)
+        WarningStore.refresh(self.festival)
+        day_1_version = self.get_version('2024-08-30')
+        day_2_version = self.get_version('2024-09-02')
+        stamp_version = DataStampStore.get_festival_version(self.festival)
+
+        # Act.
+        mark_festival_data([self.festival.id], [datetime.date(2024, 8, 30)], [self.fan.id])
+
+        # Assert.
+        refreshes = WarningRefresh.warning_refreshes.filter(festival=self.festival)
+        self.assertEqual(list(refreshes.values_list('fan_id', flat=True)), [self.fan.id])
+        self.assertEqual(FestivalStatistics.statistics.get(festival=self.festival).version, STALE_VERSION)
+        self.assertGreater(self.get_version('2024-08-30'), day_1_version)
+        self.assertEqual(self.get_version('2024-09-02'), day_2_version)
+        self.assertGreater(DataStampStore.get_festival_version(self.festival), stamp_version)
+
+
+class ConditionalGetTests(ScreeningViewsTests):
+    view_names = ['screenings:day_schema', 'screenings:calendar', 'screenings:warnings', 'films:films',
+                  'films:reviewers']
+
+    def setUp(self):
+        super().setUp()
+        self.arrange_regular_user_props()
+        self.screening = self.arrange_create_std_screening()
+
+        # Keep the festival in the session of the client, as logging in does.
+        session = self.client.session
+        switch_festival(session, self.festival)
+        session.save()
+
+        # Stop the clock, the ETags change with the minute when the pages show fan actions.
+        self.now = datetime.datetime.now()
+        get_now = data_stamp_store.get_now
+        data_stamp_store.get_now = lambda: self.now
+        self.addCleanup(setattr, data_stamp_store, 'get_now', get_now)
+
+    def get_stable_response(self, view_name):
+        """Get the given view until the session settles, rendering the page changes the session on first visit."""
+        _ = self.client.get(reverse(view_name))
+        response = self.client.get(reverse(view_name))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response
+
+    def test_every_fan_has_stamps(self):
+        """
+        Creating festivals and fans creates the data stamps of all combinations.
+        """
+        # Arrange.
+        fan_count = FilmFan.film_fans.count()
+        festival_count = Festival.festivals.count()
+
+        # Act.
+        stamp_count = DataStamp.stamps.count()
+
+        # Assert.
+        self.assertGreater(stamp_count, 0)
+        self.assertEqual(stamp_count, fan_count * festival_count)
+
+    def test_unchanged_pages_are_not_modified(self):
+        """
+        A GET with the ETag of an unchanged page is answered with 304 Not Modified, in the same few queries per view.
+        """
+        for view_name in self.view_names:
+            with self.subTest(view_name=view_name):
+                # Arrange.
+                etag = self.get_stable_response(view_name)['ETag']
+
+                # Act.
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(reverse(view_name), HTTP_IF_NONE_MATCH=etag)
+
+                # Assert.
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+                self.assertLessEqual(len(context.captured_queries), 3)
+
+    def test_if_modified_since_is_not_honoured(self):
+        """
+        Pages have no modification time, as it can't tell sessions apart, so If-Modified-Since renders the page.
+        """
+        # Arrange.
+        response = self.get_stable_response('films:films')
+        if_modified_since = 'Sat, 01 Jan 2100 00:00:00 GMT'
+
+        # Act.
+        response_since = self.client.get(reverse('films:films'), HTTP_IF_MODIFIED_SINCE=if_modified_since)
+
+        # Assert.
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(response_since.status_code, HTTPStatus.OK)
+
+    def test_fan_action_time_renders_pages_again(self):
+        """
+        Pages that show how long ago the last fan action was are rendered again when a minute has passed.
+        """
+        # Arrange.
+        rating = FilmFanFilmRating.film_ratings.create(film=self.film, film_fan=self.fan, rating=8,
+                                                       original_rating=UNRATED_RATING)
+        session = self.client.session
+        init_rating_action(session, str(UNRATED_RATING), rating, 'rating')
+        session.save()
+        etag = self.get_stable_response('films:films')['ETag']
+
+        # Act.
+        self.now += datetime.timedelta(minutes=1)
+        response = self.client.get(reverse('films:films'), HTTP_IF_NONE_MATCH=etag)
+
+        # Assert.
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_changed_data_renders_pages_again(self):
+        """
+        An attendance, a rating or a vote changes the data stamp, so that the pages are rendered again.
+        """
+        etag_by_view_name = {v: self.get_stable_response(v)['ETag'] for v in self.view_names}
+        changes = {
+            'attendance': lambda: Attendance.attendances.create(fan=self.fan, screening=self.screening),
+            'rating': lambda: FilmFanFilmRating.film_ratings.create(film=self.film, film_fan=self.fan, rating=8,
+                                                                       original_rating=UNRATED_RATING),
+            'vote': lambda: FilmFanFilmVote.film_votes.create(film=self.film, film_fan=self.fan, vote=8),
+        }
+        for change, change_data in changes.items():
+            with self.subTest(change=change):
+                # Arrange.
+                change_data()
+
+                for view_name, etag in etag_by_view_name.items():
+                    # Act.
+                    response = self.client.get(reverse(view_name), HTTP_IF_NONE_MATCH=etag)
+
+                    # Assert.
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertNotEqual(response['ETag'], etag)
+                    etag_by_view_name[view_name] = self.get_stable_response(view_name)['ETag']
+
+    def test_availability_period_renders_pages_again(self):
+        """
+        Adding an availability period through the availability view changes the data stamp of the festival.
+        """
+        # Arrange.
+        view_names = ['screenings:day_schema', 'screenings:calendar', 'screenings:warnings']
+        session = self.client.session
+        session['available_fan'] = self.fan.name
+        session['start_day'] = '2024-08-30'
+        session['start_time'] = '10:00'
+        session['end_day'] = '2024-08-30'
+        session['end_time'] = '14:00'
+        session.save()
+        for view_name in view_names:
+            _ = self.get_stable_response(view_name)
+        etag_by_view_name = {v: self.get_stable_response(v)['ETag'] for v in view_names}
+        session_items = dict(self.client.session.items())
+
+        # Act.
+        response = self.client.post(reverse('availabilities:list'), {'add_confirmed': 'Add'})
+
+        # Restore the session, so that only the data stamp differs from when the pages were received.
+        session = self.client.session
+        session.clear()
+        session.update(session_items)
+        session.save()
+
+        # Assert.
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(Availabilities.availabilities.filter(fan=self.fan).count(), 1)
+        for view_name, etag in etag_by_view_name.items():
+            response = self.client.get(reverse(view_name), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, HTTPStatus.OK, view_name)
+
+    def test_bulk_changes_mark_stamps(self):
+        """
+        Confirming tickets updates them in bulk, bypassing the signals, and marks the data stamps explicitly.
+        """
+        # Arrange.
+        ticket = Ticket.tickets.create(fan=self.fan, screening=self.screening)
+        version = DataStamp.stamps.get(festival=self.festival, fan=self.fan).version
+
+        # Act.
+        committed = ScreeningWarningsForm.confirm_tickets(self.session, [self.fan.name], [self.screening.id], 'confirm')
+
+        # Assert.
+        self.assertIs(committed, True)
+        self.assertEqual(DataStamp.stamps.get(festival=self.festival, fan=self.fan).version, version + 1)
+
+    def test_pages_with_pending_log_are_rendered(self):
+        """
+        A page is rendered again while a log is pending, as the log lines are kept outside the session.
+        """
+        # Arrange.
+        etag = self.get_stable_response('films:films')['ETag']
+        session = self.client.session
+        initialize_log(session)
+        session.save()
+
+        # Act.
+        response = self.client.get(reverse('films:films'), HTTP_IF_NONE_MATCH=etag)
+
+        # Assert.
+        self.assertNotEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+class ProfilingTests(ScreeningViewsTests):
+    def setUp(self):
+        super().setUp()
+        PROFILE_AGGREGATOR.reset()
+
+    def tearDown(self):
+        super().tearDown()
+        PROFILE_AGGREGATOR.reset()
+
+    def arrange_get_day_schema(self):
+        self.arrange_regular_user_props()
+        _ = self.arrange_create_std_screening()
+        response = self.client.get(reverse('screenings:day_schema'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_no_spans_when_profiling_disabled(self):
+        """
+        No spans are recorded when profiling is disabled.
+        """
+        # Act.
+        self.arrange_get_day_schema()
+
+        # Assert.
+        self.assertEqual(PROFILE_AGGREGATOR.report(), {})
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_admin_can_read_profiling_report(self):
+        """
+        The profiling report of the day schema contains the spans of the
+        profiled methods, with their query counts and percentiles.
+        """
+        # Arrange.
+        PROFILE_AGGREGATOR.reset()
+        self.arrange_get_day_schema()
+        _ = self.login(self.admin_credentials)
+
+        # Act.
+        response = self.client.get(reverse('profiling') + '?traces=1')
+
+        # Assert.
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        report = response.json()
+        labels = report['labels']
+        self.assertIs(report['enabled'], True)
+        for label in ['setup', 'queryset', 'context']:
+            self.assertEqual(labels[label]['count'], 1)
+        for label_report in labels.values():
+            self.assertLessEqual(label_report['p50_ms'], label_report['p99_ms'])
+        self.assertGreater(labels['setup']['mean_queries'], 0)
+        request_query_count = labels['request']['mean_queries'] * labels['request']['count']
+        self.assertGreaterEqual(request_query_count, labels['setup']['mean_queries'])
+        day_schema_traces = [t for t in report['traces'] if t['path'] == reverse('screenings:day_schema')]
+        self.assertEqual(len(day_schema_traces), 1)
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_regular_fan_cannot_read_profiling_report(self):
+        """
+        The profiling report is forbidden for fans who aren't admin.
+        """
+        # Arrange.
+        self.arrange_regular_user_props()
+
+        # Act.
+        response = self.client.get(reverse('profiling'))
+
+        # Assert.
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_only_post_resets_profiling_report(self):
+        """
+        Reading the profiling report keeps the statistics, posting to it starts collecting anew.
+        """
+        # Arrange.
+        self.arrange_get_day_schema()
+        _ = self.login(self.admin_credentials)
+
+        # Act.
+        get_response = self.client.get(reverse('profiling') + '?reset=1')
+        labels_after_get = PROFILE_AGGREGATOR.report()
+        post_response = self.client.post(reverse('profiling'))
+
+        # Assert.
+        self.assertEqual(get_response.status_code, HTTPStatus.OK)
+        self.assertIn('setup', labels_after_get)
+        self.assertEqual(post_response.status_code, HTTPStatus.OK)
+        self.assertIn('setup', post_response.json()['labels'])
+        self.assertNotIn('setup', PROFILE_AGGREGATOR.report())
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_profiling_reset_requires_csrf_token(self):
+        """
+        Posting to the profiling report without a CSRF token is forbidden and keeps the statistics.
+        """
+        # Arrange.
+        self.arrange_get_day_schema()
+        self.client = Client(enforce_csrf_checks=True)
+        _ = self.login(self.admin_credentials)
+
+        # Act.
+        response = self.client.post(reverse('profiling'))
+
+        # Assert.
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.assertIn('setup', PROFILE_AGGREGATOR.report())
+
+    def test_nearest_rank_percentile(self):
+        """
+        Percentiles are computed by the nearest-rank method.
+        """
+        # Arrange.
+        values = list(range(1, 101))
+
+        # Act.
+        percentiles = [ProfileAggregator.percentile(values, p) for p in [1, 50, 90, 99, 100]]
+
+        # Assert.
+        self.assertEqual(percentiles, [1, 50, 90, 99, 100])
@@ -1,6 +1,7 @@
 import datetime
 
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views.generic import ListView, FormView
 from django.views.generic.detail import SingleObjectMixin
@@ -8,17 +9,20 @@ from django.views.generic.detail import SingleObjectMixin
 from authentication.models import FilmFan, get_sorted_fan_list, get_fan_by_name
 from availabilities.models import Availabilities
 from availabilities.views import get_festival_dt, DAY_START_TIME, DAY_BREAK_TIME
+from festival_planner.availability_timeline import AvailabilityTimeline
 from festival_planner.cookie import Filter, FestivalDay, Cookie, get_filter_props, get_fan_filter_props
+from festival_planner.data_stamp_store import ConditionalGetMixin
+from festival_planner.day_schema_cache import DaySchemaCache
 from festival_planner.debug_tools import profiled_method, SETUP_PROFILER, QUERY_PROFILER, \
     GET_CONTEXT_PROFILER, LISTVIEW_DISPATCH_PROFILER, ProfiledListView, timed_method
 from festival_planner.fan_action import FanAction
 from festival_planner.fragment_keeper import ScreenFragmentKeeper, FRAGMENT_INDICATOR, ScreeningFragmentKeeper, \
     TOP_CORRECTION_ROWS
 from festival_planner.screening_status_getter import ScreeningStatusGetter, ScreeningWarning, \
-    get_screening_warnings, get_warning_color, get_warnings_keys, get_warnings, get_overlapping_attended_screenings, \
-    get_other_attended_screenings
+    get_warning_color, get_warning_details, get_overlapping_attended_screenings, get_other_attended_screenings
 from festival_planner.shared_template_referrer_view import SharedTemplateReferrerView
 from festival_planner.tools import add_base_context, get_log, unset_log, initialize_log, add_log
+from festival_planner.warning_store import WarningStore
 from festivals.models import current_festival
 from films.models import current_fan, fan_rating, minutes_str, get_present_fans, Film, FilmFanFilmRating
 from films.views import FilmDetailView, get_filmscreening_props_list
@@ -50,8 +54,9 @@ class DaySchemaView(SharedTemplateReferrerView):
         return super().dispatch(request, *args, **kwargs)
 
 
-class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
+class DaySchemaListView(ConditionalGetMixin, LoginRequiredMixin, ProfiledListView):
     template_name = DaySchemaView.template_name
+    row_template_name = 'screenings/day_schema_row.html'
     http_method_names = ['get']
     context_object_name = 'screen_rows'
     fans = FilmFan.film_fans.all()
@@ -67,12 +72,15 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
         self.warning_row_nr_by_screening_id = None
         self.first_screening_warning_count = None
         self.sorted_warnings = None
+        self.warnings_by_screening_id = None
         self.festival = None
         self.selected_screening = None
         self.selected_screening_props = None
         self.status_getter = None
+        self.current_date = None
         self.day_screenings = None
         self.screen_fragment_keeper = None
+        self.top_warning_screening_ids = None
 
     @timed_method
     @profiled_method(duration_profiler=SETUP_PROFILER)
@@ -83,15 +91,15 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
         self.sorted_fans = get_sorted_fan_list(self.fan)
         self.festival = current_festival(session)
         DaySchemaView.current_day.check_festival_day(session)
-        current_date = DaySchemaView.current_day.get_date(session)
+        self.current_date = DaySchemaView.current_day.get_date(session)
         self.selected_screening = ScreeningStatusGetter.get_selected_screening(request)
-        self.day_screenings = Screening.screenings.filter(film__festival=self.festival, start_dt__date=current_date)
-        self.rating_by_fan_by_film = self._get_rating_by_fan_by_film()
-        self.status_getter = ScreeningStatusGetter(request.session, self.day_screenings)
+        day_kwargs = {'film__festival': self.festival, 'start_dt__date': self.current_date}
+        self.day_screenings = Screening.screenings.filter(**day_kwargs).select_related('screen__theater')
         self.screen_fragment_keeper = ScreenFragmentKeeper()
         sorted_warning_rows = self._get_sorted_warning_rows()
         self._get_top_fragments_data(sorted_warning_rows)
         self.sorted_warnings = [row['warning'] for row in sorted_warning_rows]
+        self.warnings_by_screening_id = self._get_warnings_by_screening_id()
 
     def dispatch(self, request, *args, **kwargs):
         cookie = DaySchemaView.current_day.day_cookie
@@ -103,7 +111,9 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
     def get_queryset(self):
         screenings_by_screen = self._get_screenings_by_screen()
         self.screen_fragment_keeper.add_fragments(screenings_by_screen.keys())
-        screen_rows = [self._get_screen_row(i, s, screenings_by_screen[s]) for i, s in enumerate(screenings_by_screen)]
+        version = DaySchemaCache.get_version(self.festival, self.current_date)
+        screen_rows = [self._get_rendered_screen_row(i, s, screenings_by_screen[s], version)
+                       for i, s in enumerate(screenings_by_screen)]
         return screen_rows
 
     @profiled_method(GET_CONTEXT_PROFILER)
@@ -145,6 +155,33 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
         within_festival = FestivalDay.choice_str(next_date) in day_choices
         return FestivalDay.date_str(next_date) if within_festival else None
 
+    def _get_rendered_screen_row(self, screen_nr, screen, screenings, version):
+        """
+        Return the rendered row of the given screen, from the cache if
+        the data of the day didn't change since it was rendered.
+        The row with the selected screening is rendered every time, as
+        it provides the properties of the selected screening.
+        """
+        if self.selected_screening in screenings:
+            return self._render_screen_row(screen_nr, screen, screenings)
+        # The warnings are part of the key, as warnings on other days can change the warnings of this day.
+        warning_keys = tuple((s.id, w.fan.id, w.warning.value, s.id in self.top_warning_screening_ids)
+                             for s in screenings for w in self.warnings_by_screening_id.get(s.id, []))
+        fan_ids = tuple(fan.id for fan in self.sorted_fans)
+        key = (self.festival.id, self.current_date, version, fan_ids, screen_nr, screen.id, warning_keys)
+        screen_row = DaySchemaCache.get_row(key)
+        if screen_row is None:
+            screen_row = self._render_screen_row(screen_nr, screen, screenings)
+            DaySchemaCache.set_row(key, screen_row)
+        return screen_row
+
+    def _render_screen_row(self, screen_nr, screen, screenings):
+        if self.status_getter is None:
+            self.rating_by_fan_by_film = self._get_rating_by_fan_by_film()
+            self.status_getter = ScreeningStatusGetter(self.request.session, self.day_screenings)
+        screen_row = self._get_screen_row(screen_nr, screen, screenings)
+        return render_to_string(self.row_template_name, {'row': screen_row})
+
     def _get_screen_row(self, screen_nr, screen, screenings):
         screening_props = [self._screening_props(s) for s in screenings]
         selected = len([prop['selected'] for prop in screening_props if prop['selected']])
@@ -256,7 +293,7 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
         festival_color = screening.film.festival.festival_color
         _, film_rating_str, rating_color = screening.film_rating_data(status)
         info_str = ("Q " if screening.q_and_a else "") + self._get_fan_props_str(screening)
-        warnings = get_screening_warnings(screening, self.sorted_fans, getter.keeper, getter)
+        warnings = self.warnings_by_screening_id.get(screening.id, [])
         warnings_props = self._get_warning_props(status, warnings)
         frame_color = pair_selected['color'] if selected else festival_color
         section_color = screening.film.subsection.section.color if screening.film.subsection else frame_color
@@ -357,9 +394,18 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
     def _get_sorted_warning_rows(self):
         """Get all warnings, sorted as in the warnings view."""
         sort_key = ScreeningWarningsListView.get_sort_key
-        sorted_warning_rows = sorted(get_warnings(self.festival, self._get_warning), key=sort_key)
+        warning_rows = get_warning_details(WarningStore.get_warnings(self.festival), self._get_warning)
+        sorted_warning_rows = sorted(warning_rows, key=sort_key)
         return sorted_warning_rows
 
+    def _get_warnings_by_screening_id(self):
+        """Get the warnings per screening, sorted by fan as the fans in the schema."""
+        index_by_fan = {fan: i for i, fan in enumerate(self.sorted_fans)}
+        warnings_by_screening_id = {}
+        for warning in sorted(self.sorted_warnings, key=lambda w: index_by_fan.get(w.fan, len(index_by_fan))):
+            warnings_by_screening_id.setdefault(warning.screening.id, []).append(warning)
+        return warnings_by_screening_id
+
     def _get_top_fragments_data(self, sorted_warning_rows):
         # Create a dictionary to find the row by screening.
         self.warning_row_nr_by_screening_id = {row['screening'].id: i for i, row in enumerate(sorted_warning_rows)}
@@ -376,16 +422,15 @@ class DaySchemaListView(LoginRequiredMixin, ProfiledListView):
             warning_count += 1
         self.first_screening_warning_count = warning_count
 
+        # Find the screenings of which the warnings link to the top of the warnings view.
+        top_row_count = max(TOP_CORRECTION_ROWS, self.first_screening_warning_count)
+        row_nr_by_screening_id = self.warning_row_nr_by_screening_id
+        self.top_warning_screening_ids = {s_id for s_id, row in row_nr_by_screening_id.items() if row < top_row_count}
+
     def _get_warning_fragment(self, screening):
-        warn_fragment = ScreeningFragmentKeeper.fragment_code(screening)
-        try:
-            row = self.warning_row_nr_by_screening_id[screening.id]
-        except KeyError:
-            pass
-        else:
-            if row < max(TOP_CORRECTION_ROWS, self.first_screening_warning_count):
-                warn_fragment = '#top'
-        return warn_fragment
+        if screening.id in self.top_warning_screening_ids:
+            return '#top'
+        return ScreeningFragmentKeeper.fragment_code(screening)
 
 
 class DaySchemaFormView(LoginRequiredMixin, FormView):
@@ -534,6 +579,7 @@ class PlannerListView(LoginRequiredMixin, ListView):
         super().__init__()
         self.planned_screening_count = None
         self.sorted_eligible_screenings = None
+        self.timeline = None
 
     @timed_method
     def setup(self, request, *args, **kwargs):
@@ -541,6 +587,7 @@ class PlannerListView(LoginRequiredMixin, ListView):
         PlannerView.festival = current_festival(request.session)
         PlannerView.eligible_films = self._get_eligible_films()
         self.fan = current_fan(request.session)
+        self.timeline = AvailabilityTimeline.for_festival(PlannerView.festival)
 
     @timed_method
     def get_queryset(self):
@@ -560,6 +607,7 @@ class PlannerListView(LoginRequiredMixin, ListView):
     def get_context_data(self, *, object_list=None, **kwargs):
         super_context = super().get_context_data(**kwargs)
         session = self.request.session
+        warnings = WarningStore.get_warnings(PlannerView.festival)
         new_context = {
             'title': 'Screenings Planner',
             'sub_header': 'Hit the button and plan your films automatically',
@@ -567,7 +615,7 @@ class PlannerListView(LoginRequiredMixin, ListView):
             'planned_screening_count': self.planned_screening_count,
             'eligible_screening_count': len(self.sorted_eligible_screenings),
             'eligible_screening_rows': self.sorted_eligible_screenings,
-            'warning_stats': ScreeningWarning.get_warning_stats(PlannerView.festival),
+            'warning_stats': ScreeningWarning.get_warning_stats(PlannerView.festival, warnings),
             'form_errors': PlannerForm.tracer.get_errors() if PlannerForm.tracer else [],
             'log': get_log(session),
         }
@@ -595,7 +643,7 @@ class PlannerListView(LoginRequiredMixin, ListView):
             'screen_name': str(screening.screen),
             'film': film,
             'filmscreening_count': filmscreenings(film).count(),
-            'available_filmscreening_count': len(get_available_filmscreenings(film, self.fan)),
+            'available_filmscreening_count': len(get_available_filmscreenings(film, self.fan, self.timeline)),
             'attendants': screening.attendants_str(),
             'fan_ratings_str': fans_rating_str,
             'film_rating_str': film_rating_str,
@@ -612,12 +660,12 @@ class PlannerListView(LoginRequiredMixin, ListView):
             'screening': screening,
             'query_string': querystring,
             'fragment': fragment,
-            'available_fans_str': ', '.join([fan.name for fan in screening.get_available_fans()]),
+            'available_fans_str': ', '.join([fan.name for fan in screening.get_available_fans(self.timeline)]),
             'highest_rating': highest_rating,
             'second_highest_rating': second_highest_rating,
             'q_and_a': screening.q_and_a,
             'attendants_str': screening.attendants_str(),
-            'available_filmscreening_count': len(get_available_filmscreenings(film, self.fan)),
+            'available_filmscreening_count': len(get_available_filmscreenings(film, self.fan, self.timeline)),
             'theater_prio': Theater.Priority(screening.screen.theater.priority).label,
             'duration': screening.duration(),
             'start_dt': screening.start_dt,
@@ -633,7 +681,7 @@ class PlannerListView(LoginRequiredMixin, ListView):
         }
         screenings = Screening.screenings.filter(**kwargs)
         fan = current_fan(self.request.session)
-        sorted_screenings = PlannerForm.get_sorted_eligible_screenings(screenings, fan)
+        sorted_screenings = PlannerForm.get_sorted_eligible_screenings(screenings, fan, self.timeline)
         return sorted_screenings
 
 
@@ -666,7 +714,7 @@ class ScreeningCalendarView(SharedTemplateReferrerView):
         self.form_view = ScreeningCalendarFormView
 
 
-class ScreeningCalendarListView(LoginRequiredMixin, ListView):
+class ScreeningCalendarListView(ConditionalGetMixin, LoginRequiredMixin, ListView):
     template_name = ScreeningCalendarView.template_name
     http_method_names = ['get']
     context_object_name = 'attended_screening_rows'
@@ -745,18 +793,18 @@ class ScreeningWarningsView(SharedTemplateReferrerView):
         self.form_view = ScreeningWarningsFormView
 
 
-class ScreeningWarningsListView(LoginRequiredMixin, ProfiledListView):
+class ScreeningWarningsListView(ConditionalGetMixin, LoginRequiredMixin, ProfiledListView):
     template_name = ScreeningWarningsView.template_name
     http_method_names = ['get']
     context_object_name = 'warning_rows'
     fans = None
     status_getter = None
     fragment_keeper = None
-    warnings = None
 
     def __init__(self):
         super().__init__()
         self.fan = None
+        self.warnings = None
         self.filter_by_fan = None
         self.filter_by_warning_type = None
         self.reset_filter = None
@@ -801,17 +849,16 @@ class ScreeningWarningsListView(LoginRequiredMixin, ProfiledListView):
         festival = current_festival(session)
 
         # Prepare a screening status getter.
-        keys_set = get_warnings_keys(festival)
-        screenings = {screening for screening, fan in keys_set}
+        warnings = WarningStore.get_warnings(festival)
+        screenings = {warning.screening for warning in warnings}
         self.status_getter = ScreeningStatusGetter(session, screenings)
 
         # Get the queryset.
-        warning_rows = get_warnings(festival, self._get_warning_details, keys_set=keys_set)
+        warning_rows = get_warning_details(warnings, self._get_warning_details)
         sorted_warning_rows = sorted(warning_rows, key=self.get_sort_key)
 
-        # Store the warnings for use in warning stats mini-view.
+        # Keep the warnings for use in warning stats mini-view.
         self.warnings = [row['warning'] for row in sorted_warning_rows]
-        self._set_warnings(self.warnings)
 
         # Set fragments for the screenings in the view.
         self.fragment_keeper.add_fragment_data(sorted_warning_rows)
@@ -831,7 +878,7 @@ class ScreeningWarningsListView(LoginRequiredMixin, ProfiledListView):
         new_context = {
             'title': 'Warnings',
             'sub_header': 'Warnings per screening per fan',
-            'warnings': len(ScreeningWarningsListView.warnings),
+            'warnings': len(self.warnings),
             'screening': ScreeningStatusGetter.get_selected_screening(self.request),
             'selected_background': COLOR_PAIR_SELECTED['background'],
             'fan_filter_props': self._get_fan_filter_props(),
@@ -973,10 +1020,6 @@ class ScreeningWarningsListView(LoginRequiredMixin, ProfiledListView):
         session = self.request.session
         return get_fan_filter_props(session, self.warnings, self.fans, self.filter_by_fan)
 
-    @classmethod
-    def _set_warnings(cls, warnings):
-        cls.warnings = warnings
-
     def _get_choices(self, warning):
         fan = warning.fan
         screening = warning.screening
@@ -1052,13 +1095,13 @@ class ScreeningWarningsListView(LoginRequiredMixin, ProfiledListView):
 
         return choices
 
-    @staticmethod
-    def _get_attends_overlapping_choices(fan, screening):
+    def _get_attends_overlapping_choices(self, fan, screening):
         warning_type = ScreeningWarning.WarningType.ATTENDS_OVERLAPPING
         fix_wording = ScreeningWarning.fix_by_warning[warning_type]
 
         # Create choices for each overlapping screening.
-        overlap_screenings = get_overlapping_attended_screenings(screening, fan, first_only=False)
+        kwargs = {'first_only': False, 'interval_index': self.status_getter.interval_index}
+        overlap_screenings = get_overlapping_attended_screenings(screening, fan, **kwargs)
         overlap_choices = []
         for screening in overlap_screenings:
             overlap_choice = {
@@ -1155,13 +1198,13 @@ class ScreeningWarningsFormView(LoginRequiredMixin, FormView):
         _ = fix_method(self.session, [fan_name], other_screening_id, wording)
 
     def _fix_screening_tickets(self, warning_type, screening_id, fix_method):
-        warnings = ScreeningWarningsListView.warnings
+        warnings = WarningStore.get_warnings(current_festival(self.session))
         fan_names = [w.fan.name for w in warnings if w.screening.id == int(screening_id) and w.warning == warning_type]
         wording = self._get_wording_for_fix(warning_type)
         _ = fix_method(self.session, fan_names, [screening_id], wording)
 
     def _fix_fan_tickets(self, warning_type, fan_name, fix_method):
-        warnings = ScreeningWarningsListView.warnings
+        warnings = WarningStore.get_warnings(current_festival(self.session))
         screening_ids = [w.screening.id for w in warnings if w.fan.name == fan_name and w.warning == warning_type]
         wording = self._get_wording_for_fix(warning_type)
         _ = fix_method(self.session, [fan_name], screening_ids, wording)
@@ -1,6 +1,7 @@
 from operator import attrgetter
 
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Count
 from django.forms import formset_factory
 from django.http import HttpResponseRedirect
 from django.urls import reverse
@@ -38,8 +39,10 @@ class TheatersListView(LoginRequiredMixin, ListView):
     context_object_name = 'theater_rows'
 
     def get_queryset(self):
-        theater_list = sorted(Theater.theaters.all(), key=attrgetter('city.name', 'abbreviation'))
-        theater_rows = [self.get_theater_row(theater) for theater in theater_list]
+        theater_list = sorted(Theater.theaters.select_related('city'), key=attrgetter('city.name', 'abbreviation'))
+        screen_counts = Screen.screens.values_list('theater_id').annotate(count=Count('pk')).order_by()
+        screen_count_by_theater_id = dict(screen_counts)
+        theater_rows = [self.get_theater_row(theater, screen_count_by_theater_id) for theater in theater_list]
         return sorted(theater_rows, key=lambda row: row['is_festival_city'], reverse=True)
 
     def get_context_data(self, *, object_list=None, **kwargs):
@@ -50,9 +53,9 @@ class TheatersListView(LoginRequiredMixin, ListView):
         context['log'] = get_log(session)
         return context
 
-    def get_theater_row(self, theater):
+    def get_theater_row(self, theater, screen_count_by_theater_id):
         session = self.request.session
-        is_festival_city = current_festival(session).base.home_city == theater.city
+        is_festival_city = current_festival(session).base.home_city_id == theater.city_id
         priority_choices = self._get_priority_choices(theater)
         theater_row = {
             'is_festival_city': is_festival_city,
@@ -60,7 +63,7 @@ class TheatersListView(LoginRequiredMixin, ListView):
             'priority_color': Theater.color_by_priority[theater.priority],
             'priority_label': TheatersView.label_by_priority[theater.priority],
             'priority_choices': priority_choices,
-            'screen_count': Screen.screens.filter(theater=theater).count()
+            'screen_count': screen_count_by_theater_id.get(theater.id, 0),
         }
         return theater_row
 
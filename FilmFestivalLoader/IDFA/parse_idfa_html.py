@@ -18,7 +18,7 @@ from typing import Dict
 import yaml
 
 from Shared.application_tools import ErrorCollector, DebugRecorder, comment, Counter, broadcast, pr_info, Config
-from Shared.parse_tools import FileKeeper, HtmlPageParser, try_parse_festival_sites
+from Shared.parse_tools import FileKeeper, HtmlPageParser, try_parse_festival_sites, ParseStage
 from Shared.planner_interface import FestivalData, Screening, FilmInfo, ScreenedFilm, get_screen_from_parse_name, \
     AUDIENCE_PUBLIC
 from Shared.web_tools import UrlFile
@@ -178,18 +178,24 @@ def get_theme_parts(festival_data, theme_path_key, target_file):
 def get_films_by_theme(festival_data, theme_urls, theme_str):
     """Read the films from each of the given pathway URLs."""
     comment(f'Finding films per {theme_str} theme ({len(theme_urls)} {theme_str}s)')
+    pages = []
     for i, theme_url in enumerate(theme_urls):
         theme_file = FILE_KEEPER.numbered_webdata_file(theme_str, i)
         url_file = UrlFile(theme_url, theme_file, ERROR_COLLECTOR, DEBUG_RECORDER, byte_count=200)
         comment_ = f'Downloading {theme_url} as to find the {theme_str} parts of the encountered films'
         theme_html = url_file.get_text(always_download=ALWAYS_DOWNLOAD, comment_at_download=comment_)
         if theme_html:
-            comment(f'Analysing {theme_str} page {i}, encoding={url_file.encoding}')
-            match theme_str:
-                case('sections'):
-                    FilmsFromSectionPageParser(festival_data, theme_url).feed(theme_html)
-                case(_):
-                    FilmsFromPathwayPageParser(festival_data, theme_url).feed(theme_html)
+            pages.append((i, theme_url, url_file.encoding, theme_html))
+
+    # Tokenize the pages in parallel, then parse them in the original order.
+    theme_events = ParseStage().record_all([theme_html for *_, theme_html in pages])
+    for (i, theme_url, encoding, _), events in zip(pages, theme_events):
+        comment(f'Analysing {theme_str} page {i}, encoding={encoding}')
+        match theme_str:
+            case('sections'):
+                FilmsFromSectionPageParser(festival_data, theme_url).feed(events)
+            case(_):
+                FilmsFromPathwayPageParser(festival_data, theme_url).feed(events)
 
 
 def get_film_from_theme_part_page(festival_data, film_title, film_url, theme_part_url, use_section_keeper=True):
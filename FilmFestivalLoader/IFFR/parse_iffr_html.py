@@ -7,10 +7,10 @@ from enum import Enum, auto
 from urllib.error import HTTPError
 
 from Shared.application_tools import ErrorCollector, DebugRecorder, comment, Config, Counter, broadcast
-from Shared.parse_tools import FileKeeper, try_parse_festival_sites, HtmlPageParser
+from Shared.parse_tools import FileKeeper, try_parse_festival_sites, HtmlPageParser, ParseStage
 from Shared.planner_interface import FilmInfo, Screening, ScreenedFilmType, FestivalData, Film, \
     get_screen_from_parse_name, link_screened_film, CATEGORY_FIELD_FILMS, CATEGORY_FIELD_EVENTS
-from Shared.web_tools import UrlFile, iri_slug_to_url, fix_json, paths_eq
+from Shared.web_tools import UrlFile, iri_slug_to_url, fix_json, paths_eq, get_url_files
 
 FESTIVAL = 'IFFR'
 FESTIVAL_YEAR = 2026
@@ -133,14 +133,26 @@ def has_category(film, category):
 
 def get_film_details(festival_data, category, category_name, always_download=ALWAYS_DOWNLOAD):
     films = [film for film in festival_data.films if has_category(film, category)]
+    path_by_url = {film.url: FILE_KEEPER.film_webdata_file(film.film_id) for film in films}
+    url_files = get_url_files(path_by_url, ERROR_COLLECTOR, DEBUG_RECORDER, byte_count=300,
+                              always_download=always_download)
+    url_file_by_url = {url_file.url: url_file for url_file in url_files}
+    pages = []
     for film in films:
-        film_file = FILE_KEEPER.film_webdata_file(film.film_id)
-        url_file = UrlFile(film.url, film_file, ERROR_COLLECTOR, DEBUG_RECORDER, byte_count=300)
+        try:
+            url_file = url_file_by_url[film.url]
+        except KeyError:
+            continue
         comment_at_download = f'Downloading site of {film.title}: {film.url}, encoding: {url_file.encoding}'
         film_html = url_file.get_text(always_download=always_download, comment_at_download=comment_at_download)
         if film_html is not None:
-            print(f'Analysing html file {film.film_id} of {category_name} {film.title}')
-            FilmInfoPageParser(festival_data, film, url_file.encoding).feed(film_html)
+            pages.append((film, url_file.encoding, film_html))
+
+    # Tokenize the pages in parallel, then parse them in the original order.
+    film_events = ParseStage().record_all([film_html for _, _, film_html in pages])
+    for (film, encoding, _), events in zip(pages, film_events):
+        print(f'Analysing html file {film.film_id} of {category_name} {film.title}')
+        FilmInfoPageParser(festival_data, film, encoding).feed(events)
     # FilmInfoPageParser.set_combinations(festival_data) -> Keep this
     # code since it's very simple and could be preferred in future
     # editions of IFFR.
@@ -8,7 +8,7 @@ from html import unescape
 from typing import Dict
 
 from Shared.application_tools import ErrorCollector, DebugRecorder, Counter, comment
-from Shared.parse_tools import HtmlPageParser, FileKeeper, try_parse_festival_sites
+from Shared.parse_tools import HtmlPageParser, FileKeeper, try_parse_festival_sites, ParseStage
 from Shared.planner_interface import FilmInfo, FestivalData, link_screened_film, Screening
 from Shared.web_tools import UrlFile, UrlReader, iri_slug_to_url, get_netloc
 
@@ -118,11 +118,30 @@ def experiment_get_trouw_films():
 
 
 def get_films_by_url(festival_data, charset_by_film_url):
+    # Tokenize the pages of films with a known number in parallel.
+    known_urls = [url for url in charset_by_film_url if is_unparsed_known_film(festival_data, url)]
+    film_htmls = [get_known_film_html(festival_data, url) for url in known_urls]
+    events_by_url = dict(zip(known_urls, ParseStage().record_all(film_htmls)))
+
+    # Parse the films in the original order.
     for film_url, charset in charset_by_film_url.items():
-        get_film_by_url(festival_data, film_url, charset)
+        get_film_by_url(festival_data, film_url, charset, events_by_url)
+
+
+def is_unparsed_known_film(festival_data, url):
+    film_id = festival_data.film_id_by_url.get(url)
+    return film_id is not None and festival_data.get_film_by_id(film_id) is None
+
+
+def get_known_film_html(festival_data, url):
+    film_id = festival_data.film_id_by_url[url]
+    film_file = FILE_KEEPER.film_webdata_file(film_id)
+    url_file = UrlFile(url, film_file, ERROR_COLLECTOR, DEBUG_RECORDER, byte_count=500)
+    comment_at_download = f'Downloading film site: {url}, encoding: {url_file.encoding}'
+    return url_file.get_text(always_download=ALWAYS_DOWNLOAD, comment_at_download=f'{comment_at_download}')
 
 
-def get_film_by_url(festival_data, url, charset):
+def get_film_by_url(festival_data, url, charset, events_by_url):
     # Try if the film to be read already has a number.
     try:
         film_id = festival_data.film_id_by_url[url]
@@ -130,16 +149,12 @@ def get_film_by_url(festival_data, url, charset):
         get_film_from_url(festival_data, url, charset)
     else:
         film = festival_data.get_film_by_id(film_id)
-        if film is None:
-            film_file = FILE_KEEPER.film_webdata_file(film_id)
-            url_file = UrlFile(url, film_file, ERROR_COLLECTOR, DEBUG_RECORDER, byte_count=500)
-            comment_at_download = f'Downloading film site: {url}, encoding: {url_file.encoding}'
-            film_html = url_file.get_text(always_download=ALWAYS_DOWNLOAD, comment_at_download=f'{comment_at_download}')
-            if film_html is not None:
-                print(f'Analysing html file {film_id} of {url}')
-                film_parser = FilmPageParser(festival_data, url)
-                film_parser.feed(film_html)
-                ScreeningsPageParser(festival_data, film_parser.film, film_parser.subtitles).feed(film_html)
+        film_events = events_by_url.get(url)
+        if film is None and film_events is not None:
+            print(f'Analysing html file {film_id} of {url}')
+            film_parser = FilmPageParser(festival_data, url)
+            film_parser.feed(film_events)
+            ScreeningsPageParser(festival_data, film_parser.film, film_parser.subtitles).feed(film_events)
 
 
 def get_film_from_url(festival_data, url, encoding):
@@ -6,7 +6,9 @@ Created on Tue Oct 20 22:11:21 2020
 @author: maarten
 """
 import os
+import threading
 from datetime import datetime
+from types import MappingProxyType
 import inspect
 import yaml
 
@@ -15,7 +17,7 @@ COMMON_CONFIG_PATH = os.path.expanduser('~/Projects/FilmFestivalPlanner/Configs/
 
 
 def config():
-    return Config().config
+    return Config.load(COMMON_CONFIG_PATH)
 
 
 def comment(text):
@@ -32,13 +34,47 @@ def broadcast(message, debugger):
     debugger.add(message)
 
 
+def freeze(value):
+    """Return a read-only view of the given parsed YAML value."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
 class Config:
+    """
+    Reads a YAML configuration file once per process and shares the
+    result as a read-only view. The file is only read again when its
+    modification time changes.
+    """
     config = None
+    entry_by_path = {}
+    parse_count = 0
+    lock = threading.Lock()
 
     def __init__(self, path=None):
         self.config_path = path or COMMON_CONFIG_PATH
-        with open(self.config_path, 'r') as stream:
-            self.config = yaml.safe_load(stream)
+        self.config = self.load(self.config_path)
+
+    @classmethod
+    def load(cls, path):
+        mtime = os.stat(path).st_mtime_ns
+        with cls.lock:
+            entry = cls.entry_by_path.get(path)
+        if entry is None or entry[0] != mtime:
+            with open(path, 'r') as stream:
+                entry = (mtime, freeze(yaml.safe_load(stream)))
+            with cls.lock:
+                cls.entry_by_path[path] = entry
+                cls.parse_count += 1
+        return entry[1]
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entry_by_path = {}
 
 
 class Counter:
@@ -8,11 +8,14 @@ Created on Fri Oct 7 22:24:00 2022
 import datetime
 import inspect
 import os
+from concurrent.futures import ProcessPoolExecutor
 from html.parser import HTMLParser
 
 from Shared.application_tools import comment, config, broadcast
 from Shared.planner_interface import Screening, write_lists, AUDIENCE_PUBLIC
 
+MIN_PARALLEL_PAGES = 8
+
 
 def try_parse_festival_sites(parser, festival_data, error_collector, debug_recorder, festival=None, counter=None):
     # Set defaults when necessary.
@@ -202,6 +205,12 @@ class BaseHtmlPageParser(HTMLParser):
     def handle_decl(self, data):
         self.print_debug('Decl     :', data)
 
+    def feed(self, data):
+        if isinstance(data, HtmlEvents):
+            data.replay(self)
+        else:
+            super().feed(data)
+
 
 class HtmlPageParser(BaseHtmlPageParser):
 
@@ -281,5 +290,86 @@ class HtmlPageParser(BaseHtmlPageParser):
             self.article = ''
 
 
+class HtmlEvents:
+    """
+    Plain records of the handler calls an HTMLParser makes while being
+    fed a page. Feeding them to a page parser replays the calls, with
+    the same result as feeding the page itself.
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+    def __len__(self):
+        return len(self.events)
+
+    def replay(self, parser):
+        for handler_name, *args in self.events:
+            getattr(parser, handler_name)(*args)
+
+
+class HtmlEventRecorder(HTMLParser):
+    """
+    Tokenizes a page like the page parsers do, recording the handler
+    calls instead of acting on them.
+    """
+    handler_names = [
+        'handle_starttag', 'handle_startendtag', 'handle_endtag', 'handle_data',
+        'handle_comment', 'handle_decl', 'handle_pi', 'unknown_decl',
+    ]
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        for handler_name in self.handler_names:
+            setattr(self, handler_name, self._get_recorder(handler_name))
+
+    def _get_recorder(self, handler_name):
+        def record(*args):
+            self.events.append((handler_name, *args))
+        return record
+
+
+def record_html_events(html):
+    """Return the events of the given page, None if there is no page."""
+    if html is None:
+        return None
+    recorder = HtmlEventRecorder()
+    recorder.feed(html)
+    return HtmlEvents(recorder.events)
+
+
+class ParseStage:
+    """
+    Tokenizes HTML pages in a pool of worker processes.
+
+    The workers return the events of each page as plain records. The
+    page parsers, which update the festival data, are fed these events
+    in the main process in the order of the pages, so the festival data
+    end up the same as when the pages were fed one by one.
+    """
+
+    def __init__(self, max_workers=None, min_pages=MIN_PARALLEL_PAGES):
+        """
+        :param max_workers: Number of worker processes, the number of cores if None
+        :param min_pages: Minimum number of pages to make starting the workers worthwhile
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_pages = min_pages
+
+    def record_all(self, htmls):
+        """
+        Return the events of the given pages in the order of the pages,
+        None for pages that are None.
+        """
+        htmls = list(htmls)
+        if self.max_workers == 1 or len(htmls) < self.min_pages:
+            return [record_html_events(html) for html in htmls]
+        comment(f'Tokenizing {len(htmls)} pages in {self.max_workers} processes.')
+        chunksize = max(1, len(htmls) // (4 * self.max_workers))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(record_html_events, htmls, chunksize=chunksize))
+
+
 if __name__ == "__main__":
     print("This module is not executable.")
@@ -24,7 +24,7 @@ INTERFACE_MEDIUM_CATEGORIES = config()['MediumCategories']
 SHARED_CONFIG = Config(os.path.join(LOADER_SHARED_DIR, 'loader_config.yml')).config
 
 ARTICLES_FILE = os.path.join(INTERFACE_DIR, "articles.txt")
-FILMS_FILE_HEADER = config()['Headers']['FilmsFileHeader']
+FILMS_FILE_HEADER = list(config()['Headers']['FilmsFileHeader'])
 AUDIENCE_PUBLIC = 'publiek'
 
 CATEGORY_FIELD_FILMS = 'films'
@@ -212,14 +212,10 @@ class Film:
             return 'en'
 
     def screenings(self, festival_data):
-        return [s for s in festival_data.screenings if s.film.film_id == self.film_id]
+        return festival_data.get_screenings_by_film_id(self.film_id)
 
     def film_info(self, festival_data):
-        infos = [i for i in festival_data.film_infos if i.film_id == self.film_id]
-        try:
-            return infos[0]
-        except IndexError:
-            return FilmInfo(None, '', '')
+        return festival_data.get_film_info(self.film_id) or FilmInfo(None, '', '')
 
     def is_part_of_combination(self, festival_data):
         return len(self.film_info(festival_data).combination_films) > 0
@@ -502,6 +498,56 @@ class ScreeningKey:
         return hash((self.screen, self.start_dt, self.end_dt))
 
 
+class IndexedList(list):
+    """
+    List that reports items being appended and other changes, so that
+    the owner can keep indexes of the items up to date.
+    """
+
+    def __init__(self, iterable=(), on_add=None, on_change=None):
+        super().__init__()
+        self.on_add = on_add
+        self.on_change = on_change
+        self.extend(iterable)
+
+    def append(self, item):
+        super().append(item)
+        self.on_add(item)
+
+    def extend(self, iterable):
+        for item in iterable:
+            self.append(item)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self.on_change()
+
+    def remove(self, item):
+        super().remove(item)
+        self.on_change()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self.on_change()
+        return item
+
+    def clear(self):
+        super().clear()
+        self.on_change()
+
+    def __setitem__(self, index, item):
+        super().__setitem__(index, item)
+        self.on_change()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.on_change()
+
+
 class FestivalData:
     curr_city_id = None
     curr_theater_id = None
@@ -516,6 +562,10 @@ class FestivalData:
     def __init__(self, default_city_name, plandata_dir, common_data_dir=None):
         self.default_city_name = default_city_name
         self.common_data_dir = common_data_dir or self.common_data_dir
+        self.film_by_id = {}
+        self.film_info_by_id = {}
+        self.screenings_by_film_id = {}
+        self.screenings_by_screen_id = {}
         self.films = []
         self.film_infos = []
         self.screenings = []
@@ -553,6 +603,77 @@ class FestivalData:
         self.read_screens()
         self.read_film_ids()
 
+    @property
+    def films(self):
+        return self._films
+
+    @films.setter
+    def films(self, films):
+        self._films = IndexedList(on_add=self._index_film, on_change=self._reindex_films)
+        self._reindex_films()
+        self._films.extend(films)
+
+    @property
+    def film_infos(self):
+        return self._film_infos
+
+    @film_infos.setter
+    def film_infos(self, film_infos):
+        self._film_infos = IndexedList(on_add=self._index_film_info, on_change=self._reindex_film_infos)
+        self._reindex_film_infos()
+        self._film_infos.extend(film_infos)
+
+    @property
+    def screenings(self):
+        return self._screenings
+
+    @screenings.setter
+    def screenings(self, screenings):
+        self._screenings = IndexedList(on_add=self._index_screening, on_change=self._reindex_screenings)
+        self._reindex_screenings()
+        self._screenings.extend(screenings)
+
+    def _index_film(self, film):
+        self.film_by_id.setdefault(film.film_id, film)
+
+    def _reindex_films(self):
+        self.film_by_id = {}
+        for film in self._films:
+            self._index_film(film)
+
+    def _index_film_info(self, film_info):
+        self.film_info_by_id.setdefault(film_info.film_id, film_info)
+
+    def _reindex_film_infos(self):
+        self.film_info_by_id = {}
+        for film_info in self._film_infos:
+            self._index_film_info(film_info)
+
+    def _index_screening(self, screening):
+        try:
+            self.screenings_by_film_id[screening.film.film_id].append(screening)
+        except KeyError:
+            self.screenings_by_film_id[screening.film.film_id] = [screening]
+        try:
+            self.screenings_by_screen_id[screening.screen.screen_id].append(screening)
+        except KeyError:
+            self.screenings_by_screen_id[screening.screen.screen_id] = [screening]
+
+    def _reindex_screenings(self):
+        self.screenings_by_film_id = {}
+        self.screenings_by_screen_id = {}
+        for screening in self._screenings:
+            self._index_screening(screening)
+
+    def get_film_info(self, film_id):
+        return self.film_info_by_id.get(film_id)
+
+    def get_screenings_by_film_id(self, film_id):
+        return list(self.screenings_by_film_id.get(film_id, []))
+
+    def get_screenings_by_screen(self, screen):
+        return list(self.screenings_by_screen_id.get(screen.screen_id, []))
+
     def set_csv_dialect(self):
         self.dialect = csv.unix_dialect
         self.dialect.delimiter = ';'
@@ -574,7 +695,7 @@ class FestivalData:
 
     def create_film(self, title, url, duration=None, medium_category=None):
         film_id = self.new_film_id(self.film_key(title, url))
-        if film_id not in [f.film_id for f in self.films]:
+        if film_id not in self.film_by_id:
             if not title:
                 raise ValueError(film_id)
             self.film_seqnr += 1
@@ -609,20 +730,15 @@ class FestivalData:
         except KeyError:
             raise KeyError(f'Key ({key}) not found in film dictionary')
         else:
-            films = [film for film in self.films if film.film_id == film_id]
-            if films:
-                film = films[0]
-            else:
+            film = self.get_film_by_id(film_id)
+            if film is None:
                 film = self.create_film(title, url)
                 if film:
                     self.films.append(film)
         return film
 
     def get_film_by_id(self, film_id):
-        films = [f for f in self.films if f.film_id == film_id]
-        if len(films) > 0:
-            return films[0]
-        return None
+        return self.film_by_id.get(film_id)
 
     def get_section(self, name, color=None, color_by_id=None):
         def _get_color(section_id, color_):
@@ -919,7 +1035,8 @@ class FestivalData:
         return screening.is_public() and not screening.film.is_part_of_combination(self)
 
     def film_can_go_to_planner(self, film_id):
-        return len([s for s in self.screenings if s.film.film_id == film_id and self.screening_can_go_to_planner(s)]) > 0
+        screenings = self.screenings_by_film_id.get(film_id, [])
+        return any(self.screening_can_go_to_planner(s) for s in screenings)
 
     def write_films(self):
         public_films = [f for f in self.films if self.film_can_go_to_planner(f.film_id)]
@@ -8,11 +8,14 @@ Created on Mon Nov  2 18:27:20 2020
 
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, auto
-from http.client import InvalidURL
+from http.client import InvalidURL, HTTPConnection, HTTPSConnection, HTTPException
 from json import JSONDecodeError
 from urllib.error import HTTPError
-from urllib.parse import quote, urlparse, urlunparse
+from urllib.parse import quote, urlparse, urlunparse, urljoin
 from urllib.request import urlopen, Request
 
 from Shared.parse_tools import BaseHtmlPageParser
@@ -20,6 +23,14 @@ from Shared.parse_tools import BaseHtmlPageParser
 DEFAULT_BYTE_COUNT = 512
 DEFAULT_ENCODING = 'ascii'
 DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MIN_INTERVAL = 0.2
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+MAX_REDIRECTS = 5
+REDIRECT_CODES = [301, 302, 303, 307, 308]
+RETRY_CODES = [429, 500, 502, 503, 504]
+URL_SAFE_CHARS = "/%:@&=+$,;~!*'()?#[]"
 
 
 def iri_slug_to_url(host, slug):
@@ -64,6 +75,15 @@ def get_encoding_from_file(file, debug_recorder, byte_count=DEFAULT_BYTE_COUNT):
     return charset
 
 
+def get_encoding_from_page(page, debug_recorder, byte_count=DEFAULT_BYTE_COUNT):
+    """Get the encoding from the response headers or else from the first bytes of the given page."""
+    encoding = page.charset
+    if encoding is None and page.html_bytes:
+        sample_text = page.html_bytes[:byte_count].decode('latin-1')
+        encoding = get_encoding_from_bytes(sample_text, debug_recorder)
+    return encoding
+
+
 def get_encoding_from_bytes(html_bytes, debug_recorder):
     charset_parser = HtmlCharsetParser(debug_recorder)
     charset = charset_parser.get_charset(html_bytes)
@@ -103,17 +123,45 @@ def get_home_page(home_url, file_keeper, error_collector, debug_recorder):
         print(f'Home page read into {home_file}, encoding={url_file.encoding}')
 
 
+def get_url_files(path_by_url, error_collector, debug_recorder, byte_count=None, always_download=False, fetcher=None):
+    """Return url files for the given urls, downloading the missing pages in parallel.
+
+    @param path_by_url: Dictionary of target file paths by url.
+    @param error_collector: ErrorCollector instance to add fetch errors to.
+    @param debug_recorder: DebugRecorder instance to be used by the charset parser.
+    @param byte_count: Number of bytes to search for a charset when the response headers have none.
+    @param always_download: Download all pages, whether the target file exists or not.
+    @param fetcher: Optional PageFetcher instance, a default one is used if omitted.
+    @return: List of UrlFile instances in the order of the given urls, pages that failed to download excluded.
+    """
+    download_urls = [url for url, path in path_by_url.items() if always_download or not os.path.isfile(path)]
+    if download_urls:
+        print(f'Downloading {len(download_urls)} pages.')
+    with fetcher or PageFetcher(error_collector) as page_fetcher:
+        page_by_url = page_fetcher.fetch_all(download_urls)
+    url_files = []
+    for url, path in path_by_url.items():
+        page = page_by_url.get(url)
+        if url in page_by_url and page is None:
+            continue
+        url_files.append(UrlFile(url, path, error_collector, debug_recorder, byte_count=byte_count, page=page))
+    return url_files
+
+
 class UrlFile:
     default_byte_count = DEFAULT_BYTE_COUNT
     default_encoding = DEFAULT_ENCODING
 
-    def __init__(self, url, path, error_collector, debug_recorder, byte_count=None, reraise_codes=None):
+    def __init__(self, url, path, error_collector, debug_recorder, byte_count=None, reraise_codes=None,
+                 page=None, fetcher=None):
         self.url = url
         self.path = path
         self.error_collector = error_collector
         self.debug_recorder = debug_recorder
         self.byte_count = byte_count or self.default_byte_count
         self.reraise_codes = reraise_codes or []
+        self.page = page
+        self.fetcher = fetcher
         self.encoding = None
         try:
             self.set_encoding()
@@ -131,24 +179,195 @@ class UrlFile:
         else:
             if comment_at_download:
                 print(comment_at_download)
-            reader = UrlReader(self.error_collector)
-            html_text = reader.load_url(self.url, target_file=self.path, encoding=self.encoding)
+            if self.page is not None:
+                html_text = self.page_to_text()
+            else:
+                reader = UrlReader(self.error_collector)
+                html_text = reader.load_url(self.url, target_file=self.path, encoding=self.encoding)
         return html_text
 
+    def page_to_text(self):
+        """Write the already downloaded page to file and return its text."""
+        html_bytes = self.page.html_bytes
+        if len(html_bytes) == 0:
+            self.error_collector.add(f'No text found, file {self.path} not written', f'{self.url}')
+        else:
+            with open(self.path, 'wb') as f:
+                f.write(html_bytes)
+        return html_bytes.decode(encoding=self.encoding)
+
     def set_encoding(self):
         if self.encoding is None:
-            if os.path.isfile(self.path):
+            if self.page is None and os.path.isfile(self.path):
                 self.encoding = get_encoding_from_file(self.path, self.debug_recorder, self.byte_count)
             if self.encoding is None:
                 try:
-                    self.encoding = get_encoding_from_url(self.url, self.debug_recorder, self.byte_count)
-                except ValueError as e:
+                    self.encoding = self.get_encoding_from_page()
+                except (ValueError, InvalidURL) as e:
                     self.error_collector.add(e, f'in {self.url}')
             if self.encoding is None:
                 self.error_collector.add('No encoding found', f'{self.url}')
                 self.encoding = self.default_encoding
 
 
+    def get_encoding_from_page(self):
+        """Download the page once, keeping it to be written to file by get_text()."""
+        if self.page is None:
+            if self.fetcher is not None:
+                self.page = self.fetcher.fetch(self.url)
+            else:
+                with PageFetcher(self.error_collector, retries=0) as fetcher:
+                    self.page = fetcher.fetch(self.url)
+        return get_encoding_from_page(self.page, self.debug_recorder, self.byte_count)
+
+
+class FetchedPage:
+    def __init__(self, url, status, html_bytes, charset=None):
+        self.url = url
+        self.status = status
+        self.html_bytes = html_bytes
+        self.charset = charset
+
+    def __str__(self):
+        return f'{self.url} ({self.status}, {len(self.html_bytes)} bytes, charset={self.charset})'
+
+
+class PageFetcher:
+    """Download web pages with a bounded number of workers.
+
+    Each worker thread keeps one connection per host, so that subsequent
+    requests to the same host reuse it. Requests to the same host are
+    spaced by at least min_interval seconds. Connection errors and
+    temporary server errors are retried with exponential backoff.
+    """
+    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.5 Safari/605.1.15'}
+
+    def __init__(self, error_collector, max_workers=DEFAULT_MAX_WORKERS, min_interval=DEFAULT_MIN_INTERVAL,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT):
+        self.error_collector = error_collector
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.next_time_by_host = {}
+        self.connections = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            connections = self.connections
+            self.connections = []
+        for connection in connections:
+            connection.close()
+
+    def fetch_all(self, urls):
+        """Download the given urls in parallel.
+
+        @param urls: Iterable of urls to download.
+        @return: Dictionary of FetchedPage instances by url, None for pages that couldn't be downloaded.
+        """
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pages = executor.map(self.fetch_or_none, urls)
+            page_by_url = dict(zip(urls, pages))
+        return page_by_url
+
+    def fetch_or_none(self, url):
+        try:
+            page = self.fetch(url)
+        except (HTTPError, InvalidURL, HTTPException, OSError) as e:
+            self.error_collector.add(e, f'while fetching {url}')
+            page = None
+        return page
+
+    def fetch(self, url):
+        """Download one url, following redirects and retrying temporary errors.
+
+        @param url: Url of the page to download.
+        @return: FetchedPage instance.
+        @raise HTTPError: When the server keeps responding with an error status.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                page = self.fetch_following_redirects(url)
+            except HTTPError as e:
+                if e.code not in RETRY_CODES or attempt >= self.retries:
+                    raise e
+            except (HTTPException, OSError):
+                if attempt >= self.retries:
+                    raise
+            else:
+                return page
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch_following_redirects(self, url):
+        request_url = url
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, html_bytes = self.request(request_url)
+            if status in REDIRECT_CODES and headers.get('Location'):
+                request_url = urljoin(request_url, headers['Location'])
+                continue
+            if status >= 400:
+                raise HTTPError(url, status, f'HTTP status {status}', headers, None)
+            return FetchedPage(url, status, html_bytes, headers.get_content_charset())
+        raise HTTPError(url, status, 'Too many redirects', headers, None)
+
+    def request(self, url):
+        url_obj = urlparse(url)
+        path = urlunparse(['', '', url_obj.path or '/', url_obj.params, url_obj.query, ''])
+        path = quote(path, safe=URL_SAFE_CHARS)
+        self.wait_for_host(url_obj.netloc)
+        connection = self.get_connection(url_obj.scheme, url_obj.netloc)
+        try:
+            connection.request('GET', path, headers=self.headers)
+            response = connection.getresponse()
+            html_bytes = response.read()
+        except (HTTPException, OSError):
+            self.drop_connection(url_obj.scheme, url_obj.netloc)
+            raise
+        if response.will_close:
+            self.drop_connection(url_obj.scheme, url_obj.netloc)
+        return response.status, response.msg, html_bytes
+
+    def wait_for_host(self, host):
+        with self.lock:
+            now = time.monotonic()
+            start_time = max(now, self.next_time_by_host.get(host, now))
+            self.next_time_by_host[host] = start_time + self.min_interval
+        if start_time > now:
+            time.sleep(start_time - now)
+
+    def get_connection(self, scheme, netloc):
+        if not hasattr(self.local, 'connection_by_host'):
+            self.local.connection_by_host = {}
+        try:
+            connection = self.local.connection_by_host[(scheme, netloc)]
+        except KeyError:
+            if scheme == 'https':
+                connection = HTTPSConnection(netloc, timeout=self.timeout)
+            elif scheme == 'http':
+                connection = HTTPConnection(netloc, timeout=self.timeout)
+            else:
+                raise InvalidURL(f'Unsupported scheme {scheme}')
+            self.local.connection_by_host[(scheme, netloc)] = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def drop_connection(self, scheme, netloc):
+        connection = self.local.connection_by_host.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
+
+
 class UrlReader:
     user_agent = 'Mozilla/5.0 (Windows NT 6.1; Win64; x64)'
     alt_user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/77.0.3865.90 Safari/537.36'
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from Shared.application_tools import Config
+
+
+class ConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_path = os.path.join(self.temp_dir.name, 'test_config.yml')
+        self.arrange_write_config('Constants:\n    MaxShortMinutes: 40\n')
+        Config.clear()
+
+    def tearDown(self):
+        Config.clear()
+        self.temp_dir.cleanup()
+
+    def arrange_write_config(self, text, mtime_ns=None):
+        with open(self.config_path, 'w') as stream:
+            stream.write(text)
+        if mtime_ns is not None:
+            os.utime(self.config_path, ns=(mtime_ns, mtime_ns))
+
+    def test_config_is_parsed_once(self):
+        # Arrange.
+        parse_count = Config.parse_count
+
+        # Act.
+        configs = [Config(self.config_path).config for _ in range(3)]
+
+        # Assert.
+        self.assertEqual(Config.parse_count, parse_count + 1)
+        self.assertIs(configs[0], configs[2])
+        self.assertEqual(configs[0]['Constants']['MaxShortMinutes'], 40)
+
+    def test_config_is_read_only(self):
+        # Arrange.
+        config = Config(self.config_path).config
+
+        # Act & Assert.
+        with self.assertRaises(TypeError):
+            config['Constants']['MaxShortMinutes'] = 20
+
+    def test_changed_config_is_parsed_again(self):
+        # Arrange.
+        _ = Config(self.config_path).config
+        mtime_ns = os.stat(self.config_path).st_mtime_ns + 1_000_000_000
+        self.arrange_write_config('Constants:\n    MaxShortMinutes: 20\n', mtime_ns=mtime_ns)
+
+        # Act.
+        config = Config(self.config_path).config
+
+        # Assert.
+        self.assertEqual(config['Constants']['MaxShortMinutes'], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,14 @@ import unittest
 from tempfile import TemporaryFile
 
 from Shared.application_tools import DebugRecorder
-from Shared.parse_tools import BaseHtmlPageParser
+from Shared.parse_tools import BaseHtmlPageParser, ParseStage, record_html_events
+
+TEST_PAGE = """<!DOCTYPE html>
+<html><head><script>if (a < b) { go(); }</script></head>
+<body><!-- film -->
+<div class="film" data-id="7"><h1>Caf&eacute; &amp; Co</h1><br/>
+<p>90 min</p></div></body></html>
+"""
 
 
 class StateStackTestCase(unittest.TestCase):
@@ -62,5 +69,67 @@ class StateStackTestCase(unittest.TestCase):
         self.assertEqual(state_stack.state_is('b'), True)
 
 
+class CallLoggingParser(BaseHtmlPageParser):
+    def __init__(self, debugger):
+        super().__init__(debugger, 'TEST')
+        self.calls = []
+
+    def handle_starttag(self, tag, attrs):
+        self.calls.append(('start', tag, attrs))
+
+    def handle_endtag(self, tag):
+        self.calls.append(('end', tag))
+
+    def handle_data(self, data):
+        self.calls.append(('data', data))
+
+    def handle_comment(self, data):
+        self.calls.append(('comment', data))
+
+    def handle_decl(self, data):
+        self.calls.append(('decl', data))
+
+
+class ParseStageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.debug_file = TemporaryFile()
+        self.debugger = DebugRecorder(self.debug_file)
+
+    def tearDown(self):
+        self.debug_file.close()
+
+    def arrange_parse(self, data):
+        parser = CallLoggingParser(self.debugger)
+        parser.feed(data)
+        return parser.calls
+
+    def test_replayed_events_equal_fed_page(self):
+        # Arrange.
+        expected_calls = self.arrange_parse(TEST_PAGE)
+
+        # Act.
+        calls = self.arrange_parse(record_html_events(TEST_PAGE))
+
+        # Assert.
+        self.assertEqual(calls, expected_calls)
+        self.assertIn(('data', 'Café & Co'), calls)
+
+    def test_parse_stage_keeps_page_order(self):
+        # Arrange.
+        htmls = [f'<p id="{i}">Page {i}</p>' if i % 3 else None for i in range(10)]
+        stage = ParseStage(max_workers=2, min_pages=1)
+
+        # Act.
+        page_events = stage.record_all(htmls)
+
+        # Assert.
+        self.assertEqual(len(page_events), len(htmls))
+        for html, events in zip(htmls, page_events):
+            if html is None:
+                self.assertIsNone(events)
+            else:
+                self.assertEqual(self.arrange_parse(events), self.arrange_parse(html))
+
+
 if __name__ == '__main__':
     unittest.main()
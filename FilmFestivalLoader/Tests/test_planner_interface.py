@@ -1,9 +1,9 @@
 import tempfile
 import unittest
-from datetime import timedelta
+from datetime import timedelta, datetime
 
 import Shared.application_tools as app_tools
-from Shared.planner_interface import FestivalData, Section, Film, UnicodeMapper
+from Shared.planner_interface import FestivalData, Section, Film, UnicodeMapper, Screening, FilmInfo
 from Tests.AuxiliaryClasses.test_film import BaseFilmTestCase
 
 
@@ -257,5 +257,72 @@ class SortTitlesTestCase(PlannerInterfaceBaseTestCase):
         self.assertEqual(new_title, expected_title)
 
 
+class FestivalDataIndexesTestCase(PlannerInterfaceBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.screen = self.festival_data.get_screen('Riga', 'Zaal 1', 'Splendid Palace', verbose=False)
+        self.start_dt = datetime(2024, 10, 17, 20, 0)
+
+    def arrange_add_film(self, number, audience=Screening.audience_type_public):
+        url = f'https://rigaiff.lv/films/film-{number}'
+        film = self.festival_data.add_film(f'Film {number}', url, duration=timedelta(minutes=90),
+                                           medium_category='films')
+        self.festival_data.film_infos.append(FilmInfo(film.film_id, f'Description {number}', []))
+        start_dt = self.start_dt + timedelta(hours=number)
+        screening = Screening(film, self.screen, start_dt, start_dt + film.duration, '', '', audience)
+        self.festival_data.screenings.append(screening)
+        return film
+
+    def test_indexes_follow_appended_objects(self):
+        """
+        Objects appended to the lists of festival data can be looked up by film id and by screen.
+        """
+        # Arrange.
+        films = [self.arrange_add_film(number) for number in range(1, 4)]
+
+        # Act.
+        film = self.festival_data.get_film_by_id(films[1].film_id)
+
+        # Assert.
+        self.assertEqual(film, films[1])
+        self.assertEqual(film.film_info(self.festival_data).description, 'Description 2')
+        self.assertEqual(len(film.screenings(self.festival_data)), 1)
+        self.assertEqual(len(self.festival_data.get_screenings_by_screen(self.screen)), 3)
+
+    def test_indexes_follow_removed_objects(self):
+        """
+        Objects removed from the lists of festival data can no longer be looked up.
+        """
+        # Arrange.
+        films = [self.arrange_add_film(number) for number in range(1, 4)]
+        screening = films[0].screenings(self.festival_data)[0]
+
+        # Act.
+        self.festival_data.films.remove(films[0])
+        self.festival_data.screenings.remove(screening)
+
+        # Assert.
+        self.assertIsNone(self.festival_data.get_film_by_id(films[0].film_id))
+        self.assertEqual(films[0].screenings(self.festival_data), [])
+        self.assertEqual(len(self.festival_data.get_screenings_by_screen(self.screen)), 2)
+
+    def test_only_films_with_public_screenings_go_to_planner(self):
+        """
+        Films without public screenings are not written to the planner.
+        """
+        # Arrange.
+        public_film = self.arrange_add_film(1)
+        private_film = self.arrange_add_film(2, audience='pers')
+
+        # Act.
+        self.festival_data.write_films()
+
+        # Assert.
+        self.assertIs(self.festival_data.film_can_go_to_planner(public_film.film_id), True)
+        self.assertIs(self.festival_data.film_can_go_to_planner(private_film.film_id), False)
+        with open(self.festival_data.films_file) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,51 @@
+import os
+import tempfile
+import threading
 import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.error import HTTPError
 
-from Shared.web_tools import paths_eq
+from Shared.application_tools import ErrorCollector, DebugRecorder
+from Shared.web_tools import paths_eq, UrlFile, PageFetcher, get_url_files
+
+META_CHARSET_HTML = '<html><head><meta charset="iso-8859-1"></head><body>Caf\xe9</body></html>'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    request_count_by_path = {}
+    client_ports = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.request_count_by_path[self.path] = self.request_count_by_path.get(self.path, 0) + 1
+            self.client_ports.add(self.client_address[1])
+            request_count = self.request_count_by_path[self.path]
+        if self.path == '/missing':
+            self.send_body(404, b'Not found', 'text/plain')
+        elif self.path == '/flaky' and request_count == 1:
+            self.send_body(503, b'Try again', 'text/plain')
+        elif self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/header')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path == '/meta':
+            self.send_body(200, META_CHARSET_HTML.encode('iso-8859-1'), 'text/html')
+        else:
+            html = f'<html><body>Page {self.path} ☺</body></html>'
+            self.send_body(200, html.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
 
 
 class UrlsPathsTestCase(unittest.TestCase):
@@ -33,5 +78,115 @@ class UrlsPathsTestCase(unittest.TestCase):
         self.assertEqual(equivalent, True, 'Iri and derived uri should evaluate equivalent')
 
 
+class PageFetcherTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.request_count_by_path.clear()
+        StandInHandler.client_ports.clear()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.debug_file = tempfile.TemporaryFile()
+        self.error_collector = ErrorCollector()
+        self.debug_recorder = DebugRecorder(self.debug_file)
+        self.fetcher = PageFetcher(self.error_collector, max_workers=4, min_interval=0, backoff=0.01)
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.debug_file.close()
+        self.temp_dir.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.temp_dir.name, f'{name}.html')
+
+    def test_url_file_downloads_page_once(self):
+        """
+        A url file gets its encoding and its text from a single request.
+        """
+        # Arrange.
+        path = self.get_path('header')
+        url_file = UrlFile(f'{self.base_url}/header', path, self.error_collector, self.debug_recorder)
+
+        # Act.
+        text = url_file.get_text()
+
+        # Assert.
+        self.assertEqual(url_file.encoding, 'utf-8')
+        self.assertIn('Page /header ☺', text)
+        self.assertEqual(StandInHandler.request_count_by_path, {'/header': 1})
+        self.assertEqual(os.path.isfile(path), True)
+
+    def test_encoding_from_first_bytes(self):
+        """
+        Without a charset in the response headers, the encoding is found in the first bytes of the page.
+        """
+        # Arrange.
+        url_file = UrlFile(f'{self.base_url}/meta', self.get_path('meta'), self.error_collector,
+                           self.debug_recorder, fetcher=self.fetcher)
+
+        # Act.
+        text = url_file.get_text()
+
+        # Assert.
+        self.assertEqual(url_file.encoding, 'iso-8859-1')
+        self.assertIn('Café', text)
+        self.assertEqual(StandInHandler.request_count_by_path, {'/meta': 1})
+
+    def test_reraise_codes_still_raised(self):
+        """
+        A url file still raises the HTTP errors with the given codes.
+        """
+        # Arrange.
+        url = f'{self.base_url}/missing'
+
+        # Act and Assert.
+        with self.assertRaises(HTTPError) as context:
+            _ = UrlFile(url, self.get_path('missing'), self.error_collector, self.debug_recorder, reraise_codes=[404])
+        self.assertEqual(context.exception.code, 404)
+
+    def test_fetch_all_retries_and_follows_redirects(self):
+        """
+        Fetching a list of urls retries temporary errors, follows redirects and reports missing pages.
+        """
+        # Arrange.
+        urls = [f'{self.base_url}/{path}' for path in ['flaky', 'moved', 'missing']]
+
+        # Act.
+        page_by_url = self.fetcher.fetch_all(urls)
+
+        # Assert.
+        self.assertEqual(page_by_url[urls[0]].status, 200)
+        self.assertEqual(StandInHandler.request_count_by_path['/flaky'], 2)
+        self.assertIn(b'Page /header', page_by_url[urls[1]].html_bytes)
+        self.assertIsNone(page_by_url[urls[2]])
+        self.assertEqual(self.error_collector.error_count(), 1)
+
+    def test_get_url_files_reuses_connections(self):
+        """
+        Downloading many pages uses no more connections than workers.
+        """
+        # Arrange.
+        path_by_url = {f'{self.base_url}/film/{i}': self.get_path(f'film_{i}') for i in range(40)}
+
+        # Act.
+        url_files = get_url_files(path_by_url, self.error_collector, self.debug_recorder, fetcher=self.fetcher)
+        texts = [url_file.get_text() for url_file in url_files]
+
+        # Assert.
+        self.assertEqual(len(texts), 40)
+        self.assertIn('Page /film/39 ☺', texts[39])
+        self.assertEqual(sum(StandInHandler.request_count_by_path.values()), 40)
+        self.assertLessEqual(len(StandInHandler.client_ports), 4)
+
+
 if __name__ == '__main__':
     unittest.main()